@@ -12,6 +12,19 @@ ROOT_DIR = APP_DIR.parent                          # .../ai-service
 MODEL_DIR = ROOT_DIR / "model"
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Load model lỗi -> cache lỗi, thử lại sau backoff = base * 2^(n-1), tối đa max (giây)
+MODEL_LOAD_RETRY_BASE_SECS = float(os.getenv("MODEL_LOAD_RETRY_BASE_SECS", "1"))
+MODEL_LOAD_RETRY_MAX_SECS = float(os.getenv("MODEL_LOAD_RETRY_MAX_SECS", "60"))
+# Số key lỗi giữ backoff tối đa (key lạ từ request -> không phình vô hạn); lỗi quá hạn lâu cũng bị dọn
+MODEL_LOAD_FAILURE_MAX = int(os.getenv("MODEL_LOAD_FAILURE_MAX", "256"))
+
+# Ngân sách bộ nhớ cho cache model (MB); 0 = không giới hạn. Version mặc định luôn được giữ.
+MODEL_CACHE_BUDGET_MB = float(os.getenv("MODEL_CACHE_BUDGET_MB", "0"))
+
+# Artifact mmap: bản re-dump không nén trong MODEL_MMAP_DIR (mặc định MODEL_DIR/mmap)
+MODEL_MMAP_ENABLED = os.getenv("MODEL_MMAP_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+MODEL_MMAP_DIR = os.getenv("MODEL_MMAP_DIR", str(MODEL_DIR / "mmap"))
+
 # Gemini API key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
@@ -23,3 +36,58 @@ GEMINI_MODEL_GENERIC = os.getenv("GEMINI_MODEL_GENERIC", "")
 # hard limits
 MAX_SUMMARY_LEN = int(os.getenv("MAX_SUMMARY_LEN", "1024"))
 TIMEOUT_SECS = int(os.getenv("AI_TIMEOUT_SECS", "20"))
+
+# ML inference
+# Cách classifier sinh (prob, raw_score):
+#   "proba"        -> 1 lần predict_proba, raw = classes_[argmax] (mặc định)
+#   "margin"       -> 1 lần decision_function, raw = margin, prob = sigmoid(margin)
+#   "predict_both" -> predict_proba + predict (cách cũ, chạy model 2 lần)
+ML_INFERENCE_MODE_DEFAULT = os.getenv("ML_INFERENCE_MODE_DEFAULT", "proba")
+# Override theo model: "churn_model=margin,lead_cls_onehot=predict_both"
+ML_INFERENCE_MODES = os.getenv("ML_INFERENCE_MODES", "")
+
+# Micro-batching: gom request 1-dòng tới cùng model trong cửa sổ ngắn rồi predict 1 lần
+ML_MICROBATCH_ENABLED = os.getenv("ML_MICROBATCH_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+ML_MICROBATCH_WINDOW_MS = float(os.getenv("ML_MICROBATCH_WINDOW_MS", "2"))
+ML_MICROBATCH_MAX_ROWS = int(os.getenv("ML_MICROBATCH_MAX_ROWS", "64"))
+
+# Execution layer: chạy inference ngoài event loop
+# ML_THREAD_WORKERS=0 -> min(4, số CPU)
+# ML_PROCESS_WORKERS=0 -> job nặng (forecast) chạy trong thread pool riêng ML_HEAVY_THREAD_WORKERS
+ML_THREAD_WORKERS = int(os.getenv("ML_THREAD_WORKERS", "0"))
+ML_HEAVY_THREAD_WORKERS = int(os.getenv("ML_HEAVY_THREAD_WORKERS", "1"))
+ML_PROCESS_WORKERS = int(os.getenv("ML_PROCESS_WORKERS", "0"))
+ML_MAX_QUEUE = int(os.getenv("ML_MAX_QUEUE", "256"))
+# Forecast nhiều target (order/line/...) trong 1 request: số thread chạy song song (0 -> mỗi target 1 thread)
+ML_FORECAST_TARGET_WORKERS = int(os.getenv("ML_FORECAST_TARGET_WORKERS", "0"))
+# Monte Carlo interval: số sample path tối đa / request (mỗi bước predict 1 ma trận paths x features)
+ML_FORECAST_INTERVAL_MAX_PATHS = int(os.getenv("ML_FORECAST_INTERVAL_MAX_PATHS", "2000"))
+
+# Churn bulk: số khách / khúc predict_proba (bộ nhớ chỉ giữ 1 khúc) + ngưỡng risk tier (giống Backend)
+CHURN_BULK_CHUNK_SIZE = int(os.getenv("CHURN_BULK_CHUNK_SIZE", "10000"))
+CHURN_RISK_HIGH = float(os.getenv("CHURN_RISK_HIGH", "0.7"))
+CHURN_RISK_MEDIUM = float(os.getenv("CHURN_RISK_MEDIUM", "0.4"))
+# CLV nhiều horizon trong 1 lần gọi: số thread chạy pipeline song song (0 -> mỗi horizon 1 thread)
+ML_CLV_HORIZON_WORKERS = int(os.getenv("ML_CLV_HORIZON_WORKERS", "0"))
+
+# Snapshot khách (churn + segment + CLV 1 lượt): file kết quả, số dòng / khúc, số job chạy cùng lúc,
+# số thread chạy 3 model song song trên mỗi khúc; số job giữ lại để tra cứu
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")  # rỗng -> <tempdir>/ai-snapshots
+SNAPSHOT_CHUNK_SIZE = int(os.getenv("SNAPSHOT_CHUNK_SIZE", "20000"))
+SNAPSHOT_MAX_JOBS = int(os.getenv("SNAPSHOT_MAX_JOBS", "1"))
+SNAPSHOT_MODEL_WORKERS = int(os.getenv("SNAPSHOT_MODEL_WORKERS", "3"))
+SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", "50"))
+
+# Forecast session: giữ history daily đã clean trong RAM (LRU), tuỳ chọn lưu xuống disk
+FORECAST_SESSION_MAX = int(os.getenv("FORECAST_SESSION_MAX", "256"))
+FORECAST_SESSION_DIR = os.getenv("FORECAST_SESSION_DIR", "")  # rỗng -> chỉ RAM
+
+# Cache kết quả forecast theo nội dung (hash CSV + tham số + model): RAM LRU + TTL, tuỳ chọn tầng disk
+FORECAST_CACHE_ENABLED = os.getenv("FORECAST_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "128"))
+FORECAST_CACHE_TTL_SECS = float(os.getenv("FORECAST_CACHE_TTL_SECS", "600"))
+FORECAST_CACHE_DIR = os.getenv("FORECAST_CACHE_DIR", "")  # rỗng -> chỉ RAM
+
+# Warm-up lúc startup: load song song toàn bộ model alias + chạy 1 predict giả
+ML_WARMUP_ENABLED = os.getenv("ML_WARMUP_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+ML_WARMUP_WORKERS = int(os.getenv("ML_WARMUP_WORKERS", "4"))
@@ -1,9 +1,39 @@
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routers.ai_routes import router as ai_router
+from fastapi.responses import JSONResponse
+
+from app import config
+from app.routers.ai_routes import ml, router as ai_router
+from app.services.ml_executor import ml_executor
+from app.services.model_store import model_store
+
+
+def _warmup_models() -> None:
+    model_store.warmup(max_workers=config.ML_WARMUP_WORKERS, warm_fn=ml.warmup_predict)
+
 
-app = FastAPI(title="CRM AI Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Warm-up chạy nền: /health trả ngay, /ready báo trạng thái từng model
+    if config.ML_WARMUP_ENABLED:
+        threading.Thread(target=_warmup_models, name="model-warmup", daemon=True).start()
+    yield
+    ml_executor.shutdown(wait=False)
+
+
+app = FastAPI(title="CRM AI Service", version="1.0.0", lifespan=lifespan)
 app.include_router(ai_router)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    report = model_store.warmup_report()
+    if not config.ML_WARMUP_ENABLED:
+        report["ready"] = True
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
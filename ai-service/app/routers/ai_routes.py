@@ -1,14 +1,44 @@
 # app/routers/ai_routes.py
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Form, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field, conlist
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import json
+from dataclasses import asdict
 
 import pandas as pd
 
+from app import config
+from app.services.bulk_input import InputFormatUnavailable, iter_frames, normalize_input_format
+from app.services.forecast_dataset import DEFAULT_FORECAST_TARGETS, ForecastTarget
+from app.services.forecast_intervals import IntervalSpec
+from app.services.forecast_scenarios import ForecastScenario
+from app.services.forecast_output import (
+    BINARY_FORMATS,
+    MEDIA_TYPES,
+    OutputFormatUnavailable,
+    dumps as output_dumps,
+    frame_to_bytes,
+    ndjson_lines,
+    normalize_output_format,
+    take_chunk,
+)
+from app.services.forecast_session import ForecastSessionStore, SessionNotFound
 from app.services.llm_service import LLMService
+from app.services.micro_batcher import micro_batcher
+from app.services.ml_executor import ExecutorSaturated, ml_executor
 from app.services.ml_service import MLService
+from app.services.model_store import model_store
+from app.services.result_cache import content_key, forecast_cache
+from app.services.snapshot_job import (
+    SnapshotJobNotFound,
+    SnapshotJobStore,
+    SnapshotOutputUnavailable,
+    normalize_snapshot_format,
+)
 from app.schema.marketing import SuggestCampaignResponse
 
 router = APIRouter(prefix="/v1", tags=["ai"])
@@ -87,6 +117,16 @@ class LeadMLScoreResponse(BaseModel):
     models: Dict[str, Any]
 
 
+class LeadBatchPayload(BaseModel):
+    leads: List[Dict[str, Any]] = Field(default_factory=list)
+    options: Optional[Dict[str, Any]] = None
+
+
+class LeadMLBatchResponse(BaseModel):
+    count: int
+    items: List[LeadMLScoreResponse]
+
+
 class LeadHybridResponse(BaseModel):
     predicted_prob: float
     predicted_value: float
@@ -106,6 +146,18 @@ class SegmentPredictIn(BaseModel):
     debug: bool = True
 
 
+class CLVMultiIn(BaseModel):
+    horizons: List[str] = Field(default_factory=lambda: ["1m", "3m", "6m", "12m"])
+    clv_json: Dict[str, Any] = Field(default_factory=dict)  # 1 khách
+    rows: List[Dict[str, Any]] = Field(default_factory=list)  # hoặc N khách
+
+
+class SegmentBatchIn(BaseModel):
+    rows: List[Dict[str, Any]] = Field(default_factory=list)  # mỗi phần tử = 1 segmentation_json
+    segment_map_json: Optional[Dict[str, str]] = None
+    return_distances: bool = False  # True -> trả ma trận khoảng cách (N, K)
+
+
 class CLVPredictIn(BaseModel):
     horizon: str = "12m"  # "1m"|"3m"|"6m"|"12m"
     clv_json: Dict[str, Any] = Field(default_factory=dict)
@@ -119,9 +171,63 @@ class RevenueDailyOneIn(BaseModel):
     clip_negative_to_zero: bool = True
 
 
+class ForecastTargetIn(BaseModel):
+    name: str
+    target_col: str
+    model: str
+    transform_mode: str = "raw"
+    transform_scale: float = 1.0
+
+
+class ForecastSessionAppendIn(BaseModel):
+    rows: List[Dict[str, Any]] = Field(default_factory=list)  # [{date, daily_revenue_order, daily_revenue_line, ...}]
+
+
+class ForecastSessionForecastIn(BaseModel):
+    mode: str = "ALL"  # "ALL" | "ONE"
+    target: str = "daily_revenue_order"
+    horizon: int = 30
+    hist_days: Optional[int] = None  # mặc định = hist_days của session
+    start_date: Optional[str] = None
+    clip_negative_to_zero: bool = True
+    order_transform_mode: str = "raw"
+    order_transform_scale: float = 1.0
+    line_transform_mode: str = "raw"
+    line_transform_scale: float = 1.0
+    append_transformed_to_history: bool = True
+    extra_targets: List[ForecastTargetIn] = Field(default_factory=list)
+
+
+class ForecastScenarioIn(BaseModel):
+    # None -> dùng giá trị chung của request
+    name: str
+    start_date: Optional[str] = None
+    holiday_mmdd: Optional[str] = None  # "01-01,02-14,..."
+    holiday_window_days: Optional[int] = None
+    hist_days: Optional[int] = None
+    clip_negative_to_zero: bool = True
+    order_transform_mode: str = "raw"
+    order_transform_scale: float = 1.0
+    line_transform_mode: str = "raw"
+    line_transform_scale: float = 1.0
+    append_transformed_to_history: bool = True
+
+
 # ---------- Services ----------
 llm = LLMService()
 ml = MLService()
+forecast_sessions = ForecastSessionStore(
+    prepare=ml.prepare_daily_dataset,
+    persist_dir=config.FORECAST_SESSION_DIR or None,
+    max_sessions=config.FORECAST_SESSION_MAX,
+)
+snapshot_jobs = SnapshotJobStore(
+    run_chunk=ml.snapshot_chunk,
+    out_dir=config.SNAPSHOT_DIR or None,
+    max_jobs=config.SNAPSHOT_MAX_JOBS,
+    model_workers=config.SNAPSHOT_MODEL_WORKERS,
+    history=config.SNAPSHOT_HISTORY,
+)
 
 
 # ---------- Helpers ----------
@@ -135,6 +241,225 @@ def _extract_lead(payload: Dict[str, Any]) -> Dict[str, Any]:
     return lead if isinstance(lead, dict) else {}
 
 
+def _to_forecast_targets(items: List[ForecastTargetIn]) -> List[ForecastTarget]:
+    return [
+        ForecastTarget(t.name, t.target_col, t.model, t.transform_mode, float(t.transform_scale))
+        for t in items
+    ]
+
+
+def _parse_forecast_targets(raw: Optional[str]) -> List[ForecastTarget]:
+    """
+    Form `extra_targets`: JSON list [{name, target_col, model, transform_mode?, transform_scale?}].
+    """
+    if not raw or not raw.strip():
+        return []
+    try:
+        items = json.loads(raw)
+        if not isinstance(items, list):
+            raise ValueError("extra_targets must be a JSON list")
+        parsed = [ForecastTargetIn.model_validate(x) for x in items]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid extra_targets: {e}")
+    return _to_forecast_targets(parsed)
+
+
+def _parse_interval(paths: int, quantiles: Optional[str], backtest_days: int, seed: Optional[int]) -> Optional[IntervalSpec]:
+    """Form interval_*: paths=0 -> tắt; quantiles dạng "0.1,0.5,0.9"."""
+    if int(paths or 0) <= 0:
+        return None
+    try:
+        qs = tuple(float(x) for x in (quantiles or "").split(",") if x.strip())
+        return IntervalSpec(paths=int(paths), quantiles=qs, backtest_days=int(backtest_days), seed=seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid interval: {e}")
+
+
+def _parse_scenarios(raw: Optional[str]) -> List[ForecastScenario]:
+    """Form `scenarios`: JSON list [{name, start_date?, holiday_window_days?, order_transform_mode?, ...}]."""
+    try:
+        items = json.loads(raw or "")
+        if not isinstance(items, list) or not items:
+            raise ValueError("scenarios must be a non-empty JSON list")
+        parsed = [ForecastScenarioIn.model_validate(x) for x in items]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenarios: {e}")
+
+    order_t, line_t = DEFAULT_FORECAST_TARGETS
+    return [
+        ForecastScenario(
+            name=x.name,
+            start_date=x.start_date,
+            holiday_mmdd=(
+                tuple(m.strip() for m in x.holiday_mmdd.split(",") if m.strip()) if x.holiday_mmdd is not None else None
+            ),
+            holiday_window_days=x.holiday_window_days,
+            hist_days=x.hist_days,
+            clip_negative_to_zero=x.clip_negative_to_zero,
+            append_transformed_to_history=x.append_transformed_to_history,
+            transforms={
+                order_t.name: (x.order_transform_mode, float(x.order_transform_scale)),
+                line_t.name: (x.line_transform_mode, float(x.line_transform_scale)),
+            },
+        )
+        for x in parsed
+    ]
+
+
+def _forecast_cache_key(
+    content: bytes,
+    *,
+    mode: str,
+    target: str,
+    series_col: str,
+    order_transform: tuple,
+    line_transform: tuple,
+    start_date: Optional[str],
+    holiday_mmdd: List[str],
+    extra: List[ForecastTarget],
+    **params: Any,
+) -> str:
+    """
+    Chuẩn hoá tham số forecast (bỏ tham số mode không dùng, sort ngày lễ, chuẩn hoá start_date)
+    + định danh model đang load (ModelStore.identity) -> content key của cache kết quả.
+    """
+    norm: Dict[str, Any] = {**params, "mode": mode, "holiday_mmdd": sorted(set(holiday_mmdd))}
+    norm["start_date"] = str(pd.to_datetime(start_date).date()) if start_date else None
+
+    order_t, line_t = DEFAULT_FORECAST_TARGETS
+    if mode in ("ONE", "MULTI"):
+        t = order_t if target == order_t.target_col else line_t
+        norm["target"] = target
+        norm["transform"] = order_transform if target == order_t.target_col else line_transform
+        if mode == "MULTI":
+            norm["series_col"] = series_col
+        model_names = [t.model_name]
+    else:
+        norm["order_transform"] = order_transform
+        norm["line_transform"] = line_transform
+        norm["extra_targets"] = [asdict(x) for x in extra]
+        model_names = [order_t.model_name, line_t.model_name] + [x.model_name for x in extra]
+
+    models = [model_store.identity(m) for m in model_names]
+    return content_key("forecast/daily_csv", content, norm, models)
+
+
+def _output_format(fmt: Optional[str]) -> str:
+    try:
+        return normalize_output_format(fmt)
+    except OutputFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _forecast_bytes(res: Dict[str, Any], fmt: str) -> bytes:
+    debug = dict(res.get("debug") or {})
+    if "skipped" in res:
+        debug["skipped"] = res["skipped"]
+    return frame_to_bytes(res["forecast"], fmt, debug)
+
+
+def _forecast_result_response(response: Response, res: Any, fmt: str, headers: Dict[str, str]) -> Any:
+    """records: trả dict như cũ; columnar: JSON dump thẳng (bỏ qua jsonable_encoder); arrow/parquet: bytes."""
+    if fmt == "records":
+        response.headers.update(headers)
+        return res
+    if fmt == "columnar":
+        return Response(content=output_dumps(res), media_type=MEDIA_TYPES[fmt], headers=headers)
+    return Response(content=res, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+async def _ndjson_stream(debug: Dict[str, Any], rows: Any) -> AsyncIterator[bytes]:
+    async for chunk in _bytes_stream(ndjson_lines(debug, rows)):
+        yield chunk
+
+
+async def _bytes_stream(lines: Iterator[bytes]) -> AsyncIterator[bytes]:
+    # mỗi lần lấy 1 cụm dòng trong ml_executor (tối đa ~50ms / 512 dòng) -> không block event loop
+    while True:
+        chunk = await _run_ml(take_chunk, lines)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _churn_bulk_lines(
+    first: Optional[pd.DataFrame],
+    results: Iterator[pd.DataFrame],
+    fmt: str,
+    debug: Dict[str, Any],
+    stats: Dict[str, Any],
+) -> Iterator[bytes]:
+    """ndjson: dòng debug + 1 dòng / khách + dòng summary ; csv: header 1 lần + các khúc kết quả."""
+    if fmt == "ndjson":
+        yield (output_dumps({"debug": debug}) + "\n").encode("utf-8")
+
+    header = True
+    chunk = first
+    while chunk is not None:
+        if fmt == "csv":
+            yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        else:
+            # double_precision=15 (tối đa của pandas, mặc định 10): không cắt bớt churn_prob / raw_score
+            lines = chunk.to_json(orient="records", lines=True, force_ascii=False, double_precision=15)
+            yield lines.rstrip("\n").encode("utf-8") + b"\n"
+        header = False
+        chunk = next(results, None)
+
+    if fmt == "ndjson":
+        yield (output_dumps({"summary": stats}) + "\n").encode("utf-8")
+
+
+def _segment_map_int(raw: Optional[Dict[str, str]]) -> Optional[Dict[int, str]]:
+    """segment_map_json {"0": "..."} -> {0: "..."}; key không phải số bị bỏ qua."""
+    if not isinstance(raw, dict):
+        return None
+    seg_map_int: Dict[int, str] = {}
+    for k, v in raw.items():
+        try:
+            seg_map_int[int(k)] = str(v)
+        except Exception:
+            continue
+    return seg_map_int
+
+
+def _csv_list(raw: Optional[str]) -> List[str]:
+    return [x.strip() for x in (raw or "").split(",") if x.strip()]
+
+
+def _get_snapshot_job(job_id: str):
+    try:
+        return snapshot_jobs.get(job_id)
+    except SnapshotJobNotFound:
+        raise HTTPException(status_code=404, detail=f"Snapshot job not found: {job_id}")
+
+
+def _get_forecast_session(session_id: str):
+    try:
+        return forecast_sessions.get(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail=f"Forecast session not found: {session_id}")
+
+
+async def _ml_call(aw: Awaitable[Any]) -> Any:
+    """
+    Await 1 lời gọi ML (đã chạy trong ml_executor); hàng đợi đầy -> 503 thay vì 500.
+    """
+    try:
+        return await aw
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def _run_ml(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await _ml_call(ml_executor.run(fn, *args, **kwargs))
+
+
+async def _run_ml_heavy(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await _ml_call(ml_executor.run_heavy(fn, *args, **kwargs))
+
+
 # ---------- Routes ----------
 @router.post("/leads/score", response_model=LeadLLMScoreResponse)
 async def score_lead_llm(payload: Dict[str, Any] = Body(...)):
@@ -259,12 +584,12 @@ async def score_lead_ml(payload: LeadPayload):
         if not payload.lead:
             raise HTTPException(status_code=400, detail="lead is required")
 
-        res = ml.predict_lead(
+        res = await _ml_call(ml.apredict_lead(
             payload.lead,
             cls_model_name="lead_cls_onehot",
             reg_model_name="lead_reg_onehot",
             feature_cols_name="lead_feature_columns_onehot",
-        )
+        ))
 
         return {
             "predicted_prob": float(res["conversion_prob"]),
@@ -279,6 +604,40 @@ async def score_lead_ml(payload: LeadPayload):
         raise HTTPException(status_code=500, detail=f"ML service error: {e}")
 
 
+@router.post("/leads/score_ml/batch", response_model=LeadMLBatchResponse)
+async def score_lead_ml_batch(payload: LeadBatchPayload):
+    """
+    ML scoring hàng loạt: {leads:[{...}, ...]} -> items theo đúng thứ tự input.
+    """
+    try:
+        if not payload.leads:
+            raise HTTPException(status_code=400, detail="leads is required")
+
+        results = await _run_ml(
+            ml.predict_lead_batch,
+            payload.leads,
+            cls_model_name="lead_cls_onehot",
+            reg_model_name="lead_reg_onehot",
+            feature_cols_name="lead_feature_columns_onehot",
+        )
+
+        items = [
+            {
+                "predicted_prob": float(res["conversion_prob"]),
+                "raw_score": float(res["raw_score"]),
+                "predicted_value": float(res["predicted_value"]),
+                "predicted_value_currency": str(res.get("currency", "VND")),
+                "models": res["models"],
+            }
+            for res in results
+        ]
+        return {"count": len(items), "items": items}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML service error: {e}")
+
+
 @router.post("/leads/score_hybrid", response_model=LeadHybridResponse)
 async def score_lead_hybrid(payload: LeadPayload):
     """
@@ -288,12 +647,12 @@ async def score_lead_hybrid(payload: LeadPayload):
         if not payload.lead:
             raise HTTPException(status_code=400, detail="lead is required")
 
-        ml_res = ml.predict_lead(
+        ml_res = await _ml_call(ml.apredict_lead(
             payload.lead,
             cls_model_name="lead_cls_onehot",
             reg_model_name="lead_reg_onehot",
             feature_cols_name="lead_feature_columns_onehot",
-        )
+        ))
 
         llm_res = await llm.score_lead(payload.lead)
         llm_res = llm_res if isinstance(llm_res, dict) else {}
@@ -326,7 +685,59 @@ async def predict_customer_churn(churn_json: Dict[str, Any] = Body(...)):
     try:
         if not isinstance(churn_json, dict) or not churn_json:
             raise HTTPException(status_code=400, detail="Churn JSON body is required")
-        return ml.predict_churn(churn_json)
+        return await _ml_call(ml.apredict_churn(churn_json))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML service error: {e}")
+
+
+@router.post("/customers/churn/bulk")
+async def predict_customer_churn_bulk(
+    file: UploadFile = File(...),
+    input_format: str = Form("auto"),  # auto (theo đuôi file) | csv | parquet | ndjson
+    output_format: str = Form("ndjson"),  # ndjson | csv
+    chunk_size: int = Form(config.CHURN_BULK_CHUNK_SIZE),
+    id_col: str = Form("customer_id"),  # cột định danh được trả kèm (nếu có trong file)
+):
+    """
+    Chấm churn cả tập khách (refresh hàng tuần): đọc file theo khúc `chunk_size` dòng, mỗi khúc 1 lần predict_proba,
+    stream kết quả {id_col, churn_prob, raw_score, risk_tier} ngay khi khúc tính xong — không giữ toàn bộ output trong RAM.
+    ndjson: dòng đầu {"debug"}, dòng cuối {"summary": rows/chunks/tiers/missing_columns}.
+    """
+    try:
+        try:
+            in_fmt = normalize_input_format(input_format, file.filename)
+        except InputFormatUnavailable as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        out_fmt = (output_format or "ndjson").strip().lower()
+        if out_fmt not in ("ndjson", "csv"):
+            raise HTTPException(status_code=400, detail="output_format must be ndjson or csv")
+        if int(chunk_size) <= 0:
+            raise HTTPException(status_code=400, detail="chunk_size must be > 0")
+
+        expected = await _run_ml(ml.churn_input_columns)
+        columns = (expected + ([id_col] if id_col and id_col not in expected else [])) if expected else None
+        stats: Dict[str, Any] = {}
+        results = ml.iter_churn_bulk(
+            iter_frames(file.file, in_fmt, int(chunk_size), columns),
+            id_col=id_col or None,
+            stats=stats,
+        )
+        # khúc đầu chạy trước khi trả response: lỗi đọc file / predict -> HTTP error thay vì stream hỏng
+        first = await _run_ml(next, results, None)
+        debug = {
+            "model": "churn_model",
+            "input_format": in_fmt,
+            "chunk_size": int(chunk_size),
+            "expected_columns": len(expected or []),
+            "risk_thresholds": {"HIGH": config.CHURN_RISK_HIGH, "MEDIUM": config.CHURN_RISK_MEDIUM},
+        }
+        lines = _churn_bulk_lines(first, results, out_fmt, debug, stats)
+        media_type = MEDIA_TYPES["ndjson"] if out_fmt == "ndjson" else "text/csv"
+        return StreamingResponse(_bytes_stream(lines), media_type=media_type)
     except HTTPException:
         raise
     except Exception as e:
@@ -347,16 +758,31 @@ async def predict_customer_segment(inp: SegmentPredictIn):
         if not inp.segmentation_json:
             raise HTTPException(status_code=400, detail="segmentation_json is required")
 
-        seg_map_int: Optional[Dict[int, str]] = None
-        if isinstance(inp.segment_map_json, dict):
-            seg_map_int = {}
-            for k, v in inp.segment_map_json.items():
-                try:
-                    seg_map_int[int(k)] = str(v)
-                except Exception:
-                    continue
+        seg_map_int = _segment_map_int(inp.segment_map_json)
+        return await _ml_call(
+            ml.apredict_segment(inp.segmentation_json, segment_map=seg_map_int, debug=bool(inp.debug))
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML service error: {e}")
+
 
-        return ml.predict_segment(inp.segmentation_json, segment_map=seg_map_int, debug=bool(inp.debug))
+@router.post("/customers/segment/batch")
+async def predict_customer_segment_batch(inp: SegmentBatchIn):
+    """
+    Phân cụm nhiều khách 1 lần:
+      {"rows": [{...segmentation_json...}, ...], "segment_map_json": {...}, "return_distances": false}
+    """
+    try:
+        if not inp.rows:
+            raise HTTPException(status_code=400, detail="rows is required")
+        return await _run_ml_heavy(
+            ml.predict_segment_batch,
+            inp.rows,
+            segment_map=_segment_map_int(inp.segment_map_json),
+            return_distances=bool(inp.return_distances),
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -372,7 +798,30 @@ async def predict_customer_clv(inp: CLVPredictIn):
     try:
         if not inp.clv_json:
             raise HTTPException(status_code=400, detail="clv_json is required")
-        return ml.predict_clv(inp.clv_json, horizon=inp.horizon)
+        return await _ml_call(ml.apredict_clv(inp.clv_json, horizon=inp.horizon))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML service error: {e}")
+
+
+@router.post("/customers/clv/multi")
+async def predict_customer_clv_multi(inp: CLVMultiIn):
+    """
+    CLV mọi horizon trong 1 lần gọi (thay 4 lần /customers/clv):
+      { "horizons": ["1m","3m","6m","12m"], "clv_json": {...} }  -> CLV_pred {horizon: giá trị}
+      { "horizons": [...], "rows": [{...}, ...] }                -> results [{horizon: giá trị}, ...]
+    """
+    try:
+        if not inp.clv_json and not inp.rows:
+            raise HTTPException(status_code=400, detail="clv_json or rows is required")
+        if not inp.horizons:
+            raise HTTPException(status_code=400, detail="horizons is required")
+        return await _run_ml_heavy(
+            ml.predict_clv_horizons,
+            inp.rows if inp.rows else inp.clv_json,
+            horizons=inp.horizons,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -387,7 +836,8 @@ async def predict_revenue_daily_one(inp: RevenueDailyOneIn):
     try:
         if not inp.features:
             raise HTTPException(status_code=400, detail="features is required")
-        return ml.predict_daily_revenue(
+        return await _run_ml(
+            ml.predict_daily_revenue,
             inp.features,
             target=inp.target,
             transform_mode=inp.transform_mode,
@@ -402,9 +852,11 @@ async def predict_revenue_daily_one(inp: RevenueDailyOneIn):
 
 @router.post("/forecast/daily_csv")
 async def forecast_from_daily_csv(
+    response: Response,
     file: UploadFile = File(...),
-    mode: str = Form("ALL"),  # "ALL" or "ONE"
-    target: str = Form("daily_revenue_order"),  # nếu mode="ONE"
+    mode: str = Form("ALL"),  # "ALL" | "ONE" | "MULTI"
+    target: str = Form("daily_revenue_order"),  # nếu mode="ONE"/"MULTI"
+    series_col: str = Form("series_id"),  # nếu mode="MULTI": CSV dạng long, 1 series / giá trị cột này
     horizon: int = Form(30),
     hist_days: int = Form(365),
     start_date: Optional[str] = Form(None),  # yyyy-mm-dd hoặc None
@@ -417,52 +869,483 @@ async def forecast_from_daily_csv(
     line_transform_mode: str = Form("raw"),
     line_transform_scale: float = Form(1.0),
     append_transformed_to_history: bool = Form(True),
+    extra_targets: Optional[str] = Form(None),  # mode="ALL": JSON list series/model thêm
+    no_cache: bool = Form(False),  # True -> bỏ qua cache kết quả (vẫn ghi kết quả mới vào cache)
+    output_format: str = Form("records"),  # records | columnar | ndjson | arrow | parquet
+    interval_paths: int = Form(0),  # > 0: Monte Carlo interval với số sample path này (ALL/ONE)
+    interval_quantiles: str = Form("0.1,0.5,0.9"),
+    interval_backtest_days: int = Form(90),  # residual lấy từ backtest one-step N ngày trước start
+    interval_seed: Optional[int] = Form(None),
 ):
     """
     Input đúng Streamlit:
     - upload CSV
     - horizon/hist_days/start_date/holiday...
     - transform mode/scale cho order/line
+    - ALL: order + line (+ extra_targets) chạy song song trên cùng dataset đã clean
+    - MULTI: forecast mọi series trong `series_col` cùng lúc (1 predict / ngày cho tất cả series)
+    Kết quả được cache theo hash(CSV + tham số + model); header X-Forecast-Cache: HIT | MISS | BYPASS
+    (interval không có interval_seed thì không cache: mỗi lần chạy ra quantile khác).
+    output_format:
+    - records (mặc định, như cũ) | columnar ({cột: [..]})
+    - ndjson: dòng đầu {"debug"}, sau đó stream từng ngày ngay khi recursion tính xong (không cache)
+    - arrow / parquet: bytes (debug nằm trong schema metadata key "debug"); cần pyarrow
+    interval_paths > 0: thêm cột quantile (prediction_p10/p50/p90 hoặc pred_{target}_p10...) cạnh prediction.
     """
     try:
+        fmt = _output_format(output_format)
+        extra = _parse_forecast_targets(extra_targets)
+        interval = _parse_interval(interval_paths, interval_quantiles, interval_backtest_days, interval_seed)
+        mode_u = str(mode).upper()
+        if interval is not None and (mode_u == "MULTI" or fmt == "ndjson"):
+            raise HTTPException(status_code=400, detail="interval chỉ hỗ trợ mode ALL/ONE và output_format khác ndjson")
         content = await file.read()
-        df = pd.read_csv(pd.io.common.BytesIO(content))
-
         mmdd_list = [x.strip() for x in (holiday_mmdd or "").split(",") if x.strip()]
-
-        if str(mode).upper() == "ONE":
-            res = ml.forecast_one_target(
-                df=df,
+        is_order = target == "daily_revenue_order"
+
+        headers: Dict[str, str] = {}
+        cache_key: Optional[str] = None
+        # interval không seed: mỗi lần chạy ra quantile khác -> không cache
+        cacheable = fmt != "ndjson" and (interval is None or interval.seed is not None)
+        if forecast_cache.enabled and cacheable:
+            cache_key = await _run_ml(
+                _forecast_cache_key,
+                content,
+                mode=mode_u,
                 target=target,
-                horizon=horizon,
+                series_col=series_col,
+                horizon=int(horizon),
+                hist_days=int(hist_days),
                 start_date=start_date,
                 holiday_mmdd=mmdd_list,
-                holiday_window_days=holiday_window_days,
-                hist_days=hist_days,
-                clip_negative_to_zero=clip_negative_to_zero,
-                transform_mode=(order_transform_mode if target == "daily_revenue_order" else line_transform_mode),
-                transform_scale=(order_transform_scale if target == "daily_revenue_order" else line_transform_scale),
-                append_transformed_to_history=append_transformed_to_history,
+                holiday_window_days=int(holiday_window_days),
+                clip_negative_to_zero=bool(clip_negative_to_zero),
+                order_transform=(order_transform_mode, float(order_transform_scale)),
+                line_transform=(line_transform_mode, float(line_transform_scale)),
+                append_transformed_to_history=bool(append_transformed_to_history),
+                extra=extra,
+                output_format=fmt,
+                interval=asdict(interval) if interval is not None else None,
             )
-            return res
-
-        res = ml.forecast_all_targets(
-            df=df,
+            headers["X-Forecast-Cache-Key"] = cache_key
+            if not no_cache:
+                hit = await _run_ml(forecast_cache.get, cache_key)
+                if hit is not None:
+                    headers["X-Forecast-Cache"] = "HIT"
+                    headers["X-Forecast-Cache-Tier"] = hit[1]
+                    return _forecast_result_response(response, hit[0], fmt, headers)
+        headers["X-Forecast-Cache"] = "BYPASS" if (no_cache or cache_key is None) else "MISS"
+
+        df = await _run_ml(pd.read_csv, pd.io.common.BytesIO(content))
+
+        common = dict(
             horizon=horizon,
             start_date=start_date,
             holiday_mmdd=mmdd_list,
             holiday_window_days=holiday_window_days,
             hist_days=hist_days,
             clip_negative_to_zero=clip_negative_to_zero,
-            order_transform_mode=order_transform_mode,
-            order_transform_scale=float(order_transform_scale),
-            line_transform_mode=line_transform_mode,
-            line_transform_scale=float(line_transform_scale),
             append_transformed_to_history=append_transformed_to_history,
         )
+        if mode_u == "MULTI":
+            run_fn, stream_fn = ml.forecast_multi_series, ml.stream_multi_series
+            kwargs = dict(
+                common,
+                target=target,
+                series_col=series_col,
+                transform_mode=(order_transform_mode if is_order else line_transform_mode),
+                transform_scale=float(order_transform_scale if is_order else line_transform_scale),
+            )
+        elif mode_u == "ONE":
+            run_fn, stream_fn = ml.forecast_one_target, ml.stream_one_target
+            kwargs = dict(
+                common,
+                target=target,
+                transform_mode=(order_transform_mode if is_order else line_transform_mode),
+                transform_scale=(order_transform_scale if is_order else line_transform_scale),
+            )
+        else:
+            run_fn, stream_fn = ml.forecast_all_targets, ml.stream_all_targets
+            kwargs = dict(
+                common,
+                order_transform_mode=order_transform_mode,
+                order_transform_scale=float(order_transform_scale),
+                line_transform_mode=line_transform_mode,
+                line_transform_scale=float(line_transform_scale),
+                extra_targets=extra,
+            )
+
+        if fmt == "ndjson":
+            # dựng engine + validate ngay (lỗi -> HTTP error), rows chạy dần trong lúc stream
+            debug, rows = await _run_ml(stream_fn, df, **kwargs)
+            return StreamingResponse(_ndjson_stream(debug, rows), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+        if interval is not None:
+            kwargs["interval"] = interval
+        res = await _run_ml_heavy(run_fn, df, output=("frame" if fmt in BINARY_FORMATS else fmt), **kwargs)
+        if fmt in BINARY_FORMATS:
+            res = await _run_ml(_forecast_bytes, res, fmt)
+
+        if cache_key is not None:
+            await _run_ml(forecast_cache.set, cache_key, res)
+        return _forecast_result_response(response, res, fmt, headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast error: {e}")
+
+
+@router.post("/forecast/backtest")
+async def forecast_backtest(
+    file: UploadFile = File(...),
+    mode: str = Form("ALL"),  # "ALL" (order + line) | "ONE"
+    target: str = Form("daily_revenue_order"),  # nếu mode="ONE"
+    start_date: Optional[str] = Form(None),  # mặc định end_date - bt_days
+    end_date: Optional[str] = Form(None),  # mặc định ngày cuối trong file
+    bt_days: int = Form(60),
+    min_hist: int = Form(28),
+    holiday_mmdd: str = Form("01-01,02-14,03-08,04-30,05-01,09-02,10-20,11-11,12-12,12-25"),
+    holiday_window_days: int = Form(3),
+    candidates: Optional[str] = Form(None),  # JSON [{mode, scale}], scale có thể là "median"
+    include_rows: bool = Form(False),
+):
+    """
+    Backtest one-step + auto-calibrate transform (thay nút "Auto-calibrate" của Streamlit):
+    trả bảng MAE/MAPE theo (mode, scale) cho từng target và `suggested` để điền vào
+    order_transform_mode/scale, line_transform_mode/scale của /forecast/daily_csv.
+    """
+    try:
+        cands = None
+        if candidates and candidates.strip():
+            try:
+                cands = json.loads(candidates)
+                if not isinstance(cands, list) or not all(isinstance(c, dict) for c in cands) or not cands:
+                    raise ValueError("candidates must be a non-empty JSON list of {mode, scale}")
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid candidates: {e}")
+
+        content = await file.read()
+        df = await _run_ml(pd.read_csv, pd.io.common.BytesIO(content))
+        mmdd_list = [x.strip() for x in (holiday_mmdd or "").split(",") if x.strip()]
+
+        targets = list(DEFAULT_FORECAST_TARGETS)
+        if str(mode).upper() == "ONE":
+            targets = [t for t in targets if t.target_col == target]
+            if not targets:
+                raise HTTPException(status_code=400, detail="target must be daily_revenue_order or daily_revenue_line")
+
+        return await _run_ml_heavy(
+            ml.backtest_targets,
+            df,
+            targets=targets,
+            start_date=start_date,
+            end_date=end_date,
+            holiday_mmdd=mmdd_list,
+            holiday_window_days=holiday_window_days,
+            bt_days=bt_days,
+            min_hist=min_hist,
+            candidates=cands,
+            include_rows=include_rows,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Backtest error: {e}")
+
+
+@router.post("/forecast/scenarios")
+async def forecast_scenarios(
+    file: UploadFile = File(...),
+    scenarios: str = Form(...),  # JSON list các bộ tham số (xem ForecastScenarioIn)
+    mode: str = Form("ALL"),  # "ALL" (order + line) | "ONE"
+    target: str = Form("daily_revenue_order"),  # nếu mode="ONE"
+    horizon: int = Form(30),
+    hist_days: int = Form(365),
+    holiday_mmdd: str = Form("01-01,02-14,03-08,04-30,05-01,09-02,10-20,11-11,12-12,12-25"),
+    holiday_window_days: int = Form(3),
+    output_format: str = Form("records"),  # records | columnar | arrow | parquet
+):
+    """
+    What-if: upload CSV 1 lần + nhiều bộ tham số (start_date, holiday, transform, append...) thay vì N lần /forecast/daily_csv.
+    Mọi kịch bản chạy lockstep (mỗi ngày 1 lần predict cho tất cả) -> scenarios {tên: forecast} + summary so sánh
+    (delta so với kịch bản đầu tiên). arrow/parquet: 1 bảng long có cột scenario, summary nằm trong metadata debug.
+    """
+    try:
+        fmt = _output_format(output_format)
+        if fmt == "ndjson":
+            raise HTTPException(status_code=400, detail="output_format=ndjson không hỗ trợ cho scenarios")
+        scs = _parse_scenarios(scenarios)
+
+        targets = list(DEFAULT_FORECAST_TARGETS)
+        if str(mode).upper() == "ONE":
+            targets = [t for t in targets if t.target_col == target]
+            if not targets:
+                raise HTTPException(status_code=400, detail="target must be daily_revenue_order or daily_revenue_line")
+
+        content = await file.read()
+        df = await _run_ml(pd.read_csv, pd.io.common.BytesIO(content))
+        mmdd_list = [x.strip() for x in (holiday_mmdd or "").split(",") if x.strip()]
+
+        res = await _run_ml_heavy(
+            ml.forecast_scenarios,
+            df,
+            scenarios=scs,
+            targets=targets,
+            horizon=horizon,
+            holiday_mmdd=mmdd_list,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+            output=("frame" if fmt in BINARY_FORMATS else fmt),
+        )
+        if fmt in BINARY_FORMATS:
+            debug = {**res["debug"], "summary": res["summary"]}
+            data = await _run_ml(frame_to_bytes, res["forecast"], fmt, debug)
+            return Response(content=data, media_type=MEDIA_TYPES[fmt])
+        if fmt == "columnar":
+            return Response(content=output_dumps(res), media_type=MEDIA_TYPES[fmt])
         return res
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scenario forecast error: {e}")
+
+
+# ---------- Forecast sessions ----------
+@router.post("/forecast/sessions")
+async def create_forecast_session(
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None),
+    hist_days: int = Form(365),
+    holiday_mmdd: str = Form("01-01,02-14,03-08,04-30,05-01,09-02,10-20,11-11,12-12,12-25"),
+    holiday_window_days: int = Form(3),
+):
+    """
+    Đăng ký 1 series daily (upload CSV 1 lần); service giữ `hist_days` ngày cuối đã clean.
+    Các lần sau chỉ cần append ngày mới + gọi forecast theo session_id.
+    """
+    try:
+        content = await file.read()
+        df = await _run_ml(pd.read_csv, pd.io.common.BytesIO(content))
+        mmdd_list = [x.strip() for x in (holiday_mmdd or "").split(",") if x.strip()]
+        s = await _run_ml(
+            forecast_sessions.register,
+            df,
+            session_id=session_id,
+            hist_days=hist_days,
+            holiday_mmdd=mmdd_list,
+            holiday_window_days=holiday_window_days,
+        )
+        return s.summary()
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast session error: {e}")
+
+
+@router.get("/forecast/sessions/{session_id}")
+async def get_forecast_session(session_id: str):
+    try:
+        s = await _run_ml(_get_forecast_session, session_id)
+        return s.summary()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast session error: {e}")
+
+
+@router.post("/forecast/sessions/{session_id}/append")
+async def append_forecast_session(session_id: str, inp: ForecastSessionAppendIn):
+    """
+    Thêm ngày actual mới (ngày đã có thì ghi đè), không cần upload lại cả CSV.
+    """
+    try:
+        if not inp.rows:
+            raise HTTPException(status_code=400, detail="rows is required")
+        await _run_ml(_get_forecast_session, session_id)
+        s = await _run_ml(forecast_sessions.append, session_id, pd.DataFrame(inp.rows))
+        return s.summary()
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast session error: {e}")
+
+
+@router.post("/forecast/sessions/{session_id}/forecast")
+async def forecast_from_session(session_id: str, inp: ForecastSessionForecastIn = Body(default_factory=ForecastSessionForecastIn)):
+    """
+    Forecast từ history trong session (không parse CSV); output giống /forecast/daily_csv.
+    """
+    try:
+        s = await _run_ml(_get_forecast_session, session_id)
+        prepared = s.prepared
+        hist_days = min(int(inp.hist_days or s.hist_days), s.hist_days)
+
+        if str(inp.mode).upper() == "ONE":
+            is_order = inp.target == "daily_revenue_order"
+            return await _run_ml_heavy(
+                ml.forecast_one_target,
+                df=prepared,
+                target=inp.target,
+                horizon=inp.horizon,
+                start_date=inp.start_date,
+                holiday_mmdd=s.holiday_mmdd,
+                holiday_window_days=s.holiday_window_days,
+                hist_days=hist_days,
+                clip_negative_to_zero=inp.clip_negative_to_zero,
+                transform_mode=(inp.order_transform_mode if is_order else inp.line_transform_mode),
+                transform_scale=(inp.order_transform_scale if is_order else inp.line_transform_scale),
+                append_transformed_to_history=inp.append_transformed_to_history,
+            )
 
+        return await _run_ml_heavy(
+            ml.forecast_all_targets,
+            df=prepared,
+            horizon=inp.horizon,
+            start_date=inp.start_date,
+            holiday_mmdd=s.holiday_mmdd,
+            holiday_window_days=s.holiday_window_days,
+            hist_days=hist_days,
+            clip_negative_to_zero=inp.clip_negative_to_zero,
+            order_transform_mode=inp.order_transform_mode,
+            order_transform_scale=float(inp.order_transform_scale),
+            line_transform_mode=inp.line_transform_mode,
+            line_transform_scale=float(inp.line_transform_scale),
+            append_transformed_to_history=inp.append_transformed_to_history,
+            extra_targets=_to_forecast_targets(inp.extra_targets),
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Forecast error: {e}")
+
+
+@router.delete("/forecast/sessions/{session_id}")
+async def delete_forecast_session(session_id: str):
+    try:
+        found = await _run_ml(forecast_sessions.delete, session_id)
+        if not found:
+            raise HTTPException(status_code=404, detail=f"Forecast session not found: {session_id}")
+        return {"session_id": session_id, "deleted": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast session error: {e}")
+
+
+# ==========================================================
+# CUSTOMER SNAPSHOT — churn + segment + CLV 1 lượt cho cả tập khách (job nền)
+# ==========================================================
+
+@router.post("/snapshots", status_code=202)
+async def create_customer_snapshot(
+    file: UploadFile = File(...),
+    input_format: str = Form("auto"),  # auto (theo đuôi file) | csv | parquet | ndjson
+    output_format: str = Form("parquet"),  # parquet | ndjson
+    chunk_size: int = Form(config.SNAPSHOT_CHUNK_SIZE),
+    models: str = Form("churn,segment,clv"),
+    clv_horizons: str = Form("1m,3m,6m,12m"),
+    id_cols: str = Form("customer_id,snapshot_date"),  # cột được chép nguyên sang snapshot (nếu có trong file)
+    segment_map_json: Optional[str] = Form(None),  # {"0": "...", "1": "..."}
+    job_id: Optional[str] = Form(None),
+):
+    """
+    Snapshot CustomerAnalyticsSnapshot cho cả bảng feature khách (thay vì gọi churn/segment/CLV từng khách):
+    đọc file theo khúc `chunk_size` dòng, mỗi khúc chạy churn + segment + CLV (mọi horizon) vectorized và song song,
+    ghi nối vào 1 file Parquet/NDJSON. Trả 202 + job; theo dõi tiến độ/thời gian ở GET /snapshots/{job_id},
+    tải kết quả ở GET /snapshots/{job_id}/download.
+    """
+    try:
+        try:
+            in_fmt = normalize_input_format(input_format, file.filename)
+            out_fmt = normalize_snapshot_format(output_format)
+        except (InputFormatUnavailable, SnapshotOutputUnavailable) as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        model_list = [m.lower() for m in _csv_list(models)]
+        horizons = [h.lower() for h in _csv_list(clv_horizons)]
+        try:
+            seg_raw = json.loads(segment_map_json) if segment_map_json else None
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"segment_map_json không phải JSON hợp lệ: {e}")
+        try:
+            await _run_ml(ml.check_snapshot_models, model_list, horizons)
+        except (ValueError, FileNotFoundError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        job = await _run_ml(
+            snapshot_jobs.submit,
+            file.file,
+            input_format=in_fmt,
+            output_format=out_fmt,
+            chunk_size=chunk_size,
+            job_id=job_id or None,
+            models=tuple(model_list),
+            clv_horizons=tuple(horizons),
+            id_cols=tuple(_csv_list(id_cols)),
+            segment_map=_segment_map_int(seg_raw),
+        )
+        return job.summary()
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot error: {e}")
+
+
+@router.get("/snapshots")
+async def list_customer_snapshots():
+    return {"jobs": snapshot_jobs.list_jobs()}
+
+
+@router.get("/snapshots/{job_id}")
+async def get_customer_snapshot(job_id: str):
+    return _get_snapshot_job(job_id).summary()
+
+
+@router.get("/snapshots/{job_id}/download")
+async def download_customer_snapshot(job_id: str):
+    job = _get_snapshot_job(job_id)
+    if job.state != "done":
+        raise HTTPException(status_code=409, detail=f"Snapshot job {job_id} chưa xong (state={job.state})")
+    if not job.output_path.exists():
+        raise HTTPException(status_code=410, detail=f"Snapshot file đã bị xoá: {job_id}")
+    media_type = MEDIA_TYPES["parquet"] if job.output_format == "parquet" else MEDIA_TYPES["ndjson"]
+    return FileResponse(job.output_path, media_type=media_type, filename=job.output_path.name)
+
+
+@router.delete("/snapshots/{job_id}")
+async def delete_customer_snapshot(job_id: str):
+    """Job đang chạy -> huỷ trước khúc kế tiếp; job đã xong -> xoá khỏi lịch sử cùng file kết quả."""
+    try:
+        found = await _run_ml(snapshot_jobs.delete, job_id)
+        if not found:
+            raise HTTPException(status_code=404, detail=f"Snapshot job not found: {job_id}")
+        return {"job_id": job_id, "deleted": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot error: {e}")
+
+
+@router.get("/ml/stats")
+async def ml_runtime_stats():
+    """
+    Trạng thái execution layer: queue depth/running của thread/process pool + micro-batcher
+    + cache model (hit/miss/eviction, bytes/budget).
+    """
+    return {
+        "executor": ml_executor.stats(),
+        "micro_batcher": micro_batcher.stats(),
+        "model_cache": model_store.cache_stats(),
+        "forecast_sessions": forecast_sessions.stats(),
+        "forecast_cache": forecast_cache.stats(),
+        "snapshot_jobs": snapshot_jobs.stats(),
+    }
@@ -0,0 +1,85 @@
+# app/services/bulk_input.py
+from __future__ import annotations
+
+from typing import BinaryIO, Iterator, List, Optional
+
+import pandas as pd
+
+# ---------- Optional Parquet ----------
+try:
+    import pyarrow.parquet as pq
+    _PARQUET_AVAILABLE = True
+except Exception:
+    pq = None
+    _PARQUET_AVAILABLE = False
+
+# csv     : pd.read_csv(chunksize)
+# parquet : ParquetFile.iter_batches (cần pyarrow)
+# ndjson  : 1 object JSON / dòng, pd.read_json(lines=True, chunksize)
+BULK_INPUT_FORMATS = ("csv", "parquet", "ndjson")
+
+_EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+
+class InputFormatUnavailable(RuntimeError):
+    """Format input cần thư viện tuỳ chọn chưa cài (pyarrow)."""
+
+
+def normalize_input_format(fmt: Optional[str], filename: Optional[str] = None) -> str:
+    """fmt rỗng / "auto" -> đoán theo đuôi file (mặc định csv)."""
+    f = (fmt or "auto").strip().lower()
+    if f == "auto":
+        name = (filename or "").lower()
+        f = next((v for ext, v in _EXTENSIONS.items() if name.endswith(ext)), "csv")
+    if f == "jsonl":
+        f = "ndjson"
+    if f not in BULK_INPUT_FORMATS:
+        raise ValueError(f"input_format must be one of auto, {', '.join(BULK_INPUT_FORMATS)}")
+    if f == "parquet" and not _PARQUET_AVAILABLE:
+        raise InputFormatUnavailable("input_format=parquet cần pyarrow (pip install pyarrow)")
+    return f
+
+
+def iter_frames(
+    fileobj: BinaryIO,
+    fmt: str,
+    chunk_size: int,
+    columns: Optional[List[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Đọc file theo từng khúc tối đa `chunk_size` dòng -> bộ nhớ chỉ giữ 1 khúc input tại 1 thời điểm.
+    columns: chỉ đọc các cột này (parquet đọc theo cột; csv/ndjson bỏ cột thừa sau khi parse khúc).
+    """
+    chunk_size = max(1, int(chunk_size))
+    if fmt == "parquet":
+        if not _PARQUET_AVAILABLE:
+            raise InputFormatUnavailable("input_format=parquet cần pyarrow (pip install pyarrow)")
+        pf = pq.ParquetFile(fileobj)
+        cols = [c for c in columns if c in pf.schema_arrow.names] if columns is not None else None
+        for batch in pf.iter_batches(batch_size=chunk_size, columns=cols):
+            yield batch.to_pandas()
+        return
+
+    wanted = set(columns) if columns is not None else None
+    if fmt == "csv":
+        reader = pd.read_csv(
+            fileobj,
+            chunksize=chunk_size,
+            usecols=(lambda c: c in wanted) if wanted is not None else None,
+        )
+    elif fmt == "ndjson":
+        reader = pd.read_json(fileobj, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+    with reader:
+        for chunk in reader:
+            if wanted is not None and fmt == "ndjson":
+                chunk = chunk[[c for c in chunk.columns if c in wanted]]
+            yield chunk
@@ -0,0 +1,116 @@
+# app/services/forecast_backtest.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.services.forecast_engine import LAG_FEATURES, ROLL_FEATURES, calendar_features
+
+TRANSFORM_MODES = ("raw", "expm1", "raw_scale", "expm1_scale")
+
+
+def one_step_feature_matrix(
+    expected: Sequence[str],
+    values: np.ndarray,
+    positions: np.ndarray,
+    dates: pd.DatetimeIndex,
+    holiday_flags: np.ndarray,
+) -> np.ndarray:
+    """
+    Ma trận feature one-step (N, n_features) cho các ngày test, tính 1 lần bằng NumPy.
+    Ngày test thứ i nằm ở vị trí positions[i] trong `values` (series đã sort theo ngày);
+    history của nó là values[:positions[i]] — cùng định nghĩa feature với RecursiveForecastEngine:
+    - lag_k = values[p - k] (history ngắn hơn k -> values[0])
+    - roll_mean_w = sum(values[p - w:p]) / w (history ngắn hơn w -> mean toàn bộ history)
+    """
+    values = np.asarray(values, dtype=float)
+    p = np.asarray(positions, dtype=np.int64)
+    X = np.zeros((len(p), len(expected)), dtype=float)
+    cal = calendar_features(pd.DatetimeIndex(dates))
+    cal["is_holiday_window"] = np.asarray(holiday_flags)
+
+    for j, c in enumerate(expected):
+        if c in cal:
+            X[:, j] = cal[c]
+        elif c in LAG_FEATURES:
+            k = LAG_FEATURES[c]
+            X[:, j] = np.where(p >= k, values[np.maximum(p - k, 0)], values[0])
+        elif c in ROLL_FEATURES:
+            w = ROLL_FEATURES[c]
+            full = p >= w
+            col = np.empty(len(p), dtype=float)
+            if full.any() and len(values) >= w:
+                col[full] = sliding_window_view(values, w)[p[full] - w].sum(axis=1) / w
+            for i in np.flatnonzero(~full):
+                col[i] = values[:p[i]].sum() / p[i]
+            X[:, j] = col
+        # cột khác giữ 0
+    return X
+
+
+def default_transform_candidates(median_ratio: float) -> List[Dict[str, Any]]:
+    """Bộ candidate như Streamlit (eval_transform_candidates)."""
+    return [
+        {"mode": "raw", "scale": 1.0},
+        {"mode": "expm1", "scale": 1.0},
+        {"mode": "raw_scale", "scale": 3.0},
+        {"mode": "raw_scale", "scale": median_ratio},
+        {"mode": "expm1_scale", "scale": 3.0},
+        {"mode": "expm1_scale", "scale": median_ratio},
+    ]
+
+
+def transform_matrix(pred_raw: np.ndarray, modes: Sequence[str], scales: Sequence[float]) -> np.ndarray:
+    """
+    Áp C candidate (mode, scale) lên N giá trị raw -> ma trận (C, N).
+    raw/expm1 tính 1 lần rồi nhân vector scale; raw/expm1 (không *_scale) luôn scale = 1.
+    """
+    pred_raw = np.asarray(pred_raw, dtype=float)
+    modes = [m if m in TRANSFORM_MODES else "raw" for m in modes]
+    use_expm1 = np.array([m.startswith("expm1") for m in modes])
+    scale = np.array([float(s) if m.endswith("_scale") else 1.0 for m, s in zip(modes, scales)], dtype=float)
+
+    base = np.where(use_expm1[:, None], np.expm1(pred_raw)[None, :], pred_raw[None, :])
+    return base * scale[:, None]
+
+
+def rank_transform_candidates(
+    actual: np.ndarray,
+    pred_raw: np.ndarray,
+    candidates: Sequence[Dict[str, Any]],
+    sort_by: str = "MAPE",
+) -> pd.DataFrame:
+    """MAE/MAPE của mọi candidate trong 1 lượt tính ma trận; sort tăng dần theo `sort_by`."""
+    y_true = np.asarray(actual, dtype=float)
+    modes = [str(c.get("mode", "raw")) for c in candidates]
+    scales = [float(c.get("scale", 1.0)) for c in candidates]
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        Y = transform_matrix(pred_raw, modes, scales)
+        err = np.abs(Y - y_true[None, :])
+        mae = err.mean(axis=1)
+        mape = (err / np.maximum(np.abs(y_true), 1e-9)[None, :]).mean(axis=1)
+
+    res = pd.DataFrame({"mode": modes, "scale": scales, "MAE": mae, "MAPE": mape})
+    return res.sort_values(sort_by, kind="stable").reset_index(drop=True)
+
+
+def median_ratio(actual: np.ndarray, pred_raw: np.ndarray) -> float:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.asarray(actual, dtype=float) / np.asarray(pred_raw, dtype=float)
+    ratio = ratio[np.isfinite(ratio)]
+    med: Optional[float] = float(np.median(ratio)) if len(ratio) else None
+    return med if med is not None and np.isfinite(med) and med > 0 else 1.0
+
+
+def finite_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """to_dict(records) nhưng inf/NaN -> None (expm1 trên target không log có thể tràn; JSON không có inf)."""
+    out = df.to_dict(orient="records")
+    for row in out:
+        for k, v in row.items():
+            if isinstance(v, float) and not np.isfinite(v):
+                row[k] = None
+    return out
@@ -0,0 +1,78 @@
+# app/services/forecast_dataset.py
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class ForecastTarget:
+    """
+    1 series cần forecast: cột target trong CSV + alias model trong ModelStore.
+    `name` dùng đặt tên cột output (pred_{name}, pred_{name}_raw) và key debug.
+    """
+    name: str
+    target_col: str
+    model_name: str
+    transform_mode: str = "raw"
+    transform_scale: float = 1.0
+
+
+DEFAULT_FORECAST_TARGETS: Tuple[ForecastTarget, ...] = (
+    ForecastTarget("order", "daily_revenue_order", "xgb_daily_revenue_order"),
+    ForecastTarget("line", "daily_revenue_line", "xgb_daily_revenue_line"),
+)
+
+
+class PreparedDailyDataset:
+    """
+    Dataset daily đã clean 1 lần (parse/sort date, cột lịch, is_holiday_window) — dùng chung
+    cho nhiều target/model trong cùng request thay vì mỗi lần forecast lại copy + parse + sort.
+
+    - df: DataFrame đã qua MLService._ensure_base_time_cols (không bị sửa sau đó)
+    - series(target_col): (dates, values) của target đã ép số + bỏ NaN, cache theo cột (thread-safe)
+    - pickle được (gửi sang process pool của run_heavy): bỏ `_lock` khi pickle, tạo lại khi unpickle
+    """
+
+    def __init__(self, df: pd.DataFrame, holiday_mmdd: Optional[List[str]] = None, holiday_window_days: int = 0):
+        self.df = df
+        self.holiday_mmdd = list(holiday_mmdd or [])
+        self.holiday_window_days = int(holiday_window_days)
+        self.dates = pd.DatetimeIndex(pd.to_datetime(df["date"]))
+        self._series: Dict[str, Tuple[pd.DatetimeIndex, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, object]:
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def has_column(self, col: str) -> bool:
+        return col in self.df.columns
+
+    def series(self, target_col: str) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        with self._lock:
+            cached = self._series.get(target_col)
+        if cached is not None:
+            return cached
+
+        if target_col not in self.df.columns:
+            raise ValueError(f"CSV thiếu cột `{target_col}`.")
+        values = pd.to_numeric(self.df[target_col], errors="coerce")
+        mask = values.notna().to_numpy()
+        out = (self.dates[mask], values.to_numpy(dtype=float)[mask])
+
+        with self._lock:
+            self._series.setdefault(target_col, out)
+            return self._series[target_col]
@@ -0,0 +1,170 @@
+# app/services/forecast_engine.py
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Feature history-based mà model forecast dùng (tên cột -> số ngày)
+LAG_FEATURES: Dict[str, int] = {"lag_1": 1, "lag_7": 7, "lag_14": 14}
+ROLL_FEATURES: Dict[str, int] = {"roll_mean_7": 7, "roll_mean_28": 28}
+
+PredictFn = Callable[[np.ndarray], np.ndarray]
+# post(step, raw[S]) -> (giá trị trả ra[S], giá trị append vào history[S])
+PostFn = Callable[[int, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def calendar_features(dates: pd.DatetimeIndex) -> Dict[str, np.ndarray]:
+    """
+    Feature lịch cho 1 dãy ngày (vector hóa): weekday (0 = thứ 2), month, year, is_weekend (weekday >= 5),
+    season_* one-hot theo tháng (xuân 3-5, hạ 6-8, thu 9-11, đông 12-2).
+    """
+    wd = np.asarray(dates.dayofweek, dtype=np.int64)
+    mo = np.asarray(dates.month, dtype=np.int64)
+    return {
+        "weekday": wd,
+        "month": mo,
+        "year": np.asarray(dates.year, dtype=np.int64),
+        "is_weekend": (wd >= 5).astype(np.int64),
+        "season_spring": np.isin(mo, (3, 4, 5)).astype(np.int64),
+        "season_summer": np.isin(mo, (6, 7, 8)).astype(np.int64),
+        "season_autumn": np.isin(mo, (9, 10, 11)).astype(np.int64),
+        "season_winter": np.isin(mo, (12, 1, 2)).astype(np.int64),
+    }
+
+
+class RecursiveForecastEngine:
+    """
+    Engine forecast đệ quy trên NumPy cho S dãy cùng lúc (S=1: 1 series; S>1: nhiều series / path / kịch bản).
+
+    - History mỗi dãy nằm trong 1 buffer cấp phát sẵn (S, L + horizon), căn phải tại cột L,
+      mỗi bước chỉ ghi thêm 1 cột -> không copy history như `hist_ext.loc[d] = ...`.
+    - Feature của ngày d tính trên history h (mọi giá trị trước d, kể cả giá trị đã dự báo):
+      lag_k = h[-k] (h ngắn hơn k -> h[0]); roll_mean_w = mean(h[-w:]) (h ngắn hơn w -> mean toàn bộ h);
+      lịch theo calendar_features; is_holiday_window theo holiday_flags truyền vào; cột khác = 0.
+    - lag_k đọc theo index; roll_mean_w = tổng lát cắt w phần tử / w
+      (cùng phép cộng với pandas `tail(w).mean()` nên kết quả khớp vòng lặp pandas theo từng ngày).
+    - Feature row ghi vào 1 ma trận float (S, n_features) dùng lại, đúng thứ tự cột model yêu cầu;
+      mỗi bước gọi predict 1 lần cho cả S dãy.
+    """
+
+    def __init__(
+        self,
+        expected: Sequence[str],
+        histories: Sequence[np.ndarray],
+        future_dates: pd.DatetimeIndex | Sequence[pd.DatetimeIndex],
+        holiday_flags: Optional[np.ndarray] = None,
+    ):
+        self.expected: List[str] = list(expected)
+        self.n_series = len(histories)
+        if self.n_series == 0:
+            raise ValueError("Cần ít nhất 1 history.")
+
+        if isinstance(future_dates, pd.DatetimeIndex):
+            per_row = [future_dates] * self.n_series
+        else:
+            per_row = [pd.DatetimeIndex(d) for d in future_dates]
+            if len(per_row) != self.n_series:
+                raise ValueError("future_dates phải có 1 dãy ngày cho mỗi history.")
+        self.horizon = len(per_row[0])
+        if any(len(d) != self.horizon for d in per_row):
+            raise ValueError("Mọi dãy future_dates phải cùng độ dài.")
+        self.future_dates: List[pd.DatetimeIndex] = per_row
+
+        lens = np.array([len(h) for h in histories], dtype=np.int64)
+        if (lens < 1).any():
+            raise ValueError("History rỗng.")
+        self._L = int(lens.max())
+        self._buf = np.zeros((self.n_series, self._L + self.horizon), dtype=float)
+        for i, h in enumerate(histories):
+            self._buf[i, self._L - len(h):self._L] = np.asarray(h, dtype=float)
+        self._start = self._L - lens          # vị trí phần tử đầu (iloc[0]) của từng dãy
+        self._lens = lens.copy()              # độ dài history hiện tại
+        self._t = self._L                     # cột kế tiếp sẽ ghi
+        self._rows = np.arange(self.n_series)
+
+        # Feature lịch tính sẵn cho toàn horizon: (S, H)
+        shared = all(d is per_row[0] for d in per_row)
+        if shared:
+            cal0 = calendar_features(per_row[0])
+            self._calendar = {k: np.broadcast_to(v, (self.n_series, self.horizon)) for k, v in cal0.items()}
+        else:
+            cals = [calendar_features(d) for d in per_row]
+            self._calendar = {k: np.stack([c[k] for c in cals]) for k in cals[0]}
+
+        if holiday_flags is None:
+            holiday_flags = np.zeros((self.n_series, self.horizon), dtype=np.int64)
+        holiday_flags = np.asarray(holiday_flags)
+        if holiday_flags.ndim == 1:
+            holiday_flags = np.broadcast_to(holiday_flags, (self.n_series, self.horizon))
+        self._calendar["is_holiday_window"] = holiday_flags
+
+        self._X = np.zeros((self.n_series, len(self.expected)), dtype=float)
+        self._plan: List[Tuple[int, str, str, int]] = []
+        for j, c in enumerate(self.expected):
+            if c in self._calendar:
+                self._plan.append((j, "cal", c, 0))
+            elif c in LAG_FEATURES:
+                self._plan.append((j, "lag", c, LAG_FEATURES[c]))
+            elif c in ROLL_FEATURES:
+                self._plan.append((j, "roll", c, ROLL_FEATURES[c]))
+            # cột khác (không phải lịch / lag / rolling) giữ 0
+
+    @property
+    def history_lengths(self) -> np.ndarray:
+        return self._lens.copy()
+
+    def history(self, row: int = 0) -> np.ndarray:
+        return self._buf[row, self._start[row]:self._t].copy()
+
+    def _rolling_mean(self, w: int) -> np.ndarray:
+        t = self._t
+        out = self._buf[:, max(t - w, 0):t].sum(axis=1) / w
+        short = np.flatnonzero(self._lens < w)
+        for i in short:
+            # history ngắn hơn cửa sổ -> mean toàn bộ history (như hist_series.mean())
+            out[i] = self._buf[i, self._start[i]:t].sum() / self._lens[i]
+        return out
+
+    def features(self, step: int) -> np.ndarray:
+        """Ghi feature của bước `step` vào ma trận dùng lại (S, n_features) và trả về nó."""
+        X = self._X
+        t = self._t
+        for j, kind, name, k in self._plan:
+            if kind == "cal":
+                X[:, j] = self._calendar[name][:, step]
+            elif kind == "lag":
+                idx = np.where(self._lens >= k, t - k, self._start)
+                X[:, j] = self._buf[self._rows, idx]
+            else:
+                X[:, j] = self._rolling_mean(k)
+        return X
+
+    def push(self, values: np.ndarray) -> None:
+        """Append 1 giá trị mới vào history của mỗi dãy."""
+        if self._t >= self._buf.shape[1]:
+            raise ValueError("Vượt quá horizon đã cấp phát.")
+        self._buf[:, self._t] = values
+        self._t += 1
+        self._lens += 1
+
+    def steps(self, predict: PredictFn, post: PostFn) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Chạy từng ngày: yield (step, raw[S], out[S]) ngay khi tính xong (dùng cho streaming).
+        """
+        for step in range(self.horizon):
+            X = self.features(step)
+            raw = np.asarray(predict(X), dtype=float).reshape(-1)
+            out, to_history = post(step, raw)
+            self.push(to_history)
+            yield step, raw, out
+
+    def run(self, predict: PredictFn, post: PostFn) -> Tuple[np.ndarray, np.ndarray]:
+        """Chạy hết horizon; trả (raw, out) shape (S, horizon)."""
+        raw_all = np.empty((self.n_series, self.horizon), dtype=float)
+        out_all = np.empty((self.n_series, self.horizon), dtype=float)
+        for step, raw, out in self.steps(predict, post):
+            raw_all[:, step] = raw
+            out_all[:, step] = out
+        return raw_all, out_all
@@ -0,0 +1,84 @@
+# app/services/forecast_intervals.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.services.forecast_engine import PostFn, PredictFn, RecursiveForecastEngine
+
+
+@dataclass(frozen=True)
+class IntervalSpec:
+    """
+    Cấu hình Monte Carlo interval cho forecast đệ quy:
+    - paths: số sample path mô phỏng cùng lúc (0 = tắt)
+    - quantiles: các mức trả về, vd (0.1, 0.5, 0.9) -> cột prediction_p10/p50/p90
+    - backtest_days: số ngày cuối history dùng backtest one-step để lấy residual
+    - seed: cố định RNG (cùng input + seed -> cùng band)
+    """
+    paths: int = 0
+    quantiles: Tuple[float, ...] = (0.1, 0.5, 0.9)
+    backtest_days: int = 90
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if int(self.paths) < 0:
+            raise ValueError("interval paths phải >= 0.")
+        if not self.quantiles or any(not (0.0 < float(q) < 1.0) for q in self.quantiles):
+            raise ValueError("interval quantiles phải nằm trong (0, 1).")
+        if int(self.backtest_days) < 1:
+            raise ValueError("interval backtest_days phải >= 1.")
+
+    @property
+    def enabled(self) -> bool:
+        return int(self.paths) > 0
+
+    def column_names(self, prefix: str = "prediction") -> Tuple[str, ...]:
+        # giữ phần lẻ của phần trăm (0.025 -> p2.5) để các mức gần nhau không trùng tên cột
+        return tuple(f"{prefix}_p{round(float(q) * 100, 4):g}" for q in self.quantiles)
+
+
+def inverse_transform(y: np.ndarray, mode: str, scale: float) -> np.ndarray:
+    """Đưa giá trị thực tế về không gian output của model (ngược với _transform_pred_array)."""
+    y = np.asarray(y, dtype=float)
+    if mode in ("raw_scale", "expm1_scale"):
+        y = y / float(scale)
+    if mode in ("expm1", "expm1_scale"):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            y = np.log1p(y)
+    return y
+
+
+def simulate_paths(
+    engine: RecursiveForecastEngine,
+    predict: PredictFn,
+    post: PostFn,
+    residuals: np.ndarray,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Mô phỏng engine.n_series path cùng lúc (mỗi path 1 dòng của engine):
+    mỗi bước 1 lần predict cho mọi path, cộng residual bootstrap (không gian raw của model) rồi qua `post`
+    như forecast điểm -> giá trị đã nhiễu vào history, lag/rolling bước sau nhận nhiễu của bước trước.
+    Trả ma trận output (paths, horizon).
+    """
+    residuals = np.asarray(residuals, dtype=float)
+    residuals = residuals[np.isfinite(residuals)]
+    if len(residuals) == 0:
+        raise ValueError("Không có residual hợp lệ để mô phỏng interval.")
+
+    rng = np.random.default_rng(seed)
+    eps = rng.choice(residuals, size=(engine.horizon, engine.n_series), replace=True)
+
+    def noisy_post(step: int, raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return post(step, raw + eps[step])
+
+    _, out_all = engine.run(predict, noisy_post)
+    return out_all
+
+
+def path_quantiles(samples: np.ndarray, quantiles: Tuple[float, ...]) -> np.ndarray:
+    """(paths, horizon) -> (n_quantiles, horizon)."""
+    return np.quantile(samples, np.asarray(quantiles, dtype=float), axis=0)
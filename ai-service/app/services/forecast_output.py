@@ -0,0 +1,127 @@
+# app/services/forecast_output.py
+from __future__ import annotations
+
+import io
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ---------- Optional Arrow / Parquet ----------
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    _ARROW_AVAILABLE = True
+except Exception:
+    pa = None
+    pa_ipc = None
+    pq = None
+    _ARROW_AVAILABLE = False
+
+# records  : [{date, ...}, ...] (mặc định, như cũ)
+# columnar : {cột: [giá trị...]} — 1 list / field, không dựng dict từng ngày
+# ndjson   : stream 1 dòng JSON / ngày ngay khi recursion tính xong
+# arrow    : Arrow IPC stream bytes ; parquet: Parquet bytes (cần pyarrow)
+OUTPUT_FORMATS = ("records", "columnar", "ndjson", "arrow", "parquet")
+BINARY_FORMATS = ("arrow", "parquet")
+
+MEDIA_TYPES = {
+    "records": "application/json",
+    "columnar": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class OutputFormatUnavailable(RuntimeError):
+    """Format cần thư viện tuỳ chọn chưa cài (pyarrow)."""
+
+
+def normalize_output_format(fmt: Optional[str]) -> str:
+    f = (fmt or "records").strip().lower()
+    if f not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+    if f in BINARY_FORMATS and not _ARROW_AVAILABLE:
+        raise OutputFormatUnavailable(f"output_format={f} cần pyarrow (pip install pyarrow)")
+    return f
+
+
+def iso_dates(dates: Iterable) -> List[str]:
+    """Ngày -> chuỗi ISO giống cách FastAPI encode Timestamp ('2026-01-01T00:00:00')."""
+    return [d.isoformat() for d in pd.DatetimeIndex(dates)]
+
+
+def frame_to_columnar(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    out: Dict[str, List[Any]] = {}
+    for c in df.columns:
+        col = df[c]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            out[c] = iso_dates(col)
+        else:
+            out[c] = col.tolist()
+    return out
+
+
+def _debug_metadata(debug: Optional[Dict[str, Any]]) -> Optional[Dict[bytes, bytes]]:
+    if not debug:
+        return None
+    return {b"debug": json.dumps(debug, default=str).encode("utf-8")}
+
+
+def frame_to_bytes(df: pd.DataFrame, fmt: str, debug: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    DataFrame -> Arrow IPC stream / Parquet bytes; `debug` gắn vào schema metadata (key b"debug").
+    """
+    if not _ARROW_AVAILABLE:
+        raise OutputFormatUnavailable(f"output_format={fmt} cần pyarrow (pip install pyarrow)")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = _debug_metadata(debug)
+    if meta:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **meta})
+
+    buf = io.BytesIO()
+    if fmt == "arrow":
+        with pa_ipc.new_stream(buf, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "parquet":
+        pq.write_table(table, buf)
+    else:
+        raise ValueError(f"Unsupported binary format: {fmt}")
+    return buf.getvalue()
+
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, pd.Timestamp):
+        return o.isoformat()
+    return str(o)
+
+
+def dumps(obj: Any) -> str:
+    return json.dumps(obj, default=_json_default, allow_nan=False, separators=(",", ":"))
+
+
+def ndjson_lines(debug: Dict[str, Any], rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Dòng đầu {"debug": ...}, sau đó mỗi dòng 1 row forecast."""
+    yield (dumps({"debug": debug}) + "\n").encode("utf-8")
+    for row in rows:
+        yield (dumps(row) + "\n").encode("utf-8")
+
+
+def take_chunk(lines: Iterator[bytes], max_lines: int = 512, max_secs: float = 0.05) -> Optional[bytes]:
+    """
+    Lấy 1 cụm dòng từ iterator (tối đa max_lines hoặc max_secs) -> bytes; None khi đã hết.
+    Dùng để stream: đủ nhỏ để client nhận dòng sớm, đủ lớn để không tốn 1 lần nhảy thread / dòng.
+    """
+    buf: List[bytes] = []
+    deadline = time.perf_counter() + max_secs
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= max_lines or time.perf_counter() >= deadline:
+            break
+    return b"".join(buf) if buf else None
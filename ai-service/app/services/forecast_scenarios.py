@@ -0,0 +1,92 @@
+# app/services/forecast_scenarios.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.forecast_engine import PostFn
+
+
+@dataclass(frozen=True)
+class ForecastScenario:
+    """
+    1 kịch bản what-if trên cùng dataset: các tham số của /forecast/daily_csv có thể đổi giữa các lần chạy.
+    None -> dùng giá trị chung của request.
+    transforms: {tên target: (mode, scale)}; target không có trong dict -> ("raw", 1.0).
+    """
+    name: str
+    start_date: Optional[str] = None
+    holiday_mmdd: Optional[Tuple[str, ...]] = None
+    holiday_window_days: Optional[int] = None
+    hist_days: Optional[int] = None
+    clip_negative_to_zero: bool = True
+    append_transformed_to_history: bool = True
+    transforms: Dict[str, Tuple[str, float]] = field(default_factory=dict)
+
+    def transform_for(self, target_name: str) -> Tuple[str, float]:
+        mode, scale = self.transforms.get(target_name, ("raw", 1.0))
+        return str(mode), float(scale)
+
+
+def scenario_post_fn(
+    modes: Sequence[str],
+    scales: Sequence[float],
+    clip_negative_to_zero: Sequence[bool],
+    append_transformed_to_history: Sequence[bool],
+) -> PostFn:
+    """
+    post() cho engine S kịch bản: mỗi dòng có mode/scale/clip/append riêng, tính 1 lần trên vector.
+    Cùng công thức với MLService._transform_pred_array (mode lạ -> raw; chỉ *_scale mới nhân scale).
+    """
+    use_expm1 = np.array([str(m) in ("expm1", "expm1_scale") for m in modes], dtype=bool)
+    scale = np.array(
+        [float(s) if str(m) in ("raw_scale", "expm1_scale") else 1.0 for m, s in zip(modes, scales)],
+        dtype=float,
+    )
+    clip = np.asarray(clip_negative_to_zero, dtype=bool)
+    append_out = np.asarray(append_transformed_to_history, dtype=bool)
+
+    def post(_: int, raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with np.errstate(over="ignore"):
+            pred = np.where(use_expm1, np.expm1(raw), raw)
+        pred = pred * scale
+        out = np.where(clip & (pred < 0), 0.0, pred)
+        return out, np.where(append_out, out, raw)
+
+    return post
+
+
+def scenario_summary(
+    frames: Dict[str, pd.DataFrame],
+    target_names: Sequence[str],
+) -> List[Dict[str, Any]]:
+    """
+    Bảng so sánh: mỗi kịch bản 1 dòng (tổng/trung bình/min/max từng target trên horizon),
+    delta_vs_baseline_pct_{target}: % chênh tổng so với kịch bản đầu tiên (baseline).
+    """
+    if not frames:
+        return []
+    baseline = next(iter(frames))
+    base_totals = {t: float(frames[baseline][f"pred_{t}"].sum()) for t in target_names}
+
+    rows: List[Dict[str, Any]] = []
+    for name, f in frames.items():
+        row: Dict[str, Any] = {
+            "scenario": name,
+            "start_date": str(pd.to_datetime(f["date"].iloc[0]).date()) if len(f) else None,
+            "end_date": str(pd.to_datetime(f["date"].iloc[-1]).date()) if len(f) else None,
+        }
+        for t in target_names:
+            v = f[f"pred_{t}"].to_numpy(dtype=float)
+            total = float(v.sum())
+            row[f"total_{t}"] = total
+            row[f"mean_{t}"] = float(v.mean()) if len(v) else None
+            row[f"min_{t}"] = float(v.min()) if len(v) else None
+            row[f"max_{t}"] = float(v.max()) if len(v) else None
+            base = base_totals[t]
+            row[f"delta_vs_baseline_pct_{t}"] = ((total - base) / abs(base) * 100.0) if base else None
+        rows.append(row)
+    return rows
@@ -0,0 +1,208 @@
+# app/services/forecast_session.py
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+import pandas as pd
+
+from app.services.forecast_dataset import PreparedDailyDataset
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# prepare(df, holiday_mmdd, holiday_window_days) -> PreparedDailyDataset (MLService.prepare_daily_dataset)
+PrepareFn = Callable[[pd.DataFrame, List[str], int], PreparedDailyDataset]
+
+
+class SessionNotFound(KeyError):
+    """Không có forecast session với id này (trong RAM lẫn trên disk)."""
+
+
+class ForecastSession:
+    """
+    History daily của 1 client, đã clean + cắt còn `hist_days` dòng cuối (đủ cho lag/rolling và tail(hist_days)).
+    Append chỉ xử lý các ngày mới rồi ghép vào buffer; forecast chạy thẳng trên `prepared`.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        prepared: PreparedDailyDataset,
+        *,
+        hist_days: int,
+        created_at: Optional[float] = None,
+    ):
+        self.session_id = session_id
+        self.prepared = prepared
+        self.hist_days = int(hist_days)
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+
+    @property
+    def holiday_mmdd(self) -> List[str]:
+        return self.prepared.holiday_mmdd
+
+    @property
+    def holiday_window_days(self) -> int:
+        return self.prepared.holiday_window_days
+
+    def summary(self) -> Dict[str, Any]:
+        dates = self.prepared.dates
+        return {
+            "session_id": self.session_id,
+            "rows": len(self.prepared),
+            "first_date": str(dates.min().date()) if len(dates) else None,
+            "last_date": str(dates.max().date()) if len(dates) else None,
+            "hist_days": self.hist_days,
+            "holiday_mmdd": self.holiday_mmdd,
+            "holiday_window_days": self.holiday_window_days,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class ForecastSessionStore:
+    """
+    Quản lý forecast session:
+    - RAM: OrderedDict LRU tối đa `max_sessions` (session bị đẩy ra vẫn còn trên disk nếu bật persist)
+    - Disk (tuỳ chọn): `persist_dir/<id>.joblib`, ghi atomic (file tạm + os.replace) sau mỗi lần register/append
+    """
+
+    def __init__(self, *, prepare: Optional[PrepareFn] = None, persist_dir: Optional[str] = None, max_sessions: int = 256):
+        self._prepare = prepare
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self.max_sessions = max(1, int(max_sessions))
+        self._sessions: "OrderedDict[str, ForecastSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prep(self, df: pd.DataFrame, holiday_mmdd: List[str], holiday_window_days: int) -> PreparedDailyDataset:
+        if self._prepare is None:
+            raise RuntimeError("ForecastSessionStore chưa có hàm prepare.")
+        return self._prepare(df, holiday_mmdd, holiday_window_days)
+
+    # ---------------------------
+    # Disk
+    # ---------------------------
+    def _path(self, session_id: str) -> Optional[Path]:
+        return (self.persist_dir / f"{session_id}.joblib") if self.persist_dir else None
+
+    def _persist(self, s: ForecastSession) -> None:
+        path = self._path(s.session_id)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        joblib.dump(
+            {
+                "session_id": s.session_id,
+                "hist_days": s.hist_days,
+                "holiday_mmdd": s.holiday_mmdd,
+                "holiday_window_days": s.holiday_window_days,
+                "created_at": s.created_at,
+                "updated_at": s.updated_at,
+                "df": s.prepared.df,
+            },
+            tmp,
+        )
+        os.replace(tmp, path)
+
+    def _load(self, session_id: str) -> Optional[ForecastSession]:
+        path = self._path(session_id)
+        if path is None or not path.exists():
+            return None
+        data = joblib.load(path)
+        # df trên disk đã clean -> chỉ dựng lại PreparedDailyDataset, không parse lại
+        prepared = PreparedDailyDataset(data["df"], data["holiday_mmdd"], data["holiday_window_days"])
+        s = ForecastSession(session_id, prepared, hist_days=data["hist_days"], created_at=data["created_at"])
+        s.updated_at = data.get("updated_at", s.created_at)
+        return s
+
+    # ---------------------------
+    # RAM (LRU)
+    # ---------------------------
+    def _remember(self, s: ForecastSession) -> None:
+        with self._lock:
+            self._sessions[s.session_id] = s
+            self._sessions.move_to_end(s.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _trim(self, df: pd.DataFrame, hist_days: int) -> pd.DataFrame:
+        # giữ dòng cuối mỗi ngày (actual gửi lại sẽ ghi đè), rồi cắt còn hist_days ngày gần nhất
+        df = df.drop_duplicates(subset=["date"], keep="last").sort_values("date")
+        return df.tail(int(hist_days)).reset_index(drop=True)
+
+    def get(self, session_id: str) -> ForecastSession:
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is not None:
+                self._sessions.move_to_end(session_id)
+                return s
+        s = self._load(session_id)
+        if s is None:
+            raise SessionNotFound(session_id)
+        self._remember(s)
+        return s
+
+    def register(
+        self,
+        df: pd.DataFrame,
+        *,
+        session_id: Optional[str] = None,
+        hist_days: int = 365,
+        holiday_mmdd: Optional[List[str]] = None,
+        holiday_window_days: int = 3,
+    ) -> ForecastSession:
+        sid = session_id or uuid.uuid4().hex
+        if not _SESSION_ID_RE.match(sid):
+            raise ValueError("session_id chỉ gồm chữ, số, '_' hoặc '-' (tối đa 64 ký tự).")
+        if int(hist_days) < 8:
+            raise ValueError("hist_days phải >= 8.")
+
+        mmdd = list(holiday_mmdd or [])
+        prepared = self._prep(df, mmdd, holiday_window_days)
+        trimmed = self._trim(prepared.df, hist_days)
+        s = ForecastSession(sid, PreparedDailyDataset(trimmed, mmdd, holiday_window_days), hist_days=hist_days)
+        self._persist(s)
+        self._remember(s)
+        return s
+
+    def append(self, session_id: str, rows: pd.DataFrame) -> ForecastSession:
+        """Thêm ngày actual mới (ngày đã có -> ghi đè); chỉ clean phần mới rồi ghép vào buffer."""
+        s = self.get(session_id)
+        with s.lock:
+            new = self._prep(rows, s.holiday_mmdd, s.holiday_window_days).df
+            merged = pd.concat([s.prepared.df, new], ignore_index=True)
+            trimmed = self._trim(merged, s.hist_days)
+            # thay cả object: forecast đang chạy vẫn đọc snapshot cũ nhất quán
+            s.prepared = PreparedDailyDataset(trimmed, s.holiday_mmdd, s.holiday_window_days)
+            s.updated_at = time.time()
+            self._persist(s)
+        return s
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+        path = self._path(session_id)
+        if path is not None and path.exists():
+            path.unlink()
+            found = True
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._sessions)
+        return {
+            "in_memory": n,
+            "max_sessions": self.max_sessions,
+            "persist_dir": str(self.persist_dir) if self.persist_dir else None,
+        }
+
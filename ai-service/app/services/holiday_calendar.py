@@ -0,0 +1,84 @@
+# app/services/holiday_calendar.py
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class HolidayCalendar:
+    """
+    Cờ `is_holiday_window` theo ngày cho các năm [start_year, end_year], tính 1 lần (vector hóa):
+    - đánh dấu ngày lễ (MM-DD) của cả năm trước/sau để cửa sổ vắt qua năm vẫn đúng
+      (vd 12-29..12-31 nằm trong cửa sổ ±3 của 01-01 năm sau)
+    - nới cửa sổ ±window_days bằng cumsum rồi cắt về khoảng năm yêu cầu
+    Tra cứu: flags[(date - origin).days].
+    """
+
+    def __init__(self, holiday_mmdd: Tuple[str, ...], window_days: int, start_year: int, end_year: int):
+        self.holiday_mmdd = tuple(holiday_mmdd)
+        self.window_days = max(0, int(window_days))
+        self.start_year = int(start_year)
+        self.end_year = int(end_year)
+
+        self.origin = np.datetime64(f"{self.start_year:04d}-01-01", "D")
+        end = np.datetime64(f"{self.end_year + 1:04d}-01-01", "D")
+        n_days = int((end - self.origin).astype(np.int64))
+
+        # Khoảng mở rộng 1 năm mỗi phía để bắt ngày lễ của năm kề bên
+        ext_origin = np.datetime64(f"{self.start_year - 1:04d}-01-01", "D")
+        ext_end = np.datetime64(f"{self.end_year + 2:04d}-01-01", "D")
+        n_ext = int((ext_end - ext_origin).astype(np.int64))
+
+        marks = np.zeros(n_ext, dtype=np.int64)
+        for yyyy in range(self.start_year - 1, self.end_year + 2):
+            for mmdd in self.holiday_mmdd:
+                try:
+                    hd = pd.Timestamp(f"{yyyy}-{mmdd}")
+                except Exception:
+                    continue  # MM-DD lỗi / 02-29 năm không nhuận -> bỏ qua như cũ
+                marks[int((np.datetime64(hd.date(), "D") - ext_origin).astype(np.int64))] = 1
+
+        w = self.window_days
+        csum = np.concatenate(([0], np.cumsum(marks)))
+        idx = np.arange(n_ext)
+        lo = np.clip(idx - w, 0, n_ext)
+        hi = np.clip(idx + w + 1, 0, n_ext)
+        window = (csum[hi] - csum[lo]) > 0
+
+        offset = int((self.origin - ext_origin).astype(np.int64))
+        self.flags = window[offset:offset + n_days].astype(np.int64)
+        self.flags.setflags(write=False)
+
+    def covers(self, dates: pd.DatetimeIndex) -> bool:
+        if len(dates) == 0:
+            return True
+        return int(dates.min().year) >= self.start_year and int(dates.max().year) <= self.end_year
+
+    def lookup(self, dates: Iterable) -> np.ndarray:
+        """Cờ 0/1 (int64) cho từng ngày; ngày phải nằm trong khoảng năm của calendar."""
+        idx = pd.DatetimeIndex(dates)
+        days = (idx.values.astype("datetime64[D]") - self.origin).astype(np.int64)
+        if len(days) and (days.min() < 0 or days.max() >= len(self.flags)):
+            raise ValueError("Ngày nằm ngoài khoảng năm của holiday calendar.")
+        return self.flags[days]
+
+
+@lru_cache(maxsize=64)
+def get_holiday_calendar(holiday_mmdd: Tuple[str, ...], window_days: int, start_year: int, end_year: int) -> HolidayCalendar:
+    """Calendar dùng chung, cache theo (danh sách ngày lễ, window, khoảng năm)."""
+    return HolidayCalendar(holiday_mmdd, window_days, start_year, end_year)
+
+
+def holiday_flags(dates: Iterable, holiday_mmdd: Iterable[str], window_days: int) -> np.ndarray:
+    """
+    Cờ `is_holiday_window` cho 1 dãy ngày, dùng calendar đã cache theo khoảng năm của dãy ngày.
+    """
+    idx = pd.DatetimeIndex(dates)
+    mmdd = tuple(str(x).strip() for x in (holiday_mmdd or []) if str(x).strip())
+    if not mmdd or len(idx) == 0:
+        return np.zeros(len(idx), dtype=np.int64)
+    cal = get_holiday_calendar(mmdd, int(window_days), int(idx.min().year), int(idx.max().year))
+    return cal.lookup(idx)
@@ -0,0 +1,98 @@
+# app/services/lead_encoder.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+LEAD_CATEGORICAL_FIELDS: Tuple[str, ...] = (
+    "source",
+    "status",
+    "priority",
+    "campaign_type",
+    "acquisition_channel",
+    "product_interest",
+)
+
+
+class LeadOneHotEncoder:
+    """
+    Encoder one-hot "biên dịch sẵn" cho 1 danh sách feature_columns:
+    - col_index: tên cột -> vị trí trong ma trận
+    - field_tables: field categorical -> {giá trị -> vị trí cột `{field}_{giá trị}`}
+    Build 1 lần cho mỗi feature_columns đã load, sau đó encode ghi thẳng vào NumPy block.
+    Quy tắc encode 1 payload:
+    - key trùng tên cột -> float(giá trị) (None / lỗi ép kiểu -> 0)
+    - field categorical -> 1.0 ở cột `{field}_{giá trị}` và `{field}_{giá trị.lower()}` nếu có (ghi sau numeric)
+    """
+
+    def __init__(self, feature_columns: Sequence[str], categorical_fields: Tuple[str, ...] = LEAD_CATEGORICAL_FIELDS):
+        self.feature_columns: List[str] = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self.categorical_fields = tuple(categorical_fields)
+
+        self.col_index: Dict[str, int] = {}
+        for i, c in enumerate(self.feature_columns):
+            self.col_index.setdefault(c, i)
+
+        self.field_tables: Dict[str, Dict[str, int]] = {}
+        for field in self.categorical_fields:
+            prefix = f"{field}_"
+            table: Dict[str, int] = {}
+            for c, i in self.col_index.items():
+                if isinstance(c, str) and c.startswith(prefix):
+                    table[c[len(prefix):]] = i
+            self.field_tables[field] = table
+
+    def _onehot_indices(self, field: str, val: Any) -> Tuple[int, ...]:
+        if val is None:
+            return ()
+        val_str = str(val).strip()
+        if not val_str:
+            return ()
+        table = self.field_tables.get(field)
+        if not table:
+            return ()
+        i1 = table.get(val_str)
+        i2 = table.get(val_str.lower())
+        if i1 is None:
+            return () if i2 is None else (i2,)
+        if i2 is None or i2 == i1:
+            return (i1,)
+        return (i1, i2)
+
+    def encode(self, payloads: Sequence[Dict[str, Any]], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Encode N payload -> ma trận float (N, n_features).
+        `out` (nếu truyền) phải có shape (N, n_features); sẽ bị ghi đè.
+        """
+        n = len(payloads)
+        if out is None:
+            X = np.zeros((n, self.n_features), dtype=float)
+        else:
+            if out.shape != (n, self.n_features):
+                raise ValueError(f"out shape {out.shape} != {(n, self.n_features)}")
+            X = out
+            X.fill(0.0)
+
+        col_index = self.col_index
+        for r, payload in enumerate(payloads):
+            row = X[r]
+            for key, val in payload.items():
+                i = col_index.get(key)
+                if i is None:
+                    continue
+                try:
+                    row[i] = 0.0 if val is None else float(val)
+                except Exception:
+                    row[i] = 0.0
+
+            for field in self.categorical_fields:
+                for i in self._onehot_indices(field, payload.get(field)):
+                    row[i] = 1.0
+
+        return X
+
+    def encode_frame(self, payloads: Sequence[Dict[str, Any]]) -> pd.DataFrame:
+        return pd.DataFrame(self.encode(payloads), columns=self.feature_columns)
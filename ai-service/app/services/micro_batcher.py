@@ -0,0 +1,161 @@
+# app/services/micro_batcher.py
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.services.ml_executor import ml_executor
+
+BatchFn = Callable[[Any], Any]
+Runner = Callable[[BatchFn, Any], Awaitable[Any]]
+
+
+async def _run_inline(fn: BatchFn, X: Any) -> Any:
+    return fn(X)
+
+
+@dataclass
+class _PendingBatch:
+    fn: BatchFn
+    items: List[Tuple[Any, asyncio.Future]] = field(default_factory=list)
+    rows: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Gom các request 1-dòng tới cùng 1 model (cùng key) trong cửa sổ `window_ms`
+    (hoặc tới khi đủ `max_rows`), chạy 1 lần predict vector hóa rồi trả kết quả về từng caller.
+
+    - X của mỗi request: DataFrame hoặc ndarray 2D (cùng schema trong 1 key).
+    - fn(X_all) trả array (hoặc tuple array) có trục 0 = số dòng; được cắt lại theo từng request.
+    - Nếu cả batch lỗi thì chạy lại từng request riêng để lỗi không lan sang request khác.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_ms: float = 2.0,
+        max_rows: int = 64,
+        enabled: bool = True,
+        runner: Optional[Runner] = None,
+    ):
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self.max_rows = max(1, int(max_rows))
+        self.enabled = bool(enabled)
+        self.runner: Runner = runner or _run_inline
+
+        self._pending: Dict[Hashable, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"requests": 0, "rows": 0, "batches": 0, "fallbacks": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self._stats)
+        out["avg_batch_rows"] = (self._stats["rows"] / self._stats["batches"]) if self._stats["batches"] else 0.0
+        out["pending_keys"] = len(self._pending)
+        out["window_ms"] = self.window_s * 1000.0
+        out["max_rows"] = self.max_rows
+        out["enabled"] = self.enabled
+        return out
+
+    async def submit(self, key: Hashable, X: Any, fn: BatchFn) -> Any:
+        """
+        Đưa X vào batch theo key; trả phần kết quả fn(...) tương ứng với X.
+        """
+        if not self.enabled:
+            return await self.runner(fn, X)
+
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch(fn=fn)
+            self._pending[key] = batch
+            if self.window_s > 0:
+                batch.timer = loop.call_later(self.window_s, self._flush, key)
+            else:
+                loop.call_soon(self._flush, key)
+
+        batch.items.append((X, fut))
+        batch.rows += len(X)
+        self._stats["requests"] += 1
+
+        if batch.rows >= self.max_rows:
+            self._flush(key)
+
+        return await fut
+
+    def _flush(self, key: Hashable) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._run(batch))
+        # giữ reference để task không bị GC giữa chừng
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _concat(self, parts: List[Any]) -> Any:
+        if len(parts) == 1:
+            return parts[0]
+        if isinstance(parts[0], pd.DataFrame):
+            return pd.concat(parts, ignore_index=True)
+        return np.vstack(parts)
+
+    def _slice(self, out: Any, start: int, stop: int) -> Any:
+        if isinstance(out, tuple):
+            return tuple(o[start:stop] for o in out)
+        return out[start:stop]
+
+    async def _run(self, batch: _PendingBatch) -> None:
+        items = [(X, fut) for X, fut in batch.items if not fut.cancelled()]
+        if not items:
+            return
+
+        self._stats["batches"] += 1
+        self._stats["rows"] += sum(len(X) for X, _ in items)
+
+        try:
+            out = await self.runner(batch.fn, self._concat([X for X, _ in items]))
+        except Exception as e:
+            if len(items) == 1:
+                fut = items[0][1]
+                if not fut.done():
+                    fut.set_exception(e)
+                return
+            self._stats["fallbacks"] += 1
+            for X, fut in items:
+                await self._run_single(batch.fn, X, fut)
+            return
+
+        start = 0
+        for X, fut in items:
+            stop = start + len(X)
+            if not fut.done():
+                fut.set_result(self._slice(out, start, stop))
+            start = stop
+
+    async def _run_single(self, fn: BatchFn, X: Any, fut: asyncio.Future) -> None:
+        try:
+            out = await self.runner(fn, X)
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if not fut.done():
+            fut.set_result(out)
+
+
+micro_batcher = MicroBatcher(
+    window_ms=config.ML_MICROBATCH_WINDOW_MS,
+    max_rows=config.ML_MICROBATCH_MAX_ROWS,
+    enabled=config.ML_MICROBATCH_ENABLED,
+    runner=ml_executor.run,
+)
@@ -0,0 +1,173 @@
+# app/services/ml_executor.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app import config
+
+
+class ExecutorSaturated(RuntimeError):
+    """Hàng đợi inference đã đầy (vượt ML_MAX_QUEUE)."""
+
+
+class _PoolStats:
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.inflight = 0  # đã submit, chưa xong (đang chờ + đang chạy)
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def add_running(self, delta: int) -> None:
+        with self._lock:
+            self.running += delta
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "inflight": self.inflight,
+            "running": self.running,
+            "queue_depth": max(0, self.inflight - self.running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+def _call_in_worker(fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    return fn(*args, **kwargs)
+
+
+class InferenceExecutor:
+    """
+    Chạy các hàm MLService (sync, CPU-bound) ngoài event loop:
+    - run(): thread pool riêng, giới hạn số worker (predict sklearn/lightgbm/xgboost phần lớn nhả GIL)
+    - run_heavy(): job nặng (forecast...) -> process pool nếu ML_PROCESS_WORKERS > 0,
+      ngược lại dùng thread pool "heavy" tách riêng để không chiếm worker của request nhẹ
+    Mỗi pool giới hạn số job đang chờ + chạy (max_queue); vượt quá thì raise ExecutorSaturated.
+    """
+
+    def __init__(
+        self,
+        *,
+        thread_workers: int,
+        heavy_thread_workers: int = 1,
+        process_workers: int = 0,
+        max_queue: int = 256,
+    ):
+        self.thread_workers = max(1, int(thread_workers))
+        self.heavy_thread_workers = max(1, int(heavy_thread_workers))
+        self.process_workers = max(0, int(process_workers))
+        self.max_queue = max(1, int(max_queue))
+
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._heavy_threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "thread": _PoolStats("thread", self.thread_workers, self.max_queue),
+            "heavy_thread": _PoolStats("heavy_thread", self.heavy_thread_workers, self.max_queue),
+            "process": _PoolStats("process", self.process_workers, self.max_queue),
+        }
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="ml-infer")
+            return self._threads
+
+    def _heavy_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._heavy_threads is None:
+                self._heavy_threads = ThreadPoolExecutor(
+                    max_workers=self.heavy_thread_workers, thread_name_prefix="ml-heavy"
+                )
+            return self._heavy_threads
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                # spawn: tránh fork process đang có thread (OpenMP/BLAS) -> deadlock
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._processes
+
+    async def _submit(self, pool: Executor, stats: _PoolStats, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        if stats.inflight >= stats.max_queue:
+            stats.rejected += 1
+            raise ExecutorSaturated(f"ML {stats.name} queue is full ({stats.inflight}/{stats.max_queue})")
+
+        stats.inflight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            if isinstance(pool, ProcessPoolExecutor):
+                call = functools.partial(_call_in_worker, fn, args, kwargs)
+                stats.add_running(1)
+                try:
+                    result = await loop.run_in_executor(pool, call)
+                finally:
+                    stats.add_running(-1)
+            else:
+                def call() -> Any:
+                    stats.add_running(1)
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        stats.add_running(-1)
+
+                result = await loop.run_in_executor(pool, call)
+        except Exception:
+            stats.failed += 1
+            raise
+        finally:
+            stats.inflight -= 1
+
+        stats.completed += 1
+        return result
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await self._submit(self._thread_pool(), self._stats["thread"], fn, args, kwargs)
+
+    async def run_heavy(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.process_workers > 0:
+            return await self._submit(self._process_pool(), self._stats["process"], fn, args, kwargs)
+        return await self._submit(self._heavy_thread_pool(), self._stats["heavy_thread"], fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {k: v.snapshot() for k, v in self._stats.items()}
+        out["process"]["enabled"] = self.process_workers > 0
+        return out
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._threads is not None:
+                self._threads.shutdown(wait=wait)
+                self._threads = None
+            if self._heavy_threads is not None:
+                self._heavy_threads.shutdown(wait=wait)
+                self._heavy_threads = None
+            if self._processes is not None:
+                self._processes.shutdown(wait=wait)
+                self._processes = None
+
+
+ml_executor = InferenceExecutor(
+    thread_workers=config.ML_THREAD_WORKERS or min(4, os.cpu_count() or 1),
+    heavy_thread_workers=config.ML_HEAVY_THREAD_WORKERS,
+    process_workers=config.ML_PROCESS_WORKERS,
+    max_queue=config.ML_MAX_QUEUE,
+)
@@ -1,20 +1,70 @@
 # app/services/ml_service.py
 from __future__ import annotations
 
-from typing import Any, Dict, Optional, Tuple, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple, List
 
 import numpy as np
 import pandas as pd
 
+from app import config
+from app.services.forecast_dataset import DEFAULT_FORECAST_TARGETS, ForecastTarget, PreparedDailyDataset
+from app.services.forecast_backtest import (
+    default_transform_candidates,
+    finite_records,
+    median_ratio,
+    one_step_feature_matrix,
+    rank_transform_candidates,
+)
+from app.services.forecast_engine import RecursiveForecastEngine
+from app.services.forecast_intervals import IntervalSpec, inverse_transform, path_quantiles, simulate_paths
+from app.services.forecast_output import frame_to_columnar, iso_dates
+from app.services.forecast_scenarios import ForecastScenario, scenario_post_fn, scenario_summary
+from app.services.holiday_calendar import holiday_flags
+from app.services.lead_encoder import LEAD_CATEGORICAL_FIELDS, LeadOneHotEncoder
+from app.services.micro_batcher import micro_batcher
 from app.services.model_store import model_store
 
 
+INFERENCE_MODES = ("proba", "margin", "predict_both")
+CLV_HORIZONS = ("1m", "3m", "6m", "12m")
+SNAPSHOT_MODELS = ("churn", "segment", "clv")
+
+
+def _parse_inference_modes(spec: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, mode = (x.strip() for x in part.split("=", 1))
+        if name and mode in INFERENCE_MODES:
+            out[name] = mode
+    return out
+
+
 class MLService:
     """
     Service gọi các model ML (sklearn/xgboost/...) để predict:
     lead (prob/value), churn, segmentation, clv (multi-horizon), forecast (daily revenue)...
     """
 
+    def __init__(
+        self,
+        *,
+        inference_modes: Optional[Dict[str, str]] = None,
+        default_inference_mode: Optional[str] = None,
+    ):
+        mode = default_inference_mode or config.ML_INFERENCE_MODE_DEFAULT
+        self.default_inference_mode = mode if mode in INFERENCE_MODES else "proba"
+        self.inference_modes: Dict[str, str] = _parse_inference_modes(config.ML_INFERENCE_MODES)
+        if inference_modes:
+            self.inference_modes.update({k: v for k, v in inference_modes.items() if v in INFERENCE_MODES})
+
+    def _inference_mode(self, model_name: str) -> str:
+        return self.inference_modes.get(model_name, self.default_inference_mode)
+
     # ---------------------------
     # Basic helpers
     # ---------------------------
@@ -34,14 +84,49 @@ class MLService:
         except Exception:
             return default
 
-    def _predict_prob_and_score(self, model: Any, X: pd.DataFrame | np.ndarray) -> Tuple[float, float]:
+    def _predict_prob_and_score(
+        self,
+        model: Any,
+        X: pd.DataFrame | np.ndarray,
+        mode: Optional[str] = None,
+    ) -> Tuple[float, float]:
+        proba, raw = self._predict_prob_and_score_batch(model, X, mode)
+        return float(proba[0]), float(raw[0])
+
+    def _predict_prob_and_score_batch(
+        self,
+        model: Any,
+        X: pd.DataFrame | np.ndarray,
+        mode: Optional[str] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Giống _predict_prob_and_score nhưng cho N dòng: trả (proba[N], raw[N]).
+        mode (xem INFERENCE_MODES) chỉ áp dụng cho classifier có predict_proba.
+        """
+        mode = mode or self.default_inference_mode
         if hasattr(model, "predict_proba"):
-            proba = float(model.predict_proba(X)[0, 1])
-            raw = float(model.predict(X)[0])
+            if mode == "margin" and hasattr(model, "decision_function"):
+                margin = np.asarray(model.decision_function(X), dtype=float)
+                if margin.ndim == 1:
+                    raw = margin
+                    proba = 1.0 / (1.0 + np.exp(-raw))
+                    return np.clip(proba, 0.0, 1.0), raw
+                # multi-class margin -> không có sigmoid 1 cột, quay về proba
+                mode = "proba"
+
+            P = np.asarray(model.predict_proba(X))
+            proba = P[:, 1].astype(float)
+            if mode == "predict_both":
+                raw = np.asarray(model.predict(X)).astype(float)
+            else:
+                # predict() của classifier = classes_[argmax(proba)] -> không cần chạy model lần 2
+                idx = np.argmax(P, axis=1)
+                classes = getattr(model, "classes_", None)
+                raw = (np.asarray(classes)[idx] if classes is not None else idx).astype(float)
         else:
-            raw = float(model.predict(X)[0])
+            raw = np.asarray(model.predict(X)).astype(float)
             proba = 1.0 / (1.0 + np.exp(-raw))
-        proba = max(0.0, min(1.0, proba))
+        proba = np.clip(proba, 0.0, 1.0)
         return proba, raw
 
     def _get_expected_columns(self, obj: Any) -> Optional[List[str]]:
@@ -63,41 +148,32 @@ class MLService:
         dists = np.linalg.norm(centers - X_arr, axis=1)
         return [float(x) for x in dists]
 
+    def _kmeans_geometry(self, kmeans_model: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """(centers[K, d] float64, ‖c‖²[K]) — build 1 lần / model qua model_store.get_derived."""
+        centers = np.ascontiguousarray(kmeans_model.cluster_centers_, dtype=float)
+        return centers, np.einsum("ij,ij->i", centers, centers)
+
+    def _kmeans_sq_distances(self, geometry: Tuple[np.ndarray, np.ndarray], X_arr: np.ndarray) -> np.ndarray:
+        """Khoảng cách bình phương (N, K) = ‖x‖² − 2·x·cᵀ + ‖c‖² (1 phép nhân ma trận); kẹp >= 0 do sai số làm tròn."""
+        centers, c_sq = geometry
+        d2 = np.einsum("ij,ij->i", X_arr, X_arr)[:, None] - 2.0 * (X_arr @ centers.T) + c_sq[None, :]
+        return np.maximum(d2, 0.0, out=d2)
+
     # ---------------------------
     # LEAD (giữ như bạn đang dùng)
     # ---------------------------
-    def _onehot_frame_from_payload(
-        self,
-        payload: Dict[str, Any],
-        feature_columns: List[str],
-        *,
-        categorical_fields: Tuple[str, ...] = (
-            "source",
-            "status",
-            "priority",
-            "campaign_type",
-            "acquisition_channel",
-            "product_interest",
-        ),
-    ) -> pd.DataFrame:
-        X = pd.DataFrame([[0.0] * len(feature_columns)], columns=feature_columns)
-
-        for col in feature_columns:
-            if col in payload:
-                X.at[0, col] = self._safe_float(payload.get(col), 0.0)
-
-        for field in categorical_fields:
-            val = payload.get(field)
-            if val is None:
-                continue
-            val_str = str(val).strip()
-            if not val_str:
-                continue
-            candidates = [f"{field}_{val_str}", f"{field}_{val_str.lower()}"]
-            for c in candidates:
-                if c in X.columns:
-                    X.at[0, c] = 1.0
+    def _lead_encoder(self, feature_cols_name: str, model_version: Optional[str] = None) -> LeadOneHotEncoder:
+        return model_store.get_derived(
+            feature_cols_name,
+            model_version,
+            "lead_onehot_encoder",
+            lambda cols: LeadOneHotEncoder(list(cols), LEAD_CATEGORICAL_FIELDS),
+        )
 
+    def _lead_model_input(self, model: Any, X: np.ndarray, feature_columns: List[str]) -> pd.DataFrame | np.ndarray:
+        # Model sklearn fit bằng DataFrame cần đúng tên cột; LightGBM Booster nhận thẳng ndarray
+        if self._get_expected_columns(model) is not None:
+            return pd.DataFrame(X, columns=feature_columns)
         return X
 
     def predict_lead(
@@ -111,13 +187,16 @@ class MLService:
     ) -> Dict[str, Any]:
         cls_model = model_store.get(cls_model_name, model_version)
         reg_model = model_store.get(reg_model_name, model_version)
-        feature_columns = model_store.get(feature_cols_name, model_version)
+        encoder = self._lead_encoder(feature_cols_name, model_version)
 
-        feature_columns = list(feature_columns)
-        X = self._onehot_frame_from_payload(lead, feature_columns)
+        X = encoder.encode([lead])
 
-        prob, raw_score = self._predict_prob_and_score(cls_model, X)
-        predicted_value = float(reg_model.predict(X)[0])
+        prob, raw_score = self._predict_prob_and_score(
+            cls_model,
+            self._lead_model_input(cls_model, X, encoder.feature_columns),
+            self._inference_mode(cls_model_name),
+        )
+        predicted_value = float(reg_model.predict(self._lead_model_input(reg_model, X, encoder.feature_columns))[0])
 
         return {
             "conversion_prob": prob,
@@ -132,6 +211,54 @@ class MLService:
             },
         }
 
+    def predict_lead_batch(
+        self,
+        leads: List[Dict[str, Any]],
+        *,
+        cls_model_name: str = "lead_cls_onehot",
+        reg_model_name: str = "lead_reg_onehot",
+        feature_cols_name: str = "lead_feature_columns_onehot",
+        model_version: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Chấm điểm nhiều lead 1 lần: build 1 feature matrix, mỗi model chỉ predict 1 lần.
+        Kết quả từng phần tử giống hệt predict_lead (cùng thứ tự input).
+        """
+        if not leads:
+            return []
+
+        cls_model = model_store.get(cls_model_name, model_version)
+        reg_model = model_store.get(reg_model_name, model_version)
+        encoder = self._lead_encoder(feature_cols_name, model_version)
+
+        X = encoder.encode(leads)
+
+        probs, raw_scores = self._predict_prob_and_score_batch(
+            cls_model,
+            self._lead_model_input(cls_model, X, encoder.feature_columns),
+            self._inference_mode(cls_model_name),
+        )
+        predicted_values = np.asarray(
+            reg_model.predict(self._lead_model_input(reg_model, X, encoder.feature_columns))
+        ).astype(float)
+
+        models = {
+            "cls": cls_model_name,
+            "reg": reg_model_name,
+            "feature_columns": feature_cols_name,
+            "version": model_version or "default",
+        }
+        return [
+            {
+                "conversion_prob": float(probs[i]),
+                "raw_score": float(raw_scores[i]),
+                "predicted_value": float(predicted_values[i]),
+                "currency": lead.get("predicted_value_currency") or "VND",
+                "models": dict(models),
+            }
+            for i, lead in enumerate(leads)
+        ]
+
     # ---------------------------
     # CHURN (pipeline hoặc model)
     # ---------------------------
@@ -144,7 +271,7 @@ class MLService:
     ) -> Dict[str, Any]:
         model = model_store.get(model_name, model_version)
         X = pd.DataFrame([customer_features])
-        prob, raw_score = self._predict_prob_and_score(model, X)
+        prob, raw_score = self._predict_prob_and_score(model, X, self._inference_mode(model_name))
         return {
             "churn_prob": float(prob),
             "raw_score": float(raw_score),
@@ -152,6 +279,73 @@ class MLService:
             "version": model_version or "default",
         }
 
+    def churn_risk_tier(self, churn_prob: np.ndarray) -> np.ndarray:
+        """HIGH >= CHURN_RISK_HIGH, MEDIUM >= CHURN_RISK_MEDIUM, còn lại LOW (cùng ngưỡng với Backend)."""
+        p = np.asarray(churn_prob, dtype=float)
+        return np.select([p >= config.CHURN_RISK_HIGH, p >= config.CHURN_RISK_MEDIUM], ["HIGH", "MEDIUM"], "LOW")
+
+    def churn_input_columns(self, model_name: str = "churn_model", model_version: Optional[str] = None) -> Optional[List[str]]:
+        """Cột raw pipeline churn cần (feature_names_in_); None -> model không khai báo, giữ nguyên input."""
+        return self._get_expected_columns(model_store.get(model_name, model_version))
+
+    def _churn_scores(
+        self,
+        model: Any,
+        mode: str,
+        expected: Optional[List[str]],
+        chunk: pd.DataFrame,
+        drop_cols: Sequence[str] = (),
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """1 khúc khách -> (churn_prob, raw_score, risk_tier); reindex về cột pipeline (thiếu -> NaN cho imputer)."""
+        if expected:
+            X = chunk.reindex(columns=expected)
+        else:
+            X = chunk.drop(columns=list(drop_cols), errors="ignore")
+        proba, raw = self._predict_prob_and_score_batch(model, X, mode)
+        return proba, raw, self.churn_risk_tier(proba)
+
+    def iter_churn_bulk(
+        self,
+        frames: Iterable[pd.DataFrame],
+        *,
+        id_col: Optional[str] = "customer_id",
+        model_name: str = "churn_model",
+        model_version: Optional[str] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Chấm churn theo từng khúc input: mỗi khúc reindex về cột pipeline (thiếu -> NaN cho imputer),
+        1 lần predict_proba, yield DataFrame {id_col?, churn_prob, raw_score, risk_tier} rồi bỏ khúc đó.
+        stats (tuỳ chọn) được cập nhật dần: rows, chunks, tiers, missing_columns.
+        """
+        model = model_store.get(model_name, model_version)
+        mode = self._inference_mode(model_name)
+        expected = self._get_expected_columns(model)
+        stats = stats if stats is not None else {}
+        stats.update({"rows": 0, "chunks": 0, "tiers": {"HIGH": 0, "MEDIUM": 0, "LOW": 0}})
+        missing: set = set()
+
+        for chunk in frames:
+            if len(chunk) == 0:
+                continue
+            if expected:
+                missing.update(c for c in expected if c not in chunk.columns)
+            proba, raw, tier = self._churn_scores(model, mode, expected, chunk, [id_col] if id_col else [])
+
+            out: Dict[str, Any] = {}
+            if id_col and id_col in chunk.columns:
+                out[id_col] = chunk[id_col].to_numpy()
+            out["churn_prob"] = proba
+            out["raw_score"] = raw
+            out["risk_tier"] = tier
+
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+            for name, n in zip(*np.unique(tier, return_counts=True)):
+                stats["tiers"][str(name)] += int(n)
+            stats["missing_columns"] = sorted(missing)
+            yield pd.DataFrame(out)
+
     # ---------------------------
     # SEGMENTATION (KMeans) — FIX: không tự bịa 5 nhãn
     # ---------------------------
@@ -177,17 +371,7 @@ class MLService:
                 cleaned[ik] = str(vv)
         return cleaned
 
-    def predict_segment(
-        self,
-        features: Dict[str, Any],
-        *,
-        model_name: str = "kmeans_customer_segmentation",
-        model_version: Optional[str] = None,
-        segment_map: Optional[Dict[int, str]] = None,
-        debug: bool = True,
-    ) -> Dict[str, Any]:
-        kmeans = model_store.get(model_name, model_version)
-
+    def _segment_map(self, kmeans: Any, segment_map: Optional[Dict[int, str]]) -> Dict[int, str]:
         segment_map = self._sanitize_segment_map(segment_map, kmeans)
 
         # Nếu không truyền map -> không bịa label business, chỉ Segment_{id}
@@ -201,6 +385,15 @@ class MLService:
 
         if segment_map is None:
             segment_map = default_map
+        return segment_map
+
+    def _segment_input(
+        self,
+        kmeans: Any,
+        features: Dict[str, Any],
+        segment_map: Optional[Dict[int, str]],
+    ) -> Tuple[np.ndarray, Dict[int, str]]:
+        segment_map = self._segment_map(kmeans, segment_map)
 
         req = dict(features)
         for key in ["Recency", "Frequency", "Monetary", "Discount_Sensitivity", "Category_Breadth"]:
@@ -212,9 +405,19 @@ class MLService:
 
         X_raw = pd.DataFrame([req])
         X_aligned = self._align_to_expected(kmeans, X_raw)
-        X_arr = X_aligned.values.astype(float)
+        return X_aligned.values.astype(float), segment_map
 
-        seg_id = int(kmeans.predict(X_arr)[0])
+    def _segment_result(
+        self,
+        kmeans: Any,
+        X_arr: np.ndarray,
+        seg_id: int,
+        segment_map: Dict[int, str],
+        *,
+        model_name: str,
+        model_version: Optional[str],
+        debug: bool,
+    ) -> Dict[str, Any]:
         seg_name = segment_map.get(seg_id, f"Segment_{seg_id}")
 
         out: Dict[str, Any] = {
@@ -228,6 +431,82 @@ class MLService:
             out["distances_to_centers"] = self._kmeans_distances(kmeans, X_arr)
         return out
 
+    def predict_segment(
+        self,
+        features: Dict[str, Any],
+        *,
+        model_name: str = "kmeans_customer_segmentation",
+        model_version: Optional[str] = None,
+        segment_map: Optional[Dict[int, str]] = None,
+        debug: bool = True,
+    ) -> Dict[str, Any]:
+        kmeans = model_store.get(model_name, model_version)
+        X_arr, segment_map = self._segment_input(kmeans, features, segment_map)
+
+        seg_id = int(kmeans.predict(X_arr)[0])
+        return self._segment_result(
+            kmeans, X_arr, seg_id, segment_map,
+            model_name=model_name, model_version=model_version, debug=debug,
+        )
+
+    def _segment_batch_input(self, kmeans: Any, rows: List[Dict[str, Any]] | pd.DataFrame) -> np.ndarray:
+        """Bản vector của _segment_input: ép kiểu RFM theo cột (lỗi/None -> 0), align cột 1 lần."""
+        X_raw = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        for key in ["Recency", "Frequency", "Monetary", "Discount_Sensitivity", "Category_Breadth"]:
+            if key in X_raw.columns:
+                col = pd.to_numeric(X_raw[key], errors="coerce").fillna(0.0)
+                X_raw[key] = np.trunc(col).astype(np.int64) if key == "Category_Breadth" else col.astype(float)
+
+        X_aligned = self._align_to_expected(kmeans, X_raw)
+        return X_aligned.fillna(0).to_numpy(dtype=float)
+
+    def _segment_assign(
+        self,
+        rows: List[Dict[str, Any]] | pd.DataFrame,
+        model_name: str,
+        model_version: Optional[str],
+        segment_map: Optional[Dict[int, str]],
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[int, str]]:
+        """(labels[N], khoảng cách bình phương[N, K], {segment_id: tên}) cho N khách."""
+        kmeans = model_store.get(model_name, model_version)
+        if not hasattr(kmeans, "cluster_centers_"):
+            raise ValueError(f"Model {model_name} không có cluster_centers_.")
+        segment_map = self._segment_map(kmeans, segment_map)
+        geometry = model_store.get_derived(model_name, model_version, "kmeans_center_sq_norms", self._kmeans_geometry)
+
+        X_arr = self._segment_batch_input(kmeans, rows)
+        d2 = self._kmeans_sq_distances(geometry, X_arr)
+        labels = d2.argmin(axis=1) if len(X_arr) else np.zeros(0, dtype=np.int64)
+        names = {i: segment_map.get(i, f"Segment_{i}") for i in range(d2.shape[1])}
+        return labels, d2, names
+
+    def predict_segment_batch(
+        self,
+        rows: List[Dict[str, Any]] | pd.DataFrame,
+        *,
+        model_name: str = "kmeans_customer_segmentation",
+        model_version: Optional[str] = None,
+        segment_map: Optional[Dict[int, str]] = None,
+        return_distances: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Phân cụm N khách trong 1 lần: segment_map sanitize 1 lần / request, ‖c‖² của center cache theo model,
+        gán cụm = argmin ma trận khoảng cách (N, K). return_distances -> trả cả ma trận khoảng cách (N, K).
+        """
+        labels, d2, names = self._segment_assign(rows, model_name, model_version, segment_map)
+        ids, counts = np.unique(labels, return_counts=True)
+        out: Dict[str, Any] = {
+            "n": int(len(labels)),
+            "results": [{"segment_id": int(i), "segment_name": names[int(i)]} for i in labels],
+            "segment_counts": {names[int(i)]: int(c) for i, c in zip(ids, counts)},
+            "used_preprocess": None,
+            "model": model_name,
+            "version": model_version or "default",
+        }
+        if return_distances:
+            out["distances_to_centers"] = np.sqrt(d2).tolist()
+        return out
+
     # ---------------------------
     # CLV (multi-horizon bundles) — FIX: giống app.py
     # ---------------------------
@@ -266,50 +545,100 @@ class MLService:
         meta["horizon"] = bundle_obj.get("horizon")
         return pipe, (list(expected_cols) if expected_cols is not None else None), target_is_log, meta
 
-    def _clv_fillna_by_rule(self, df: pd.DataFrame) -> pd.DataFrame:
-        out = df.copy()
-        for c in out.columns:
-            lc = str(c).lower()
-            if out[c].isna().any():
-                if lc in ("acquisition_channel", "campaign_type"):
-                    out[c] = out[c].fillna("unknown")
-                elif "rate" in lc:
-                    out[c] = out[c].fillna(0.0)
-                elif lc.startswith("log_"):
-                    out[c] = out[c].fillna(0.0)
-                elif any(k in lc for k in ["count", "frequency", "recency", "dayofweek", "year", "month", "diversity"]):
-                    out[c] = out[c].fillna(0)
-                else:
-                    out[c] = out[c].fillna(0)
-        return out
+    def _clv_fill_value(self, col: Any) -> Any:
+        # Luật fillna của app.py: categorical -> "unknown", rate/log_ -> 0.0, còn lại (count/frequency/...) -> 0
+        lc = str(col).lower()
+        if lc in ("acquisition_channel", "campaign_type"):
+            return "unknown"
+        if "rate" in lc or lc.startswith("log_"):
+            return 0.0
+        return 0
 
-    def predict_clv(
+    def _clv_fill_plan(self, columns: Sequence[Any]) -> Dict[Any, Any]:
+        """{cột: giá trị fill} — kiểu giá trị (str / float / int) quyết định kiểu fill của cột."""
+        return {c: self._clv_fill_value(c) for c in columns}
+
+    def _clv_bundle_fill_plan(self, bundle_name: str, model_version: Optional[str]) -> Optional[Dict[Any, Any]]:
+        """Fill plan theo expected_cols của bundle, build 1 lần / bundle đã load (model_store.get_derived)."""
+        def build(bundle_obj: Any) -> Optional[Dict[Any, Any]]:
+            expected_cols = self._resolve_clv_components(bundle_obj)[1]
+            return self._clv_fill_plan(expected_cols) if expected_cols else None
+
+        return model_store.get_derived(bundle_name, model_version, "clv_fill_plan", build)
+
+    def _clv_fillna_by_rule(self, df: pd.DataFrame, plan: Optional[Dict[Any, Any]] = None) -> pd.DataFrame:
+        """
+        1 lần fillna(dict) theo plan, chỉ cho các cột có ô thiếu; không có ô nào thiếu -> trả nguyên df (không copy).
+        plan=None (bundle không có expected_cols) -> dựng plan theo cột hiện có.
+        """
+        missing = df.isna().to_numpy().any(axis=0)
+        if not missing.any():
+            return df
+        cols = df.columns[missing]
+        if plan is None:
+            return df.fillna(self._clv_fill_plan(cols))
+        return df.fillna({c: plan[c] if c in plan else self._clv_fill_value(c) for c in cols})
+
+    def _clv_bundle(
+        self,
+        horizon: str,
+        model_version: Optional[str],
+    ) -> Tuple[str, Any, Optional[List[str]], bool, Dict[str, Any]]:
+        bundle_name = self._get_clv_bundle_name(horizon)
+        bundle_obj = model_store.get(bundle_name, model_version)
+
+        pipe, expected_cols, target_is_log, meta = self._resolve_clv_components(bundle_obj)
+        if pipe is None:
+            raise ValueError("CLV bundle không có pipeline/model hợp lệ.")
+        return bundle_name, pipe, expected_cols, target_is_log, meta
+
+    def _clv_frame(
+        self,
+        X_raw: pd.DataFrame,
+        expected_cols: Optional[List[str]],
+        plan: Optional[Dict[Any, Any]] = None,
+    ) -> pd.DataFrame:
+        X = X_raw.reindex(columns=list(expected_cols)) if expected_cols else X_raw
+        return self._clv_fillna_by_rule(X, plan)
+
+    def _clv_input(
         self,
         features: Dict[str, Any],
+        horizon: str,
+        model_version: Optional[str],
+    ) -> Tuple[str, Any, pd.DataFrame, bool, Dict[str, Any]]:
+        bundle_name, pipe, expected_cols, target_is_log, meta = self._clv_bundle(horizon, model_version)
+        plan = self._clv_bundle_fill_plan(bundle_name, model_version) if expected_cols else None
+        X = self._clv_frame(pd.DataFrame([features]), expected_cols, plan)
+        return bundle_name, pipe, X, target_is_log, meta
+
+    def _clv_values(self, pred_raw: Any, target_is_log: bool) -> np.ndarray:
+        pred_raw = np.asarray(pred_raw)
+        pred = np.expm1(pred_raw) if target_is_log else pred_raw
+        return np.maximum(pred, 0.0)
+
+    def predict_clv(
+        self,
+        features: Dict[str, Any] | List[Dict[str, Any]],
         *,
-        horizon: str = "12m",
+        horizon: str | Sequence[str] = "12m",
         model_version: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Load bundle theo horizon: clv_model_bundle_{1m,3m,6m,12m}.joblib
         Bundle dạng dict khuyến nghị:
           {"pipeline": pipe, "expected_cols": [...], "target_is_log": True, "horizon": "6m"}
+        Multi-horizon: horizon="all" / list horizon, hoặc features là list khách -> predict_clv_horizons.
         """
-        bundle_name = self._get_clv_bundle_name(horizon)
-        bundle_obj = model_store.get(bundle_name, model_version)
-
-        pipe, expected_cols, target_is_log, meta = self._resolve_clv_components(bundle_obj)
-        if pipe is None:
-            raise ValueError("CLV bundle không có pipeline/model hợp lệ.")
+        if isinstance(features, list) or not isinstance(horizon, str) or horizon.lower().strip() == "all":
+            horizons = CLV_HORIZONS if isinstance(horizon, str) and horizon.lower().strip() == "all" else (
+                [horizon] if isinstance(horizon, str) else list(horizon)
+            )
+            return self.predict_clv_horizons(features, horizons=horizons, model_version=model_version)
 
-        X = pd.DataFrame([features])
-        if expected_cols:
-            X = X.reindex(columns=list(expected_cols))
-        X = self._clv_fillna_by_rule(X)
+        bundle_name, pipe, X, target_is_log, meta = self._clv_input(features, horizon, model_version)
 
-        pred_raw = pipe.predict(X)
-        pred = np.expm1(pred_raw) if target_is_log else pred_raw
-        pred_val = float(np.maximum(pred, 0.0)[0])
+        pred_val = float(self._clv_values(pipe.predict(X), target_is_log)[0])
 
         return {
             "CLV_pred": pred_val,
@@ -319,6 +648,295 @@ class MLService:
             "debug": meta,
         }
 
+    def predict_clv_horizons(
+        self,
+        features: Dict[str, Any] | List[Dict[str, Any]],
+        *,
+        horizons: Sequence[str] = CLV_HORIZONS,
+        model_version: Optional[str] = None,
+        max_workers: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        CLV nhiều horizon cho 1 hoặc N khách trong 1 lần gọi:
+        - DataFrame input dựng 1 lần; các bundle cùng expected_cols dùng chung 1 frame đã reindex + fillna
+        - pipeline từng horizon chạy song song trên thread
+        Trả CLV_pred {horizon: giá trị} (1 khách) hoặc results [{horizon: giá trị}, ...] (N khách).
+        """
+        rows = [features] if isinstance(features, dict) else list(features)
+        if not rows:
+            raise ValueError("features is required")
+
+        hs, bundles, values, n_frames = self._clv_horizon_values(
+            pd.DataFrame(rows), horizons, model_version, max_workers
+        )
+        per_customer = [{h: float(values[h][i]) for h in hs} for i in range(len(rows))]
+        out: Dict[str, Any] = {
+            "horizons": hs,
+            "bundles": {h: bundles[h][0] for h in hs},
+            "version": model_version or "default",
+            "debug": {"shared_frames": n_frames, **{h: bundles[h][4] for h in hs}},
+        }
+        if isinstance(features, dict):
+            out["CLV_pred"] = per_customer[0]
+        else:
+            out["n"] = len(per_customer)
+            out["results"] = per_customer
+        return out
+
+    def _clv_horizon_values(
+        self,
+        X_raw: pd.DataFrame,
+        horizons: Sequence[str],
+        model_version: Optional[str],
+        max_workers: Optional[int] = None,
+    ) -> Tuple[List[str], Dict[str, Tuple[str, Any, Optional[List[str]], bool, Dict[str, Any]]], Dict[str, np.ndarray], int]:
+        """(horizons, bundle / horizon, CLV[N] / horizon, số frame đã dựng) — frame dùng chung theo expected_cols."""
+        hs = list(dict.fromkeys(str(h).lower().strip() for h in horizons))
+        if not hs:
+            raise ValueError("horizons is required")
+
+        bundles = {h: self._clv_bundle(h, model_version) for h in hs}
+        frames: Dict[Optional[Tuple[str, ...]], pd.DataFrame] = {}
+        frame_keys: Dict[str, Optional[Tuple[str, ...]]] = {}
+        for h, (bundle_name, _, expected_cols, _, _) in bundles.items():
+            key = tuple(expected_cols) if expected_cols else None
+            if key not in frames:
+                plan = self._clv_bundle_fill_plan(bundle_name, model_version) if expected_cols else None
+                frames[key] = self._clv_frame(X_raw, expected_cols, plan)
+            frame_keys[h] = key
+
+        def run_one(h: str) -> np.ndarray:
+            _, pipe, _, target_is_log, _ = bundles[h]
+            return self._clv_values(pipe.predict(frames[frame_keys[h]]), target_is_log)
+
+        workers = min(len(hs), max_workers or config.ML_CLV_HORIZON_WORKERS or len(hs))
+        if workers <= 1:
+            preds = [run_one(h) for h in hs]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-clv") as pool:
+                preds = list(pool.map(run_one, hs))
+        return hs, bundles, dict(zip(hs, preds)), len(frames)
+
+    # ---------------------------
+    # CUSTOMER SNAPSHOT — churn + segment + CLV trên cùng 1 khúc khách
+    # ---------------------------
+    def check_snapshot_models(
+        self,
+        models: Sequence[str],
+        clv_horizons: Sequence[str] = CLV_HORIZONS,
+        model_version: Optional[str] = None,
+    ) -> None:
+        """Load trước các model job snapshot cần -> lỗi (thiếu model / bundle CLV) báo ngay thay vì job failed giữa chừng."""
+        unknown = [m for m in models if m not in SNAPSHOT_MODELS]
+        if unknown or not models:
+            raise ValueError(f"models must be a non-empty subset of {', '.join(SNAPSHOT_MODELS)}")
+        if "churn" in models:
+            model_store.get("churn_model", model_version)
+        if "segment" in models:
+            model_store.get("kmeans_customer_segmentation", model_version)
+        if "clv" in models:
+            bad = [h for h in clv_horizons if str(h).lower().strip() not in CLV_HORIZONS]
+            if bad or not clv_horizons:
+                raise ValueError(f"clv_horizons must be a non-empty subset of {', '.join(CLV_HORIZONS)}")
+            for h in clv_horizons:
+                self._clv_bundle(str(h).lower().strip(), model_version)
+
+    def snapshot_chunk(
+        self,
+        chunk: pd.DataFrame,
+        *,
+        models: Sequence[str] = SNAPSHOT_MODELS,
+        clv_horizons: Sequence[str] = CLV_HORIZONS,
+        id_cols: Sequence[str] = ("customer_id", "snapshot_date"),
+        segment_map: Optional[Dict[int, str]] = None,
+        model_version: Optional[str] = None,
+        pool: Optional[ThreadPoolExecutor] = None,
+    ) -> Tuple[pd.DataFrame, Dict[str, float]]:
+        """
+        1 khúc bảng feature khách -> 1 khúc snapshot (cột giống CustomerAnalyticsSnapshot của Backend):
+        {id_cols có trong input, churn_score, risk_tier, segment_id, segment_name, clv_<horizon>...}.
+        Mỗi model 1 lần predict vectorized trên cả khúc; `pool` có -> các model chạy song song.
+        Trả (frame, thời gian giây / model).
+        """
+        # load tuần tự ở thread gọi trước khi chạy song song (unpickle đồng thời lần đầu dễ lỗi import vòng)
+        self.check_snapshot_models(models, clv_horizons, model_version)
+
+        def run_churn() -> Dict[str, Any]:
+            model = model_store.get("churn_model", model_version)
+            expected = self._get_expected_columns(model)
+            proba, _, tier = self._churn_scores(model, self._inference_mode("churn_model"), expected, chunk, id_cols)
+            return {"churn_score": proba, "risk_tier": tier}
+
+        def run_segment() -> Dict[str, Any]:
+            labels, _, names = self._segment_assign(chunk, "kmeans_customer_segmentation", model_version, segment_map)
+            return {"segment_id": labels.astype(np.int64), "segment_name": [names[int(i)] for i in labels]}
+
+        def run_clv() -> Dict[str, Any]:
+            hs, _, values, _ = self._clv_horizon_values(chunk, clv_horizons, model_version)
+            return {f"clv_{h}": values[h] for h in hs}
+
+        tasks = {"churn": run_churn, "segment": run_segment, "clv": run_clv}
+
+        def timed(name: str) -> Tuple[Dict[str, Any], float]:
+            t0 = time.perf_counter()
+            res = tasks[name]()
+            return res, time.perf_counter() - t0
+
+        names = [m for m in SNAPSHOT_MODELS if m in models]
+        if pool is None:
+            results = [timed(m) for m in names]
+        else:
+            results = [f.result() for f in [pool.submit(timed, m) for m in names]]
+
+        out: Dict[str, Any] = {c: chunk[c].to_numpy() for c in id_cols if c in chunk.columns}
+        timings: Dict[str, float] = {}
+        for name, (cols, secs) in zip(names, results):
+            out.update(cols)
+            timings[name] = secs
+        return pd.DataFrame(out, index=range(len(chunk))), timings
+
+    # ---------------------------
+    # WARM-UP (startup) — predict giả 1 dòng cho từng model đã load
+    # ---------------------------
+    def warmup_predict(self, name: str, obj: Any) -> None:
+        if name.startswith("lead_feature_columns"):
+            self._lead_encoder(name).encode([{}])
+            return
+        if name.startswith("lead_"):
+            n = getattr(obj, "num_feature", None)
+            n_features = n() if callable(n) else getattr(obj, "n_features_in_", None)
+            if n_features:
+                X = np.zeros((1, int(n_features)), dtype=float)
+                cols = self._get_expected_columns(obj)
+                obj.predict(pd.DataFrame(X, columns=cols) if cols else X)
+            return
+        if name.startswith("churn"):
+            cols = self._get_expected_columns(obj)
+            X = pd.DataFrame([{}]).reindex(columns=cols) if cols else pd.DataFrame([{}])
+            self._predict_prob_and_score(obj, X, self._inference_mode(name))
+            return
+        if name.startswith("kmeans"):
+            n_features = getattr(obj, "n_features_in_", None)
+            if n_features:
+                obj.predict(np.zeros((1, int(n_features)), dtype=float))
+            return
+        if name.startswith("clv_model_bundle"):
+            pipe, expected_cols, _, _ = self._resolve_clv_components(obj)
+            if pipe is not None and expected_cols:
+                pipe.predict(self._clv_fillna_by_rule(pd.DataFrame([{}]).reindex(columns=expected_cols)))
+            return
+        if name.startswith("xgb_"):
+            expected = self._get_xgb_expected_features(obj)
+            if expected:
+                obj.predict(pd.DataFrame(np.zeros((1, len(expected))), columns=expected))
+            return
+
+    # ---------------------------
+    # ASYNC (micro-batching) — cùng kết quả với bản sync, nhưng gom request đồng thời
+    # ---------------------------
+    async def apredict_lead(
+        self,
+        lead: Dict[str, Any],
+        *,
+        cls_model_name: str = "lead_cls_onehot",
+        reg_model_name: str = "lead_reg_onehot",
+        feature_cols_name: str = "lead_feature_columns_onehot",
+        model_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        cls_model = await model_store.aget(cls_model_name, model_version)
+        reg_model = await model_store.aget(reg_model_name, model_version)
+        await model_store.aget(feature_cols_name, model_version)
+        encoder = self._lead_encoder(feature_cols_name, model_version)
+        mode = self._inference_mode(cls_model_name)
+
+        def run(X: np.ndarray) -> np.ndarray:
+            probs, raws = self._predict_prob_and_score_batch(
+                cls_model, self._lead_model_input(cls_model, X, encoder.feature_columns), mode
+            )
+            values = np.asarray(reg_model.predict(self._lead_model_input(reg_model, X, encoder.feature_columns)))
+            return np.column_stack([probs, raws, values.astype(float)])
+
+        key = ("lead", cls_model_name, reg_model_name, feature_cols_name, model_version)
+        out = await micro_batcher.submit(key, encoder.encode([lead]), run)
+        prob, raw_score, predicted_value = (float(x) for x in out[0])
+
+        return {
+            "conversion_prob": prob,
+            "raw_score": raw_score,
+            "predicted_value": predicted_value,
+            "currency": lead.get("predicted_value_currency") or "VND",
+            "models": {
+                "cls": cls_model_name,
+                "reg": reg_model_name,
+                "feature_columns": feature_cols_name,
+                "version": model_version or "default",
+            },
+        }
+
+    async def apredict_churn(
+        self,
+        customer_features: Dict[str, Any],
+        *,
+        model_name: str = "churn_model",
+        model_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        model = await model_store.aget(model_name, model_version)
+        mode = self._inference_mode(model_name)
+        X = pd.DataFrame([customer_features])
+
+        def run(Xb: pd.DataFrame) -> np.ndarray:
+            return np.column_stack(self._predict_prob_and_score_batch(model, Xb, mode))
+
+        # schema cột nằm trong key: chỉ gom các request có cùng bộ cột
+        key = ("churn", model_name, model_version, tuple(X.columns))
+        out = await micro_batcher.submit(key, X, run)
+        return {
+            "churn_prob": float(out[0, 0]),
+            "raw_score": float(out[0, 1]),
+            "model": model_name,
+            "version": model_version or "default",
+        }
+
+    async def apredict_segment(
+        self,
+        features: Dict[str, Any],
+        *,
+        model_name: str = "kmeans_customer_segmentation",
+        model_version: Optional[str] = None,
+        segment_map: Optional[Dict[int, str]] = None,
+        debug: bool = True,
+    ) -> Dict[str, Any]:
+        kmeans = await model_store.aget(model_name, model_version)
+        X_arr, segment_map = self._segment_input(kmeans, features, segment_map)
+
+        key = ("segment", model_name, model_version, X_arr.shape[1])
+        labels = await micro_batcher.submit(key, X_arr, kmeans.predict)
+        return self._segment_result(
+            kmeans, X_arr, int(labels[0]), segment_map,
+            model_name=model_name, model_version=model_version, debug=debug,
+        )
+
+    async def apredict_clv(
+        self,
+        features: Dict[str, Any],
+        *,
+        horizon: str = "12m",
+        model_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        await model_store.aget(self._get_clv_bundle_name(horizon), model_version)
+        bundle_name, pipe, X, target_is_log, meta = self._clv_input(features, horizon, model_version)
+
+        key = ("clv", bundle_name, model_version, tuple(X.columns))
+        pred_raw = await micro_batcher.submit(key, X, pipe.predict)
+
+        return {
+            "CLV_pred": float(self._clv_values(pred_raw, target_is_log)[0]),
+            "horizon": str(horizon),
+            "bundle": bundle_name,
+            "version": model_version or "default",
+            "debug": meta,
+        }
+
     # ---------------------------
     # FORECAST (daily revenue) — port từ app.py
     # ---------------------------
@@ -333,31 +951,12 @@ class MLService:
         cols = self._get_expected_columns(model)
         return cols if cols else None
 
-    def _season_onehot(self, month: int) -> Tuple[int, int, int, int]:
-        spring = 1 if month in (3, 4, 5) else 0
-        summer = 1 if month in (6, 7, 8) else 0
-        autumn = 1 if month in (9, 10, 11) else 0
-        winter = 1 if month in (12, 1, 2) else 0
-        return spring, summer, autumn, winter
-
-    def _build_holiday_flag(self, d: pd.Timestamp, holiday_mmdd: List[str], window_days: int) -> int:
-        if not holiday_mmdd:
-            return 0
-        holiday_set = set(holiday_mmdd)
-        if window_days <= 0:
-            return 1 if d.strftime("%m-%d") in holiday_set else 0
-
-        yyyy = d.year
-        for mmdd in holiday_mmdd:
-            try:
-                hd = pd.Timestamp(f"{yyyy}-{mmdd}")
-            except Exception:
-                continue
-            if abs((d - hd).days) <= window_days:
-                return 1
-        return 0
-
-    def _ensure_base_time_cols(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _ensure_base_time_cols(
+        self,
+        df: pd.DataFrame,
+        holiday_mmdd: Optional[List[str]] = None,
+        holiday_window_days: int = 0,
+    ) -> pd.DataFrame:
         out = df.copy()
         if "date" not in out.columns:
             raise ValueError("CSV phải có cột `date`.")
@@ -387,58 +986,11 @@ class MLService:
 
         if "is_holiday_window" in out.columns:
             out["is_holiday_window"] = pd.to_numeric(out["is_holiday_window"], errors="coerce").fillna(0).astype(int)
+        elif holiday_mmdd:
+            out["is_holiday_window"] = holiday_flags(out["date"], holiday_mmdd, holiday_window_days)
 
         return out
 
-    def _make_feature_row(
-        self,
-        expected: List[str],
-        hist_series: pd.Series,
-        future_date: pd.Timestamp,
-        holiday_mmdd: List[str],
-        holiday_window_days: int,
-    ) -> Dict[str, Any]:
-        row = {c: 0 for c in expected}
-
-        wd = int(future_date.dayofweek)
-        mo = int(future_date.month)
-        yr = int(future_date.year)
-
-        if "weekday" in row:
-            row["weekday"] = wd
-        if "month" in row:
-            row["month"] = mo
-        if "year" in row:
-            row["year"] = yr
-        if "is_weekend" in row:
-            row["is_weekend"] = 1 if wd >= 5 else 0
-        if "is_holiday_window" in row:
-            row["is_holiday_window"] = int(self._build_holiday_flag(future_date, holiday_mmdd, holiday_window_days))
-
-        spring, summer, autumn, winter = self._season_onehot(mo)
-        if "season_spring" in row:
-            row["season_spring"] = spring
-        if "season_summer" in row:
-            row["season_summer"] = summer
-        if "season_autumn" in row:
-            row["season_autumn"] = autumn
-        if "season_winter" in row:
-            row["season_winter"] = winter
-
-        if "lag_1" in row:
-            row["lag_1"] = float(hist_series.iloc[-1])
-        if "lag_7" in row:
-            row["lag_7"] = float(hist_series.iloc[-7]) if len(hist_series) >= 7 else float(hist_series.iloc[0])
-        if "lag_14" in row:
-            row["lag_14"] = float(hist_series.iloc[-14]) if len(hist_series) >= 14 else float(hist_series.iloc[0])
-
-        if "roll_mean_7" in row:
-            row["roll_mean_7"] = float(hist_series.tail(7).mean()) if len(hist_series) >= 7 else float(hist_series.mean())
-        if "roll_mean_28" in row:
-            row["roll_mean_28"] = float(hist_series.tail(28).mean()) if len(hist_series) >= 28 else float(hist_series.mean())
-
-        return row
-
     def _transform_pred(self, pred_raw: float, mode: str, scale: float) -> float:
         if mode == "raw":
             return float(pred_raw)
@@ -450,77 +1002,458 @@ class MLService:
             return float(np.expm1(pred_raw) * float(scale))
         return float(pred_raw)
 
-    def forecast_recursive(
+    def _transform_pred_array(self, pred_raw: np.ndarray, mode: str, scale: float) -> np.ndarray:
+        """Bản vector của _transform_pred (cùng công thức)."""
+        if mode == "expm1":
+            return np.expm1(pred_raw)
+        if mode == "raw_scale":
+            return pred_raw * float(scale)
+        if mode == "expm1_scale":
+            return np.expm1(pred_raw) * float(scale)
+        return np.asarray(pred_raw, dtype=float)
+
+    def _forecast_predict_fn(self, model: Any, expected: List[str]):
+        # XGBoost nhận thẳng ndarray đúng thứ tự cột; model sklearn fit bằng DataFrame cần tên cột
+        if self._get_expected_columns(model) is not None and not hasattr(model, "get_booster"):
+            return lambda X: model.predict(pd.DataFrame(X, columns=expected))
+        return model.predict
+
+    def prepare_daily_dataset(
         self,
+        df: pd.DataFrame,
+        holiday_mmdd: Optional[List[str]] = None,
+        holiday_window_days: int = 0,
+    ) -> PreparedDailyDataset:
+        """Clean CSV daily 1 lần để dùng chung cho mọi target trong request."""
+        return PreparedDailyDataset(
+            self._ensure_base_time_cols(df, holiday_mmdd, holiday_window_days),
+            holiday_mmdd,
+            holiday_window_days,
+        )
+
+    def _forecast_post_fn(
+        self,
+        transform_mode: str,
+        transform_scale: float,
+        clip_negative_to_zero: bool,
+        append_transformed_to_history: bool,
+    ):
+        def post(_: int, raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            pred = self._transform_pred_array(raw, transform_mode, transform_scale)
+            pred_out = np.where(pred < 0, 0.0, pred) if clip_negative_to_zero else pred
+            return pred_out, (pred_out if append_transformed_to_history else raw)
+
+        return post
+
+    def _recursive_history(
+        self,
+        prepared: PreparedDailyDataset,
+        *,
+        target_col: str,
+        start_date: Optional[str],
+        hist_days: int,
+    ) -> Tuple[np.ndarray, pd.Timestamp, pd.Timestamp]:
+        """History (tail hist_days ngày trước start) + last_date + start dùng; validate giống path cũ."""
+        dates, values = prepared.series(target_col)
+        if len(values) == 0:
+            raise ValueError("Dataset rỗng sau khi clean target.")
+
+        last_date = dates.max()
+        used_start = pd.to_datetime(start_date) if start_date else (last_date + pd.Timedelta(days=1))
+
+        mask = dates < used_start
+        if not mask.any():
+            raise ValueError("Không có history trước start_date.")
+
+        hist_series = pd.Series(values[mask], index=dates[mask]).tail(int(hist_days)).sort_index()
+        if len(hist_series) < 8:
+            raise ValueError("History quá ngắn (<8 ngày).")
+        return hist_series.values, last_date, used_start
+
+    def _recursive_engine(
+        self,
+        prepared: PreparedDailyDataset,
         *,
-        df_daily: pd.DataFrame,
         model: Any,
         target_col: str,
         horizon_days: int,
         start_date: Optional[str],
         holiday_mmdd: List[str],
         holiday_window_days: int,
-        hist_days: int = 365,
-        clip_negative_to_zero: bool = True,
-        transform_mode: str = "raw",
-        transform_scale: float = 1.0,
-        append_transformed_to_history: bool = True,
-    ) -> Tuple[pd.DataFrame, List[str], pd.Timestamp, pd.Timestamp]:
-        df = self._ensure_base_time_cols(df_daily)
-
-        if target_col not in df.columns:
-            raise ValueError(f"CSV thiếu cột `{target_col}`.")
-
-        df[target_col] = pd.to_numeric(df[target_col], errors="coerce")
-        df = df.dropna(subset=[target_col])
-        if df.empty:
-            raise ValueError("Dataset rỗng sau khi clean target.")
+        hist_days: int,
+        n_paths: int = 1,
+    ) -> Tuple[RecursiveForecastEngine, List[str], pd.Timestamp, pd.Timestamp]:
+        """
+        Dựng engine 1 series từ dataset đã prepare (validate history giống path cũ).
+        n_paths > 1: cùng history lặp thành n_paths dòng (sample path cho Monte Carlo interval).
+        """
+        hist, last_date, used_start = self._recursive_history(
+            prepared, target_col=target_col, start_date=start_date, hist_days=hist_days
+        )
 
         expected = self._get_xgb_expected_features(model)
         if not expected:
             raise ValueError("Không lấy được expected features từ model.")
 
-        last_date = pd.to_datetime(df["date"]).max()
-        used_start = pd.to_datetime(start_date) if start_date else (last_date + pd.Timedelta(days=1))
+        future_dates = pd.date_range(used_start, periods=int(horizon_days), freq="D")
+        engine = RecursiveForecastEngine(
+            expected,
+            [hist] * max(1, int(n_paths)),
+            future_dates,
+            holiday_flags(future_dates, holiday_mmdd, holiday_window_days),
+        )
+        return engine, expected, last_date, used_start
 
-        hist_df = df[pd.to_datetime(df["date"]) < used_start].copy()
-        if hist_df.empty:
-            raise ValueError("Không có history trước start_date.")
+    def _as_prepared(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+    ) -> PreparedDailyDataset:
+        if isinstance(df, PreparedDailyDataset):
+            return df
+        return self.prepare_daily_dataset(df, holiday_mmdd, holiday_window_days)
 
-        hist_df = hist_df.tail(int(hist_days)).copy()
-        hist_series = pd.Series(hist_df[target_col].astype(float).values, index=pd.to_datetime(hist_df["date"])).sort_index()
-        if len(hist_series) < 8:
-            raise ValueError("History quá ngắn (<8 ngày).")
+    def _format_forecast(self, frame: pd.DataFrame, output: str) -> Any:
+        # records: như cũ ; columnar: 1 list / cột ; frame: giữ DataFrame (để ghi Arrow/Parquet)
+        if output == "columnar":
+            return frame_to_columnar(frame)
+        if output == "frame":
+            return frame
+        return frame.to_dict(orient="records")
 
-        future_dates = pd.date_range(used_start, periods=int(horizon_days), freq="D")
+    def _interval_residuals(
+        self,
+        prepared: PreparedDailyDataset,
+        *,
+        model: Any,
+        target_col: str,
+        used_start: pd.Timestamp,
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        transform_mode: str,
+        transform_scale: float,
+        backtest_days: int,
+    ) -> np.ndarray:
+        """
+        Residual one-step trên `backtest_days` ngày ngay trước start (chỉ dùng actual < start),
+        tính trong không gian raw của model: inverse_transform(actual) - pred_raw.
+        """
+        bt = self.backtest_one_step(
+            prepared,
+            model=model,
+            target_col=target_col,
+            start_date=str((used_start - pd.Timedelta(days=int(backtest_days))).date()),
+            end_date=str((used_start - pd.Timedelta(days=1)).date()),
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+        )
+        resid = inverse_transform(bt["actual"].to_numpy(), transform_mode, transform_scale) - bt["pred_raw"].to_numpy()
+        return resid[np.isfinite(resid)]
 
-        preds = []
-        hist_ext = hist_series.copy()
+    def _simulate_interval(
+        self,
+        prepared: PreparedDailyDataset,
+        interval: IntervalSpec,
+        *,
+        model: Any,
+        target_col: str,
+        horizon_days: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int,
+        clip_negative_to_zero: bool,
+        transform_mode: str,
+        transform_scale: float,
+        append_transformed_to_history: bool,
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Monte Carlo: interval.paths path chạy chung 1 engine -> quantile (n_quantiles, horizon)."""
+        if int(interval.paths) > config.ML_FORECAST_INTERVAL_MAX_PATHS:
+            raise ValueError(f"interval paths tối đa {config.ML_FORECAST_INTERVAL_MAX_PATHS}.")
+
+        engine, expected, _, used_start = self._recursive_engine(
+            prepared,
+            model=model,
+            target_col=target_col,
+            horizon_days=horizon_days,
+            start_date=start_date,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+            n_paths=interval.paths,
+        )
+        resid = self._interval_residuals(
+            prepared,
+            model=model,
+            target_col=target_col,
+            used_start=used_start,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            transform_mode=transform_mode,
+            transform_scale=transform_scale,
+            backtest_days=interval.backtest_days,
+        )
+        post = self._forecast_post_fn(transform_mode, transform_scale, clip_negative_to_zero, append_transformed_to_history)
+        samples = simulate_paths(engine, self._forecast_predict_fn(model, expected), post, resid, seed=interval.seed)
+        info = {
+            "paths": int(interval.paths),
+            "quantiles": [float(q) for q in interval.quantiles],
+            "backtest_days": int(interval.backtest_days),
+            "n_residuals": int(len(resid)),
+            "residual_std_raw": float(np.std(resid)),
+            "seed": interval.seed,
+        }
+        return path_quantiles(samples, interval.quantiles), info
 
-        for d in future_dates:
-            feat = self._make_feature_row(expected, hist_ext, d, holiday_mmdd, holiday_window_days)
-            X = pd.DataFrame([feat], columns=expected)
+    def forecast_recursive(
+        self,
+        *,
+        df_daily: pd.DataFrame | PreparedDailyDataset,
+        model: Any,
+        target_col: str,
+        horizon_days: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        transform_mode: str = "raw",
+        transform_scale: float = 1.0,
+        append_transformed_to_history: bool = True,
+        interval: Optional[IntervalSpec] = None,
+    ) -> Tuple[pd.DataFrame, List[str], pd.Timestamp, pd.Timestamp]:
+        """
+        Forecast đệ quy 1 series. interval bật (paths > 0): thêm cột prediction_pXX (quantile Monte Carlo)
+        cạnh `prediction`; thông tin mô phỏng nằm ở preds.attrs["interval"].
+        """
+        prepared = self._as_prepared(df_daily, holiday_mmdd, holiday_window_days)
+        engine, expected, last_date, used_start = self._recursive_engine(
+            prepared,
+            model=model,
+            target_col=target_col,
+            horizon_days=horizon_days,
+            start_date=start_date,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+        )
 
-            pred_raw = float(model.predict(X)[0])
-            pred = self._transform_pred(pred_raw, transform_mode, transform_scale)
+        post = self._forecast_post_fn(transform_mode, transform_scale, clip_negative_to_zero, append_transformed_to_history)
+        raw_all, out_all = engine.run(self._forecast_predict_fn(model, expected), post)
 
-            pred_out = 0.0 if (clip_negative_to_zero and pred < 0) else float(pred)
+        preds = pd.DataFrame({
+            "date": engine.future_dates[0],
+            "prediction_raw": raw_all[0],
+            "prediction": out_all[0],
+            "transform_mode": transform_mode,
+            "transform_scale": float(transform_scale),
+        })
+        if interval is not None and interval.enabled:
+            bands, info = self._simulate_interval(
+                prepared,
+                interval,
+                model=model,
+                target_col=target_col,
+                horizon_days=horizon_days,
+                start_date=str(used_start.date()),
+                holiday_mmdd=holiday_mmdd,
+                holiday_window_days=holiday_window_days,
+                hist_days=hist_days,
+                clip_negative_to_zero=clip_negative_to_zero,
+                transform_mode=transform_mode,
+                transform_scale=transform_scale,
+                append_transformed_to_history=append_transformed_to_history,
+            )
+            for col, band in zip(interval.column_names(), bands):
+                preds[col] = band
+            preds.attrs["interval"] = info
+        return preds, expected, last_date, used_start
+
+    def _plan_targets(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        targets: Sequence[ForecastTarget],
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        model_version: Optional[str],
+    ) -> Tuple[PreparedDailyDataset, Dict[str, Any], str]:
+        """Prepare dataset 1 lần, load model từng target, chốt start_date (theo target đầu tiên)."""
+        if not targets:
+            raise ValueError("targets is required")
+        names = [t.name for t in targets]
+        if len(set(names)) != len(names):
+            raise ValueError("Tên target bị trùng.")
+
+        prepared = self._as_prepared(df, holiday_mmdd, holiday_window_days)
+        models = {t.name: model_store.get(t.model_name, model_version) for t in targets}
+
+        if start_date:
+            return prepared, models, start_date
+        first_dates, first_values = prepared.series(targets[0].target_col)
+        if len(first_values) == 0:
+            raise ValueError("Dataset rỗng sau khi clean target.")
+        return prepared, models, str((first_dates.max() + pd.Timedelta(days=1)).date())
 
-            preds.append({
-                "date": d,
-                "prediction_raw": pred_raw,
-                "prediction": pred_out,
-                "transform_mode": transform_mode,
-                "transform_scale": float(transform_scale),
-            })
+    def _targets_debug(
+        self,
+        targets: Sequence[ForecastTarget],
+        expected: Sequence[List[str]],
+        last_date: pd.Timestamp,
+        used_start: pd.Timestamp,
+        append_transformed_to_history: bool,
+    ) -> Dict[str, Any]:
+        debug: Dict[str, Any] = {
+            "last_date_in_file": str(pd.to_datetime(last_date).date()),
+            "start_date_used": str(pd.to_datetime(used_start).date()),
+        }
+        for t, exp in zip(targets, expected):
+            debug[f"expected_features_{t.name}"] = exp
+        for t in targets:
+            debug[f"{t.name}_transform_mode"] = t.transform_mode
+            debug[f"{t.name}_transform_scale"] = float(t.transform_scale)
+        debug["append_transformed_to_history"] = bool(append_transformed_to_history)
+        return debug
+
+    def forecast_targets(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        targets: Sequence[ForecastTarget],
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        append_transformed_to_history: bool = True,
+        model_version: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        output: str = "records",
+        interval: Optional[IntervalSpec] = None,
+    ) -> Dict[str, Any]:
+        """
+        Forecast nhiều series trên cùng 1 dataset đã prepare:
+        - start_date lấy theo target đầu tiên (như ALL cũ: line dùng start của order)
+        - các target chạy song song trên thread (XGBoost nhả GIL khi predict)
+        Output: cột pred_{name}_raw / pred_{name} cho từng target (+ pred_{name}_pXX khi bật interval).
+        """
+        prepared, models, start_used = self._plan_targets(
+            df, targets, start_date, holiday_mmdd, holiday_window_days, model_version
+        )
 
-            hist_ext.loc[d] = pred_out if append_transformed_to_history else pred_raw
+        def run_one(t: ForecastTarget) -> Tuple[pd.DataFrame, List[str], pd.Timestamp, pd.Timestamp]:
+            return self.forecast_recursive(
+                df_daily=prepared,
+                model=models[t.name],
+                target_col=t.target_col,
+                horizon_days=horizon,
+                start_date=start_used,
+                holiday_mmdd=holiday_mmdd,
+                holiday_window_days=holiday_window_days,
+                hist_days=hist_days,
+                clip_negative_to_zero=clip_negative_to_zero,
+                transform_mode=t.transform_mode,
+                transform_scale=float(t.transform_scale),
+                append_transformed_to_history=append_transformed_to_history,
+                interval=interval,
+            )
+
+        workers = min(len(targets), max_workers or config.ML_FORECAST_TARGET_WORKERS or len(targets))
+        if workers <= 1:
+            results = [run_one(t) for t in targets]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-forecast") as pool:
+                results = list(pool.map(run_one, targets))
+
+        first_pred, _, last_date, used_start = results[0]
+        out = pd.DataFrame({"date": first_pred["date"]})
+        for t, (pred_df, _, _, _) in zip(targets, results):
+            out[f"pred_{t.name}_raw"] = pred_df["prediction_raw"]
+            out[f"pred_{t.name}"] = pred_df["prediction"]
+            if interval is not None and interval.enabled:
+                for col in interval.column_names():
+                    out[col.replace("prediction", f"pred_{t.name}", 1)] = pred_df[col]
+
+        debug = self._targets_debug(targets, [r[1] for r in results], last_date, used_start, append_transformed_to_history)
+        if interval is not None and interval.enabled:
+            debug["interval"] = {t.name: r[0].attrs.get("interval") for t, r in zip(targets, results)}
+        return {"debug": debug, "forecast": self._format_forecast(out, output)}
+
+    def stream_forecast_targets(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        targets: Sequence[ForecastTarget],
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        append_transformed_to_history: bool = True,
+        model_version: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """
+        Như forecast_targets nhưng trả (debug, iterator row) — mọi target bước cùng nhau,
+        mỗi ngày yield 1 row {date, pred_{name}_raw, pred_{name}, ...} ngay khi tính xong.
+        Validate/dựng engine chạy ngay khi gọi (lỗi input raise trước khi stream).
+        """
+        prepared, models, start_used = self._plan_targets(
+            df, targets, start_date, holiday_mmdd, holiday_window_days, model_version
+        )
 
-        return pd.DataFrame(preds), expected, last_date, used_start
+        runs = []
+        for t in targets:
+            engine, expected, last_date, used_start = self._recursive_engine(
+                prepared,
+                model=models[t.name],
+                target_col=t.target_col,
+                horizon_days=horizon,
+                start_date=start_used,
+                holiday_mmdd=holiday_mmdd,
+                holiday_window_days=holiday_window_days,
+                hist_days=hist_days,
+            )
+            post = self._forecast_post_fn(t.transform_mode, float(t.transform_scale), clip_negative_to_zero, append_transformed_to_history)
+            steps = engine.steps(self._forecast_predict_fn(models[t.name], expected), post)
+            runs.append((t, engine, expected, last_date, used_start, steps))
+
+        _, engine0, _, last_date0, used_start0, _ = runs[0]
+        debug = self._targets_debug(targets, [r[2] for r in runs], last_date0, used_start0, append_transformed_to_history)
+        dates = iso_dates(engine0.future_dates[0])
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            for step, day in enumerate(dates):
+                row: Dict[str, Any] = {"date": day}
+                for t, _, _, _, _, steps in runs:
+                    _, raw, out = next(steps)
+                    row[f"pred_{t.name}_raw"] = float(raw[0])
+                    row[f"pred_{t.name}"] = float(out[0])
+                yield row
+
+        return debug, rows()
+
+    def _all_targets(
+        self,
+        order_transform_mode: str,
+        order_transform_scale: float,
+        line_transform_mode: str,
+        line_transform_scale: float,
+        extra_targets: Optional[Sequence[ForecastTarget]],
+    ) -> List[ForecastTarget]:
+        order_t, line_t = DEFAULT_FORECAST_TARGETS
+        targets = [
+            ForecastTarget(order_t.name, order_t.target_col, order_t.model_name, order_transform_mode, float(order_transform_scale)),
+            ForecastTarget(line_t.name, line_t.target_col, line_t.model_name, line_transform_mode, float(line_transform_scale)),
+        ]
+        targets.extend(extra_targets or [])
+        return targets
 
     def forecast_all_targets(
         self,
-        df: pd.DataFrame,
+        df: pd.DataFrame | PreparedDailyDataset,
         *,
         horizon: int,
         start_date: Optional[str],
@@ -534,64 +1467,160 @@ class MLService:
         line_transform_scale: float = 1.0,
         append_transformed_to_history: bool = True,
         model_version: Optional[str] = None,
+        extra_targets: Optional[Sequence[ForecastTarget]] = None,
+        output: str = "records",
+        interval: Optional[IntervalSpec] = None,
     ) -> Dict[str, Any]:
-        model_order = model_store.get("xgb_daily_revenue_order", model_version)
-        model_line = model_store.get("xgb_daily_revenue_line", model_version)
-
-        pred_order, exp_order, last_date, used_start = self.forecast_recursive(
-            df_daily=df,
-            model=model_order,
-            target_col="daily_revenue_order",
-            horizon_days=horizon,
+        return self.forecast_targets(
+            df,
+            targets=self._all_targets(order_transform_mode, order_transform_scale, line_transform_mode, line_transform_scale, extra_targets),
+            horizon=horizon,
             start_date=start_date,
             holiday_mmdd=holiday_mmdd,
             holiday_window_days=holiday_window_days,
             hist_days=hist_days,
             clip_negative_to_zero=clip_negative_to_zero,
-            transform_mode=order_transform_mode,
-            transform_scale=order_transform_scale,
             append_transformed_to_history=append_transformed_to_history,
+            model_version=model_version,
+            output=output,
+            interval=interval,
         )
-        pred_line, exp_line, _, _ = self.forecast_recursive(
-            df_daily=df,
-            model=model_line,
-            target_col="daily_revenue_line",
-            horizon_days=horizon,
-            start_date=str(pd.to_datetime(used_start).date()),
+
+    def stream_all_targets(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        order_transform_mode: str = "raw",
+        order_transform_scale: float = 1.0,
+        line_transform_mode: str = "raw",
+        line_transform_scale: float = 1.0,
+        append_transformed_to_history: bool = True,
+        model_version: Optional[str] = None,
+        extra_targets: Optional[Sequence[ForecastTarget]] = None,
+    ) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        return self.stream_forecast_targets(
+            df,
+            targets=self._all_targets(order_transform_mode, order_transform_scale, line_transform_mode, line_transform_scale, extra_targets),
+            horizon=horizon,
+            start_date=start_date,
             holiday_mmdd=holiday_mmdd,
             holiday_window_days=holiday_window_days,
             hist_days=hist_days,
             clip_negative_to_zero=clip_negative_to_zero,
-            transform_mode=line_transform_mode,
-            transform_scale=line_transform_scale,
             append_transformed_to_history=append_transformed_to_history,
+            model_version=model_version,
+        )
+
+    def _multi_series_engine(
+        self,
+        df: pd.DataFrame,
+        *,
+        target: str,
+        series_col: str,
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int,
+        model_name: Optional[str],
+        model_version: Optional[str],
+    ) -> Tuple[RecursiveForecastEngine, Any, Dict[str, Any]]:
+        """Dựng engine S dãy cho CSV long; trả (engine, model, info series/skipped/expected)."""
+        if series_col not in df.columns:
+            raise ValueError(f"CSV thiếu cột `{series_col}`.")
+        if not model_name:
+            by_col = {t.target_col: t.model_name for t in DEFAULT_FORECAST_TARGETS}
+            if target not in by_col:
+                raise ValueError("model_name is required for target ngoài daily_revenue_order/daily_revenue_line")
+            model_name = by_col[target]
+        model = model_store.get(model_name, model_version)
+
+        expected = self._get_xgb_expected_features(model)
+        if not expected:
+            raise ValueError("Không lấy được expected features từ model.")
+
+        if target not in df.columns:
+            raise ValueError(f"CSV thiếu cột `{target}`.")
+        # Chỉ cần date/series/target cho history -> không copy các cột feature khác của CSV long
+        base = self._ensure_base_time_cols(
+            df[[c for c in ("date", series_col, target) if c in df.columns]], holiday_mmdd, holiday_window_days
         )
+        base = base.assign(**{target: pd.to_numeric(base[target], errors="coerce")}).dropna(subset=[target, series_col])
+        if base.empty:
+            raise ValueError("Dataset rỗng sau khi clean target.")
 
-        out = pd.DataFrame({"date": pred_order["date"]})
-        out["pred_order_raw"] = pred_order["prediction_raw"]
-        out["pred_order"] = pred_order["prediction"]
-        out["pred_line_raw"] = pred_line["prediction_raw"]
-        out["pred_line"] = pred_line["prediction"]
+        fixed_start = pd.to_datetime(start_date) if start_date else None
+
+        series_ids: List[Any] = []
+        histories: List[np.ndarray] = []
+        starts: List[pd.Timestamp] = []
+        last_dates: List[pd.Timestamp] = []
+        skipped: List[Dict[str, Any]] = []
+
+        for sid, g in base.groupby(series_col, sort=True):
+            sid = sid.item() if isinstance(sid, np.generic) else sid
+            last_date = g["date"].max()
+            used_start = fixed_start if fixed_start is not None else (last_date + pd.Timedelta(days=1))
+            g = g[g["date"] < used_start]
+            hist = pd.Series(g[target].to_numpy(dtype=float), index=g["date"]).tail(int(hist_days)).sort_index()
+            if len(hist) < 8:
+                skipped.append({"series_id": sid, "reason": "History quá ngắn (<8 ngày)."})
+                continue
+            series_ids.append(sid)
+            histories.append(hist.values)
+            starts.append(used_start)
+            last_dates.append(last_date)
+
+        if not histories:
+            raise ValueError("Không series nào đủ history để forecast.")
+
+        n_series, horizon = len(histories), int(horizon)
+        if fixed_start is not None or len(set(starts)) == 1:
+            future_dates: Any = pd.date_range(starts[0], periods=horizon, freq="D")
+            flags = holiday_flags(future_dates, holiday_mmdd, holiday_window_days)
+        else:
+            future_dates = [pd.date_range(s0, periods=horizon, freq="D") for s0 in starts]
+            flat = pd.DatetimeIndex(np.concatenate([d.values for d in future_dates]))
+            flags = holiday_flags(flat, holiday_mmdd, holiday_window_days).reshape(n_series, horizon)
+
+        engine = RecursiveForecastEngine(expected, histories, future_dates, flags)
+        info = {
+            "model_name": model_name,
+            "expected": expected,
+            "series_ids": series_ids,
+            "starts": starts,
+            "last_dates": last_dates,
+            "skipped": skipped,
+        }
+        return engine, model, info
 
-        debug = {
-            "last_date_in_file": str(pd.to_datetime(last_date).date()),
-            "start_date_used": str(pd.to_datetime(used_start).date()),
-            "expected_features_order": exp_order,
-            "expected_features_line": exp_line,
-            "order_transform_mode": order_transform_mode,
-            "order_transform_scale": float(order_transform_scale),
-            "line_transform_mode": line_transform_mode,
-            "line_transform_scale": float(line_transform_scale),
+    def _multi_series_debug(self, info: Dict[str, Any], *, target: str, series_col: str, horizon: int,
+                            transform_mode: str, transform_scale: float, append_transformed_to_history: bool) -> Dict[str, Any]:
+        return {
+            "target": target,
+            "model": info["model_name"],
+            "series_col": series_col,
+            "n_series": len(info["series_ids"]),
+            "n_skipped": len(info["skipped"]),
+            "expected_features": info["expected"],
+            "transform_mode": transform_mode,
+            "transform_scale": float(transform_scale),
             "append_transformed_to_history": bool(append_transformed_to_history),
+            "predict_calls": int(horizon),
         }
 
-        return {"debug": debug, "forecast": out.to_dict(orient="records")}
-
-    def forecast_one_target(
+    def forecast_multi_series(
         self,
         df: pd.DataFrame,
         *,
         target: str,
+        series_col: str = "series_id",
         horizon: int,
         start_date: Optional[str],
         holiday_mmdd: List[str],
@@ -601,13 +1630,161 @@ class MLService:
         transform_mode: str = "raw",
         transform_scale: float = 1.0,
         append_transformed_to_history: bool = True,
+        model_name: Optional[str] = None,
         model_version: Optional[str] = None,
+        output: str = "records",
     ) -> Dict[str, Any]:
+        """
+        Forecast nhiều series (CSV dạng long, cột `series_col`) bằng 1 model:
+        mọi series bước cùng nhau từng ngày, mỗi ngày chỉ 1 lần predict trên ma trận (n_series, n_features).
+        start_date=None -> mỗi series bắt đầu từ ngày cuối của chính nó + 1.
+        Series không đủ history (<8 ngày) bị bỏ qua và liệt kê trong `skipped`.
+        output="frame" -> `forecast` là 1 DataFrame long (series_id, date, prediction_raw, prediction).
+        """
+        engine, model, info = self._multi_series_engine(
+            df,
+            target=target,
+            series_col=series_col,
+            horizon=horizon,
+            start_date=start_date,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+            model_name=model_name,
+            model_version=model_version,
+        )
+        post = self._forecast_post_fn(transform_mode, transform_scale, clip_negative_to_zero, append_transformed_to_history)
+        raw_all, out_all = engine.run(self._forecast_predict_fn(model, info["expected"]), post)
+
+        debug = self._multi_series_debug(
+            info, target=target, series_col=series_col, horizon=horizon, transform_mode=transform_mode,
+            transform_scale=transform_scale, append_transformed_to_history=append_transformed_to_history,
+        )
+
+        if output == "frame":
+            n_series, h = raw_all.shape
+            frame = pd.DataFrame({
+                "series_id": np.repeat(np.asarray(info["series_ids"], dtype=object), h),
+                "date": np.concatenate([d.values for d in engine.future_dates]),
+                "prediction_raw": raw_all.reshape(-1),
+                "prediction": out_all.reshape(-1),
+            })
+            return {"debug": debug, "forecast": frame, "skipped": info["skipped"]}
+
+        series_out = []
+        for i, sid in enumerate(info["series_ids"]):
+            fc = pd.DataFrame({"date": engine.future_dates[i], "prediction_raw": raw_all[i], "prediction": out_all[i]})
+            series_out.append({
+                "series_id": sid,
+                "last_date_in_file": str(info["last_dates"][i].date()),
+                "start_date_used": str(info["starts"][i].date()),
+                "forecast": self._format_forecast(fc, output),
+            })
+        return {"debug": debug, "series": series_out, "skipped": info["skipped"]}
+
+    def stream_multi_series(
+        self,
+        df: pd.DataFrame,
+        *,
+        target: str,
+        series_col: str = "series_id",
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        transform_mode: str = "raw",
+        transform_scale: float = 1.0,
+        append_transformed_to_history: bool = True,
+        model_name: Optional[str] = None,
+        model_version: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """
+        Bản stream của forecast_multi_series: debug (kèm skipped) + iterator row {series_id, date, ...};
+        mỗi bước recursion (1 predict) yield n_series row.
+        """
+        engine, model, info = self._multi_series_engine(
+            df,
+            target=target,
+            series_col=series_col,
+            horizon=horizon,
+            start_date=start_date,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+            model_name=model_name,
+            model_version=model_version,
+        )
+        post = self._forecast_post_fn(transform_mode, transform_scale, clip_negative_to_zero, append_transformed_to_history)
+        debug = self._multi_series_debug(
+            info, target=target, series_col=series_col, horizon=horizon, transform_mode=transform_mode,
+            transform_scale=transform_scale, append_transformed_to_history=append_transformed_to_history,
+        )
+        debug["skipped"] = info["skipped"]
+        series_ids = info["series_ids"]
+        dates = [iso_dates(d) for d in engine.future_dates]
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            for step, raw, out in engine.steps(self._forecast_predict_fn(model, info["expected"]), post):
+                for i, sid in enumerate(series_ids):
+                    yield {
+                        "series_id": sid,
+                        "date": dates[i][step],
+                        "prediction_raw": float(raw[i]),
+                        "prediction": float(out[i]),
+                    }
+
+        return debug, rows()
+
+    def _one_target_plan(self, target: str, model_version: Optional[str]) -> Tuple[str, Any]:
         if target not in ("daily_revenue_order", "daily_revenue_line"):
             raise ValueError("target must be daily_revenue_order or daily_revenue_line")
-
         model_name = "xgb_daily_revenue_order" if target == "daily_revenue_order" else "xgb_daily_revenue_line"
-        model = model_store.get(model_name, model_version)
+        return model_name, model_store.get(model_name, model_version)
+
+    def _one_target_debug(
+        self,
+        *,
+        target: str,
+        model_name: str,
+        last_date: pd.Timestamp,
+        used_start: pd.Timestamp,
+        expected: List[str],
+        transform_mode: str,
+        transform_scale: float,
+        append_transformed_to_history: bool,
+    ) -> Dict[str, Any]:
+        return {
+            "target": target,
+            "model": model_name,
+            "last_date_in_file": str(pd.to_datetime(last_date).date()),
+            "start_date_used": str(pd.to_datetime(used_start).date()),
+            "expected_features": expected,
+            "transform_mode": transform_mode,
+            "transform_scale": float(transform_scale),
+            "append_transformed_to_history": bool(append_transformed_to_history),
+        }
+
+    def forecast_one_target(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        target: str,
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        transform_mode: str = "raw",
+        transform_scale: float = 1.0,
+        append_transformed_to_history: bool = True,
+        model_version: Optional[str] = None,
+        output: str = "records",
+        interval: Optional[IntervalSpec] = None,
+    ) -> Dict[str, Any]:
+        model_name, model = self._one_target_plan(target, model_version)
 
         pred_df, expected, last_date, used_start = self.forecast_recursive(
             df_daily=df,
@@ -622,19 +1799,324 @@ class MLService:
             transform_mode=transform_mode,
             transform_scale=transform_scale,
             append_transformed_to_history=append_transformed_to_history,
+            interval=interval,
         )
 
+        debug = self._one_target_debug(
+            target=target, model_name=model_name, last_date=last_date, used_start=used_start, expected=expected,
+            transform_mode=transform_mode, transform_scale=transform_scale,
+            append_transformed_to_history=append_transformed_to_history,
+        )
+        if "interval" in pred_df.attrs:
+            debug["interval"] = pred_df.attrs["interval"]
+        return {"debug": debug, "forecast": self._format_forecast(pred_df, output)}
+
+    def stream_one_target(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        target: str,
+        horizon: int,
+        start_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        clip_negative_to_zero: bool = True,
+        transform_mode: str = "raw",
+        transform_scale: float = 1.0,
+        append_transformed_to_history: bool = True,
+        model_version: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        model_name, model = self._one_target_plan(target, model_version)
+        engine, expected, last_date, used_start = self._recursive_engine(
+            self._as_prepared(df, holiday_mmdd, holiday_window_days),
+            model=model,
+            target_col=target,
+            horizon_days=horizon,
+            start_date=start_date,
+            holiday_mmdd=holiday_mmdd,
+            holiday_window_days=holiday_window_days,
+            hist_days=hist_days,
+        )
+        post = self._forecast_post_fn(transform_mode, transform_scale, clip_negative_to_zero, append_transformed_to_history)
+        debug = self._one_target_debug(
+            target=target, model_name=model_name, last_date=last_date, used_start=used_start, expected=expected,
+            transform_mode=transform_mode, transform_scale=transform_scale,
+            append_transformed_to_history=append_transformed_to_history,
+        )
+        dates = iso_dates(engine.future_dates[0])
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            for step, raw, out in engine.steps(self._forecast_predict_fn(model, expected), post):
+                yield {
+                    "date": dates[step],
+                    "prediction_raw": float(raw[0]),
+                    "prediction": float(out[0]),
+                    "transform_mode": transform_mode,
+                    "transform_scale": float(transform_scale),
+                }
+
+        return debug, rows()
+
+    # ---------------------------
+    # SCENARIO (what-if): nhiều bộ tham số trên cùng 1 dataset, chạy lockstep
+    # ---------------------------
+    def _scenario_starts(
+        self,
+        prepared: PreparedDailyDataset,
+        scenarios: Sequence[ForecastScenario],
+        first_target: ForecastTarget,
+    ) -> List[pd.Timestamp]:
+        # start mặc định như ALL: ngày sau ngày cuối của target đầu tiên, dùng chung cho mọi target
+        first_dates, first_values = prepared.series(first_target.target_col)
+        if len(first_values) == 0:
+            raise ValueError("Dataset rỗng sau khi clean target.")
+        default_start = first_dates.max() + pd.Timedelta(days=1)
+        return [pd.to_datetime(sc.start_date) if sc.start_date else default_start for sc in scenarios]
+
+    def forecast_scenarios(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        scenarios: Sequence[ForecastScenario],
+        targets: Sequence[ForecastTarget],
+        horizon: int,
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        hist_days: int = 365,
+        model_version: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        output: str = "records",
+    ) -> Dict[str, Any]:
+        """
+        What-if: S kịch bản (start_date, holiday, hist_days, transform, clip, append khác nhau) trên 1 dataset.
+        Dataset clean 1 lần; mỗi target 1 engine S dòng (1 dòng / kịch bản) -> mỗi ngày 1 lần predict cho cả S.
+        Kết quả: scenarios {tên: bảng date / pred_{target}_raw / pred_{target}} + summary so sánh.
+        output="frame": 1 DataFrame dạng long có cột scenario (để ghi Arrow/Parquet).
+        """
+        if not scenarios:
+            raise ValueError("scenarios is required")
+        if not targets:
+            raise ValueError("targets is required")
+        names = [sc.name for sc in scenarios]
+        if len(set(names)) != len(names):
+            raise ValueError("Tên scenario bị trùng.")
+
+        prepared = self._as_prepared(df, holiday_mmdd, holiday_window_days)
+        models = {t.name: model_store.get(t.model_name, model_version) for t in targets}
+        starts = self._scenario_starts(prepared, scenarios, targets[0])
+        future = [pd.date_range(st, periods=int(horizon), freq="D") for st in starts]
+        flags = np.stack([
+            holiday_flags(
+                fd,
+                list(sc.holiday_mmdd) if sc.holiday_mmdd is not None else holiday_mmdd,
+                sc.holiday_window_days if sc.holiday_window_days is not None else holiday_window_days,
+            )
+            for sc, fd in zip(scenarios, future)
+        ])
+
+        def run_target(t: ForecastTarget) -> Tuple[List[str], pd.Timestamp, np.ndarray, np.ndarray]:
+            model = models[t.name]
+            expected = self._get_xgb_expected_features(model)
+            if not expected:
+                raise ValueError("Không lấy được expected features từ model.")
+
+            hists: List[np.ndarray] = []
+            last_date = None
+            for sc, st in zip(scenarios, starts):
+                hist, last_date, _ = self._recursive_history(
+                    prepared,
+                    target_col=t.target_col,
+                    start_date=str(st.date()),
+                    hist_days=sc.hist_days if sc.hist_days is not None else hist_days,
+                )
+                hists.append(hist)
+
+            tf = [sc.transform_for(t.name) for sc in scenarios]
+            post = scenario_post_fn(
+                [m for m, _ in tf],
+                [x for _, x in tf],
+                [sc.clip_negative_to_zero for sc in scenarios],
+                [sc.append_transformed_to_history for sc in scenarios],
+            )
+            engine = RecursiveForecastEngine(expected, hists, future, flags)
+            raw_all, out_all = engine.run(self._forecast_predict_fn(model, expected), post)
+            return expected, last_date, raw_all, out_all
+
+        workers = min(len(targets), max_workers or config.ML_FORECAST_TARGET_WORKERS or len(targets))
+        if workers <= 1:
+            results = [run_target(t) for t in targets]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-forecast") as pool:
+                results = list(pool.map(run_target, targets))
+
+        frames: Dict[str, pd.DataFrame] = {}
+        for i, sc in enumerate(scenarios):
+            cols: Dict[str, Any] = {"date": future[i]}
+            for t, (_, _, raw_all, out_all) in zip(targets, results):
+                cols[f"pred_{t.name}_raw"] = raw_all[i]
+                cols[f"pred_{t.name}"] = out_all[i]
+            frames[sc.name] = pd.DataFrame(cols)
+
+        debug: Dict[str, Any] = {
+            "last_date_in_file": str(pd.to_datetime(results[0][1]).date()),
+            "horizon": int(horizon),
+            "n_scenarios": len(scenarios),
+            "targets": [t.name for t in targets],
+        }
+        for t, (exp, _, _, _) in zip(targets, results):
+            debug[f"expected_features_{t.name}"] = exp
+        debug["scenarios"] = [
+            {**asdict(sc), "start_date_used": str(st.date())} for sc, st in zip(scenarios, starts)
+        ]
+        summary = scenario_summary(frames, [t.name for t in targets])
+
+        if output == "frame":
+            long = pd.concat([f.assign(scenario=name) for name, f in frames.items()], ignore_index=True)
+            return {"debug": debug, "forecast": long[["scenario"] + [c for c in long.columns if c != "scenario"]], "summary": summary}
+        return {
+            "debug": debug,
+            "scenarios": {name: self._format_forecast(f, output) for name, f in frames.items()},
+            "summary": summary,
+        }
+
+    # ---------------------------
+    # BACKTEST one-step + chọn transform (port backtest_one_step / eval_transform_candidates của app.py)
+    # ---------------------------
+    def backtest_one_step(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        model: Any,
+        target_col: str,
+        start_date: str,
+        end_date: str,
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        min_hist: int = 28,
+    ) -> pd.DataFrame:
+        """
+        Mỗi ngày d trong [start_date, end_date]: predict 1 bước từ actual trước d.
+        Toàn bộ feature dựng 1 lần (vector hóa) + 1 lần predict; trả date/actual/pred_raw/ratio_actual_over_pred.
+        """
+        prepared = self._as_prepared(df, holiday_mmdd, holiday_window_days)
+        dates, values = prepared.series(target_col)
+
+        expected = self._get_xgb_expected_features(model)
+        if not expected:
+            raise ValueError("Không lấy được expected features từ model.")
+
+        start, end = pd.to_datetime(start_date), pd.to_datetime(end_date)
+        in_range = np.flatnonzero((dates >= start) & (dates <= end))
+        if len(in_range) == 0:
+            raise ValueError("Khoảng backtest không có dữ liệu.")
+
+        pos = in_range[in_range >= int(min_hist)]
+        if len(pos) == 0:
+            raise ValueError("Backtest rỗng (thiếu lịch sử hoặc dữ liệu).")
+
+        test_dates = dates[pos]
+        X = one_step_feature_matrix(
+            expected, values, pos, test_dates, holiday_flags(test_dates, holiday_mmdd, holiday_window_days)
+        )
+        pred_raw = np.asarray(self._forecast_predict_fn(model, expected)(X), dtype=float).reshape(-1)
+        actual = values[pos]
+
+        keep = pred_raw != 0  # ratio NaN -> bị dropna như bản Streamlit
+        if not keep.any():
+            raise ValueError("Backtest rỗng (thiếu lịch sử hoặc dữ liệu).")
+        return pd.DataFrame({
+            "date": test_dates[keep],
+            "actual": actual[keep],
+            "pred_raw": pred_raw[keep],
+            "ratio_actual_over_pred": actual[keep] / pred_raw[keep],
+        })
+
+    def eval_transform_candidates(
+        self,
+        bt: pd.DataFrame,
+        candidates: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> Tuple[pd.DataFrame, float]:
+        """
+        Xếp hạng (mode, scale) theo MAPE; candidates=None -> bộ mặc định như Streamlit.
+        scale="median" trong candidate -> thay bằng median(actual / pred_raw).
+        """
+        med = median_ratio(bt["actual"].to_numpy(), bt["pred_raw"].to_numpy())
+        if candidates is None:
+            cands = default_transform_candidates(med)
+        else:
+            cands = [
+                {"mode": c.get("mode", "raw"), "scale": med if c.get("scale") == "median" else float(c.get("scale", 1.0))}
+                for c in candidates
+            ]
+        ranking = rank_transform_candidates(bt["actual"].to_numpy(), bt["pred_raw"].to_numpy(), cands)
+        return ranking, med
+
+    def backtest_targets(
+        self,
+        df: pd.DataFrame | PreparedDailyDataset,
+        *,
+        targets: Sequence[ForecastTarget],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        holiday_mmdd: List[str],
+        holiday_window_days: int,
+        bt_days: int = 60,
+        min_hist: int = 28,
+        candidates: Optional[Sequence[Dict[str, Any]]] = None,
+        include_rows: bool = False,
+        model_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Auto-calibrate transform cho từng target (như nút "Auto-calibrate" của Streamlit):
+        mặc định end = ngày cuối trong file, start = end - bt_days.
+        """
+        if not targets:
+            raise ValueError("targets is required")
+        prepared = self._as_prepared(df, holiday_mmdd, holiday_window_days)
+        if len(prepared) == 0:
+            raise ValueError("Dataset rỗng.")
+
+        end_bt = pd.to_datetime(end_date) if end_date else prepared.dates.max()
+        start_bt = pd.to_datetime(start_date) if start_date else (end_bt - pd.Timedelta(days=int(bt_days)))
+
+        results: Dict[str, Any] = {}
+        suggested: Dict[str, Any] = {}
+        for t in targets:
+            model = model_store.get(t.model_name, model_version)
+            bt = self.backtest_one_step(
+                prepared,
+                model=model,
+                target_col=t.target_col,
+                start_date=str(start_bt.date()),
+                end_date=str(end_bt.date()),
+                holiday_mmdd=holiday_mmdd,
+                holiday_window_days=holiday_window_days,
+                min_hist=min_hist,
+            )
+            ranking, med = self.eval_transform_candidates(bt, candidates)
+            best = ranking.iloc[0]
+            item: Dict[str, Any] = {
+                "target": t.target_col,
+                "model": t.model_name,
+                "n_days": int(len(bt)),
+                "median_ratio": float(med),
+                "best": {"mode": str(best["mode"]), "scale": float(best["scale"])},
+                "ranking": finite_records(ranking),
+            }
+            if include_rows:
+                item["rows"] = bt.to_dict(orient="records")
+            results[t.name] = item
+            suggested[f"{t.name}_transform_mode"] = str(best["mode"])
+            suggested[f"{t.name}_transform_scale"] = float(best["scale"])
+
         debug = {
-            "target": target,
-            "model": model_name,
-            "last_date_in_file": str(pd.to_datetime(last_date).date()),
-            "start_date_used": str(pd.to_datetime(used_start).date()),
-            "expected_features": expected,
-            "transform_mode": transform_mode,
-            "transform_scale": float(transform_scale),
-            "append_transformed_to_history": bool(append_transformed_to_history),
+            "backtest_start": str(start_bt.date()),
+            "backtest_end": str(end_bt.date()),
+            "min_hist": int(min_hist),
+            "n_candidates": len(candidates if candidates is not None else default_transform_candidates(1.0)),
         }
-        return {"debug": debug, "forecast": pred_df.to_dict(orient="records")}
+        return {"debug": debug, "targets": results, "suggested": suggested}
 
     # ---------------------------
     # DAILY REVENUE (1 ngày) — để debug nhanh giống Streamlit
@@ -1,19 +1,106 @@
 # app/services/model_store.py
 from __future__ import annotations
 
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import joblib
+import numpy as np
 from app import config
 
 
+def estimate_nbytes(obj: Any, path: Optional[Path] = None, _max_depth: int = 6) -> int:
+    """
+    Ước lượng bộ nhớ của 1 artifact: tổng nbytes các ndarray bên trong (duyệt __dict__/list/dict),
+    lấy max với kích thước file (model lưu dạng string/bytes như LightGBM/XGBoost không có ndarray).
+    """
+    seen: set = set()
+
+    def walk(o: Any, depth: int) -> int:
+        if id(o) in seen or depth > _max_depth:
+            return 0
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            if o.dtype == object:
+                return int(o.nbytes) + sum(walk(v, depth + 1) for v in o.ravel())
+            return int(o.nbytes)
+        if isinstance(o, (bytes, bytearray, str)):
+            return sys.getsizeof(o)
+        if isinstance(o, dict):
+            return sum(walk(v, depth + 1) for v in o.values())
+        if isinstance(o, (list, tuple, set)):
+            return sum(walk(v, depth + 1) for v in o)
+        d = getattr(o, "__dict__", None)
+        if isinstance(d, dict):
+            return sum(walk(v, depth + 1) for v in d.values())
+        return 0
+
+    total = walk(obj, 0)
+    if path is not None:
+        try:
+            total = max(total, int(Path(path).stat().st_size))
+        except OSError:
+            pass
+    return total
+
+
+def _count_memmaps(obj: Any, _max_depth: int = 8) -> int:
+    seen: set = set()
+
+    def walk(o: Any, depth: int) -> int:
+        if id(o) in seen or depth > _max_depth:
+            return 0
+        seen.add(id(o))
+        if isinstance(o, np.memmap):
+            return 1
+        if isinstance(o, np.ndarray):
+            return sum(walk(v, depth + 1) for v in o.ravel()) if o.dtype == object else 0
+        if isinstance(o, dict):
+            return sum(walk(v, depth + 1) for v in o.values())
+        if isinstance(o, (list, tuple)):
+            return sum(walk(v, depth + 1) for v in o)
+        d = getattr(o, "__dict__", None)
+        return sum(walk(v, depth + 1) for v in d.values()) if isinstance(d, dict) else 0
+
+    return walk(obj, 0)
+
+
+class _InFlightLoad:
+    """1 lần load đang chạy cho 1 cache key; các caller khác chờ event."""
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _LoadFailure:
+    def __init__(self, error: BaseException, failures: int, retry_at: float):
+        self.error = error
+        self.failures = failures
+        self.retry_at = retry_at
+
+
 class ModelStore:
     """
     Quản lý load/cached các model ML từ thư mục MODEL_DIR.
     - Hỗ trợ cả .joblib và .pkl (joblib.load thường load được cả sklearn pickle)
     - Hỗ trợ alias: tên logic -> tên file thực tế
     - Hỗ trợ version: __{version} trước đuôi file
+    - Load single-flight theo (name, version): nhiều thread/request miss cùng lúc chỉ load 1 lần,
+      lỗi load được cache và chỉ thử lại sau backoff (tăng dần theo số lần lỗi); bảng lỗi giới hạn
+      MODEL_LOAD_FAILURE_MAX key, key hết backoff quá retry_max_secs bị dọn (đếm lại từ đầu)
+    - Cache LRU theo ngân sách bộ nhớ (MODEL_CACHE_BUDGET_MB, 0 = không giới hạn);
+      version mặc định luôn được pin, chỉ evict các version phụ (A/B) ít dùng nhất
+    - Artifact mmap (MODEL_MMAP_DIR, tạo bằng `python -m app.services.model_store convert-mmap`):
+      bản re-dump không nén, load với mmap_mode="r" -> ndarray trong model nằm ở page cache,
+      nhiều worker dùng chung thay vì mỗi worker 1 bản copy
     """
 
     def __init__(self, base_dir: Optional[Path] = None):
@@ -23,7 +110,26 @@ class ModelStore:
             model_dir = getattr(config, "MODEL_DIR", None)
             self.base_dir = Path(model_dir) if model_dir is not None else Path("models").resolve()
 
-        self._cache: Dict[str, Any] = {}
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._paths: Dict[str, Path] = {}  # file thực tế đã load (bản gốc hoặc bản mmap)
+        self._sizes: Dict[str, int] = {}
+        self._identities: Dict[str, str] = {}  # artifact của object đang cache (xem identity())
+        self.budget_bytes = int(float(getattr(config, "MODEL_CACHE_BUDGET_MB", 0)) * 1024 * 1024)
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+        # Object dẫn xuất từ model đã load (encoder, fill plan, ...) theo (cache key, tag)
+        self._derived: Dict[Tuple[str, str], Any] = {}
+
+        self._lock = threading.Lock()
+        self._loading: Dict[str, _InFlightLoad] = {}
+        self._failures: "OrderedDict[str, _LoadFailure]" = OrderedDict()
+        self.retry_base_secs = float(getattr(config, "MODEL_LOAD_RETRY_BASE_SECS", 1.0))
+        self.retry_max_secs = float(getattr(config, "MODEL_LOAD_RETRY_MAX_SECS", 60.0))
+        self.max_failures = max(1, int(getattr(config, "MODEL_LOAD_FAILURE_MAX", 256)))
+
+        # Trạng thái warm-up theo tên logic (giống load_models_safe của Streamlit)
+        self._warmup: Dict[str, Dict[str, Any]] = {}
+        self._warmup_state = "idle"  # idle | running | done
+        self._warmup_total_secs: Optional[float] = None
 
         # Alias map: key dùng trong code -> filename thực tế trong /models
         self.alias: Dict[str, str] = {
@@ -81,6 +187,76 @@ class ModelStore:
         tried = ", ".join(str(x) for x in candidates)
         raise FileNotFoundError(f"Model file not found for name='{name}', version='{version}'. Tried: {tried}")
 
+    def _mmap_dir(self) -> Path:
+        mmap_dir = getattr(config, "MODEL_MMAP_DIR", None)
+        return Path(mmap_dir) if mmap_dir else self.base_dir / "mmap"
+
+    def _mmap_path(self, path: Path) -> Path:
+        return self._mmap_dir() / path.name
+
+    def _load_artifact(self, path: Path) -> Tuple[Any, Path]:
+        """
+        Ưu tiên bản mmap (nếu bật và không cũ hơn file gốc), ngược lại joblib.load bình thường.
+        """
+        if getattr(config, "MODEL_MMAP_ENABLED", True):
+            mpath = self._mmap_path(path)
+            try:
+                if mpath.exists() and mpath.stat().st_mtime >= path.stat().st_mtime:
+                    return joblib.load(mpath, mmap_mode="r"), mpath
+            except OSError:
+                pass
+        return joblib.load(path), path
+
+    def convert_to_mmap(self, names: Optional[Iterable[str]] = None, *, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Re-dump artifact (.pkl/.joblib) sang dạng joblib không nén trong MODEL_MMAP_DIR để load được với mmap_mode.
+        names=None -> mọi file .pkl/.joblib trong base_dir (kể cả file có __version).
+        """
+        if names is None:
+            sources = sorted(p for p in self.base_dir.iterdir() if p.suffix in (".pkl", ".joblib") and p.is_file())
+        else:
+            sources = [self._resolve_filename(n) for n in names]
+
+        out_dir = self._mmap_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        report: Dict[str, Dict[str, Any]] = {}
+        for src in sources:
+            dst = self._mmap_path(src)
+            if not force and dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+                report[src.name] = {"status": "up_to_date", "path": str(dst)}
+                continue
+            try:
+                obj = joblib.load(src)
+                tmp = dst.with_name(dst.name + ".tmp")
+                joblib.dump(obj, tmp)  # không nén -> ndarray được mmap khi load
+                tmp.replace(dst)
+                check = joblib.load(dst, mmap_mode="r")
+                report[src.name] = {
+                    "status": "converted",
+                    "path": str(dst),
+                    "size_bytes": dst.stat().st_size,
+                    "mmap_arrays": _count_memmaps(check),
+                }
+            except Exception as e:
+                report[src.name] = {"status": "failed", "err": str(e)}
+        return report
+
+    def identity(self, name: str, version: Optional[str] = None) -> str:
+        """
+        Định danh của model đang nằm trong cache cho (name, version) (load nếu chưa có):
+        file + mtime + size của artifact chụp lúc load. Dùng làm 1 phần cache key của kết quả predict:
+        model được reload từ file mới (hot-swap / sau evict / clear_cache) -> key đổi, còn file bị thay
+        nhưng model cũ chưa reload -> key vẫn là của model cũ đang dùng.
+        """
+        key = self._cache_key(name, version)
+        while True:
+            self.get(name, version)
+            with self._lock:
+                ident = self._identities.get(key)
+            if ident is not None:  # None: vừa bị evict giữa get() và lúc đọc -> load lại
+                return f"{key}@{ident}"
+
     def safe_get(self, name: str, version: Optional[str] = None) -> Tuple[Optional[Any], Optional[str]]:
         """
         Load an toàn: trả (obj, err_string). Không raise.
@@ -91,30 +267,235 @@ class ModelStore:
         except Exception as e:
             return None, str(e)
 
+    def _cache_key(self, name: str, version: Optional[str] = None) -> str:
+        return f"{name}:{version or 'default'}"
+
     def get(self, name: str, version: Optional[str] = None) -> Any:
         """
         Lấy model từ cache, nếu chưa có thì load từ file.
         Cache key theo (name, version).
         """
-        key = f"{name}:{version or 'default'}"
-        if key in self._cache:
-            return self._cache[key]
+        key = self._cache_key(name, version)
+        with self._lock:
+            if key in self._cache:
+                self._counters["hits"] += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
 
-        path = self._resolve_filename(name, version)
-        obj = joblib.load(path)
-        self._cache[key] = obj
+            failure = self._failures.get(key)
+            if failure is not None and time.monotonic() < failure.retry_at:
+                raise failure.error
+
+            inflight = self._loading.get(key)
+            owner = inflight is None
+            if owner:
+                self._counters["misses"] += 1
+                inflight = _InFlightLoad()
+                self._loading[key] = inflight
+
+        if not owner:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+
+        try:
+            path = self._resolve_filename(name, version)
+            obj, path = self._load_artifact(path)
+        except BaseException as e:
+            with self._lock:
+                prev = self._failures.get(key)
+                failures = (prev.failures if prev else 0) + 1
+                backoff = min(self.retry_base_secs * (2 ** (failures - 1)), self.retry_max_secs)
+                now = time.monotonic()
+                self._failures[key] = _LoadFailure(e, failures, now + backoff)
+                self._failures.move_to_end(key)
+                self._prune_failures_locked(now)
+                self._loading.pop(key, None)
+            inflight.error = e
+            inflight.event.set()
+            raise
+
+        size = estimate_nbytes(obj, path)
+        st = path.stat()
+        with self._lock:
+            self._cache[key] = obj
+            self._sizes[key] = size
+            self._paths[key] = path
+            self._identities[key] = f"{path.name}:{st.st_mtime_ns}:{st.st_size}"
+            self._failures.pop(key, None)
+            self._loading.pop(key, None)
+            self._evict_over_budget(keep=key)
+        inflight.result = obj
+        inflight.event.set()
         return obj
 
+    def _prune_failures_locked(self, now: float) -> None:
+        """Bỏ lỗi đã hết backoff quá retry_max_secs, rồi bỏ key cũ nhất tới khi <= max_failures. Gọi khi đang giữ lock."""
+        for key in [k for k, f in self._failures.items() if now >= f.retry_at + self.retry_max_secs]:
+            self._failures.pop(key, None)
+        while len(self._failures) > self.max_failures:
+            self._failures.popitem(last=False)
+
+    def _is_pinned(self, key: str) -> bool:
+        return key.endswith(":default")
+
+    def _drop_locked(self, key: str) -> None:
+        self._cache.pop(key, None)
+        self._sizes.pop(key, None)
+        self._paths.pop(key, None)
+        self._identities.pop(key, None)
+        for dk in [dk for dk in self._derived if dk[0] == key]:
+            self._derived.pop(dk, None)
+
+    def _evict_over_budget(self, keep: Optional[str] = None) -> None:
+        """Evict LRU (bỏ qua key pin + key vừa load) tới khi tổng size <= budget. Gọi khi đang giữ lock."""
+        if self.budget_bytes <= 0:
+            return
+        total = sum(self._sizes.values())
+        for key in list(self._cache.keys()):
+            if total <= self.budget_bytes:
+                break
+            if key == keep or self._is_pinned(key):
+                continue
+            total -= self._sizes.get(key, 0)
+            self._drop_locked(key)
+            self._counters["evictions"] += 1
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._cache),
+                "bytes": sum(self._sizes.values()),
+                "budget_bytes": self.budget_bytes,
+                "lru_order": list(self._cache.keys()),
+                "load_failures": len(self._failures),
+            }
+
+    async def aget(self, name: str, version: Optional[str] = None) -> Any:
+        """
+        Bản async của get(): cache hit trả ngay, miss thì load/chờ load trong thread
+        để không block event loop.
+        """
+        key = self._cache_key(name, version)
+        if key in self._cache:
+            return self.get(name, version)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, name, version)
+
+    def get_derived(
+        self,
+        name: str,
+        version: Optional[str],
+        tag: str,
+        builder: Callable[[Any], Any],
+    ) -> Any:
+        """
+        Lấy object dẫn xuất từ model (vd: encoder build từ feature_columns).
+        builder(obj) chỉ chạy 1 lần cho mỗi (name, version, tag); bị xóa cùng model khi clear_cache.
+        """
+        key = self._cache_key(name, version)
+        dkey = (key, tag)
+        with self._lock:
+            if dkey in self._derived and key in self._cache:
+                self._cache.move_to_end(key)
+                return self._derived[dkey]
+
+        obj = self.get(name, version)
+        derived = builder(obj)
+        with self._lock:
+            if key not in self._cache:
+                # model vừa bị evict -> không giữ object dẫn xuất mồ côi
+                return derived
+            # 2 thread cùng build -> giữ bản đầu tiên
+            return self._derived.setdefault(dkey, derived)
+
+    def warmup(
+        self,
+        names: Optional[Iterable[str]] = None,
+        *,
+        max_workers: int = 4,
+        warm_fn: Optional[Callable[[str, Any], None]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Load song song các model (mặc định: toàn bộ alias) bằng thread pool.
+        warm_fn(name, obj) (nếu có) chạy 1 predict giả để warm allocation / lazy init.
+        Không raise: model lỗi/thiếu file được ghi vào report, service vẫn chạy.
+        """
+        names = list(names) if names is not None else list(self.alias.keys())
+        with self._lock:
+            self._warmup_state = "running"
+            for n in names:
+                self._warmup[n] = {"file": self.alias.get(n), "status": "pending"}
+
+        def load_one(name: str) -> None:
+            info: Dict[str, Any] = {"file": self.alias.get(name), "status": "loading"}
+            self._warmup[name] = info
+            try:
+                path = self._resolve_filename(name)
+            except FileNotFoundError as e:
+                info.update(status="missing", ok=False, err=str(e))
+                return
+
+            t0 = time.perf_counter()
+            obj, err = self.safe_get(name)
+            loaded_path = self._paths.get(self._cache_key(name), path)
+            info["path"] = str(loaded_path)
+            info["mmap"] = loaded_path != path
+            info["load_secs"] = round(time.perf_counter() - t0, 4)
+            if err is not None:
+                info.update(status="failed", ok=False, err=err)
+                return
+
+            info.update(status="loaded", ok=True, err=None, type=str(type(obj)), size_bytes=estimate_nbytes(obj, loaded_path))
+            if warm_fn is not None:
+                t1 = time.perf_counter()
+                try:
+                    warm_fn(name, obj)
+                    info["warm"] = "ok"
+                except Exception as e:
+                    info["warm"] = f"error: {e}"
+                info["warm_secs"] = round(time.perf_counter() - t1, 4)
+
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="model-warmup") as pool:
+            list(pool.map(load_one, names))
+
+        with self._lock:
+            self._warmup_state = "done"
+            self._warmup_total_secs = round(time.perf_counter() - t_start, 4)
+        return self.warmup_report()["models"]
+
+    def warmup_report(self) -> Dict[str, Any]:
+        models = {k: dict(v) for k, v in self._warmup.items()}
+        failed: List[str] = [k for k, v in models.items() if v.get("status") == "failed"]
+        return {
+            "state": self._warmup_state,
+            "ready": self._warmup_state == "done" and not failed,
+            "failed": failed,
+            "total_secs": self._warmup_total_secs,
+            "models": models,
+        }
+
     def clear_cache(self, name: Optional[str] = None) -> None:
         """
         Xóa cache 1 model hoặc toàn bộ cache.
         """
-        if name is None:
-            self._cache.clear()
-            return
-        keys_to_del = [k for k in list(self._cache.keys()) if k.startswith(name + ":")]
-        for k in keys_to_del:
-            self._cache.pop(k, None)
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+                self._sizes.clear()
+                self._paths.clear()
+                self._identities.clear()
+                self._derived.clear()
+                self._failures.clear()
+                return
+            keys_to_del = [k for k in list(self._cache.keys()) if k.startswith(name + ":")]
+            for k in keys_to_del:
+                self._drop_locked(k)
+            for fk in [fk for fk in list(self._failures.keys()) if fk.startswith(name + ":")]:
+                self._failures.pop(fk, None)
 
 
 _model_store: ModelStore | None = None
@@ -128,3 +509,19 @@ def get_model_store() -> ModelStore:
 
 
 model_store = get_model_store()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="ModelStore tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert-mmap", help="Re-dump .pkl/.joblib sang layout mmap (MODEL_MMAP_DIR)")
+    conv.add_argument("names", nargs="*", help="Tên model/alias; bỏ trống = toàn bộ file trong MODEL_DIR")
+    conv.add_argument("--force", action="store_true", help="Convert lại kể cả khi bản mmap còn mới")
+    args = parser.parse_args()
+
+    if args.cmd == "convert-mmap":
+        result = model_store.convert_to_mmap(args.names or None, force=args.force)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
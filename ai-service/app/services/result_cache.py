@@ -0,0 +1,135 @@
+# app/services/result_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import joblib
+
+from app import config
+
+
+def content_key(namespace: str, content: bytes, params: Dict[str, Any], models: Iterable[str] = ()) -> str:
+    """
+    Key theo nội dung: sha256(namespace + bytes file + params đã chuẩn hoá + định danh model).
+    params được dump JSON sort_keys -> cùng tham số (khác thứ tự) ra cùng key.
+    """
+    h = hashlib.sha256()
+    h.update(namespace.encode("utf-8"))
+    h.update(b"\0")
+    h.update(hashlib.sha256(content).digest())
+    h.update(json.dumps(params, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8"))
+    for m in models:
+        h.update(b"\0")
+        h.update(str(m).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache kết quả (payload JSON-able) theo content key:
+    - tầng RAM: OrderedDict LRU tối đa `max_entries`, mỗi entry hết hạn sau `ttl_secs`
+    - tầng disk (tuỳ chọn, `disk_dir`): `<dir>/<key[:2]>/<key>.joblib`, hit ở disk được đưa lại lên RAM
+    get() trả (payload, tier) với tier = "memory" | "disk", hoặc None khi miss.
+    """
+
+    def __init__(self, *, max_entries: int = 128, ttl_secs: float = 600.0, disk_dir: Optional[str] = None, enabled: bool = True):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_secs = float(ttl_secs)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.enabled = bool(enabled)
+
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "sets": 0, "expired": 0, "evictions": 0}
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return (self.disk_dir / key[:2] / f"{key}.joblib") if self.disk_dir else None
+
+    def _remember_locked(self, key: str, expires_at: float, value: Any) -> None:
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Tuple[Any, str]]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._mem.move_to_end(key)
+                    self._counters["hits_memory"] += 1
+                    return item[1], "memory"
+                self._mem.pop(key, None)
+                self._counters["expired"] += 1
+
+        path = self._disk_path(key)
+        if path is not None and path.exists():
+            try:
+                data = joblib.load(path)
+            except Exception:
+                data = None
+            if data is not None and data.get("expires_at", 0) > now:
+                with self._lock:
+                    self._remember_locked(key, data["expires_at"], data["value"])
+                    self._counters["hits_disk"] += 1
+                return data["value"], "disk"
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            if data is not None:
+                with self._lock:
+                    self._counters["expired"] += 1
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_secs
+        with self._lock:
+            self._remember_locked(key, expires_at, value)
+            self._counters["sets"] += 1
+
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            joblib.dump({"expires_at": expires_at, "value": value}, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # disk chỉ là tầng phụ: lỗi ghi không làm hỏng request
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "enabled": self.enabled,
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "ttl_secs": self.ttl_secs,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+
+forecast_cache = ResultCache(
+    max_entries=config.FORECAST_CACHE_MAX_ENTRIES,
+    ttl_secs=config.FORECAST_CACHE_TTL_SECS,
+    disk_dir=config.FORECAST_CACHE_DIR or None,
+    enabled=config.FORECAST_CACHE_ENABLED,
+)
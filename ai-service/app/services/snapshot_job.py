@@ -0,0 +1,404 @@
+# app/services/snapshot_job.py
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services.bulk_input import iter_frames
+
+# ---------- Optional Parquet ----------
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _PARQUET_AVAILABLE = True
+except Exception:
+    pa = None
+    pq = None
+    _PARQUET_AVAILABLE = False
+
+# parquet : 1 file Parquet, mỗi khúc 1 row group (cần pyarrow)
+# ndjson  : 1 object JSON / khách
+SNAPSHOT_OUTPUT_FORMATS = ("parquet", "ndjson")
+SNAPSHOT_EXTENSIONS = {"parquet": ".parquet", "ndjson": ".ndjson"}
+
+_JOB_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# run_chunk(chunk, pool=..., **options) -> (frame snapshot, thời gian giây / model) (MLService.snapshot_chunk)
+ChunkFn = Callable[..., Tuple[pd.DataFrame, Dict[str, float]]]
+
+
+class SnapshotJobNotFound(KeyError):
+    """Không có snapshot job với id này."""
+
+
+class SnapshotOutputUnavailable(RuntimeError):
+    """Format output cần thư viện tuỳ chọn chưa cài (pyarrow)."""
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def normalize_snapshot_format(fmt: Optional[str]) -> str:
+    f = (fmt or "parquet").strip().lower()
+    if f == "jsonl":
+        f = "ndjson"
+    if f not in SNAPSHOT_OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(SNAPSHOT_OUTPUT_FORMATS)}")
+    if f == "parquet" and not _PARQUET_AVAILABLE:
+        raise SnapshotOutputUnavailable("output_format=parquet cần pyarrow (pip install pyarrow)")
+    return f
+
+
+class _SnapshotWriter:
+    """Ghi dần từng khúc snapshot ra file tạm; parquet lấy schema từ khúc đầu (khúc sau cast theo schema đó)."""
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self._pq_writer = None
+        self._fh = open(path, "wb") if fmt == "ndjson" else None
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.fmt == "ndjson":
+            if len(frame):
+                self._fh.write(frame.to_json(orient="records", lines=True, date_format="iso", double_precision=15).rstrip("\n").encode("utf-8"))
+                self._fh.write(b"\n")
+            return
+        if self._pq_writer is None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self._pq_writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(frame, schema=self._pq_writer.schema, preserve_index=False)
+        self._pq_writer.write_table(table)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+        elif self.fmt == "parquet" and not self.path.exists():
+            # input rỗng -> vẫn ra file Parquet hợp lệ (0 dòng)
+            pq.write_table(pa.table({}), self.path)
+
+
+class SnapshotJob:
+    """
+    1 lượt snapshot: đọc bảng feature khách theo khúc, chấm churn/segment/CLV, ghi 1 file kết quả.
+    state: queued -> running -> done | failed | cancelled.
+    timings: tổng giây theo giai đoạn (read, churn, segment, clv = thời gian từng model; score = thời gian thực
+    của bước chấm khi các model chạy song song; write).
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        *,
+        input_path: Path,
+        input_format: str,
+        output_path: Path,
+        output_format: str,
+        chunk_size: int,
+        options: Dict[str, Any],
+    ):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.input_format = input_format
+        self.output_path = output_path
+        self.output_format = output_format
+        self.chunk_size = int(chunk_size)
+        self.options = options
+
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.rows = 0
+        self.chunks = 0
+        self.total_rows: Optional[int] = None  # parquet: biết trước từ metadata
+        self.progress = 0.0
+        self.timings: Dict[str, float] = {"read": 0.0, "score": 0.0, "write": 0.0}
+        self.segment_counts: Dict[str, int] = {}
+        self.tiers: Dict[str, int] = {}
+        self.cancel_requested = False
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = self.elapsed()
+        rate = (self.rows / elapsed) if elapsed and self.rows else None
+        eta = None
+        if self.state == "running" and elapsed and 0.0 < self.progress < 1.0:
+            eta = elapsed * (1.0 - self.progress) / self.progress
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "error": self.error,
+            "input_format": self.input_format,
+            "output_format": self.output_format,
+            "chunk_size": self.chunk_size,
+            "models": list(self.options.get("models") or []),
+            "clv_horizons": list(self.options.get("clv_horizons") or []) if "clv" in (self.options.get("models") or []) else [],
+            "progress": {
+                "rows": self.rows,
+                "chunks": self.chunks,
+                "total_rows": self.total_rows,
+                "fraction": round(self.progress, 4),
+                "rows_per_sec": round(rate, 1) if rate else None,
+                "eta_secs": round(eta, 2) if eta is not None else None,
+            },
+            "timings": {k: round(v, 4) for k, v in self.timings.items()},
+            "elapsed_secs": round(elapsed, 4) if elapsed is not None else None,
+            "risk_tiers": dict(self.tiers),
+            "segment_counts": dict(self.segment_counts),
+            "output_bytes": self.output_path.stat().st_size if self.state == "done" and self.output_path.exists() else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class SnapshotJobStore:
+    """
+    Chạy snapshot job nền:
+    - input upload được copy xuống `out_dir/<id>.input` rồi đọc theo khúc (bulk_input.iter_frames) -> RAM chỉ giữ 1 khúc
+    - mỗi khúc: run_chunk chạy các model song song trên pool `model_workers` thread, ghi nối vào file tạm,
+      xong mới os.replace sang `out_dir/<id>.parquet|.ndjson` (client không bao giờ tải file dở)
+    - tối đa `max_jobs` job chạy cùng lúc (còn lại xếp hàng); giữ `history` job gần nhất để tra cứu
+    """
+
+    def __init__(
+        self,
+        *,
+        run_chunk: ChunkFn,
+        out_dir: Optional[str] = None,
+        max_jobs: int = 1,
+        model_workers: int = 3,
+        history: int = 50,
+    ):
+        self._run_chunk = run_chunk
+        self.out_dir = Path(out_dir) if out_dir else Path(tempfile.gettempdir()) / "ai-snapshots"
+        self.max_jobs = max(1, int(max_jobs))
+        self.model_workers = max(1, int(model_workers))
+        self.history = max(1, int(history))
+        self._jobs: "OrderedDict[str, SnapshotJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="ml-snapshot")
+            return self._pool
+
+    def submit(
+        self,
+        fileobj: BinaryIO,
+        *,
+        input_format: str,
+        output_format: str = "parquet",
+        chunk_size: int = 20000,
+        job_id: Optional[str] = None,
+        **options: Any,
+    ) -> SnapshotJob:
+        """Copy input xuống disk rồi xếp job vào hàng đợi; options chuyển thẳng cho run_chunk (models, clv_horizons...)."""
+        jid = job_id or uuid.uuid4().hex
+        if not _JOB_ID_RE.match(jid):
+            raise ValueError("job_id chỉ gồm chữ, số, '_' hoặc '-' (tối đa 64 ký tự).")
+        if int(chunk_size) <= 0:
+            raise ValueError("chunk_size must be > 0")
+        out_fmt = normalize_snapshot_format(output_format)
+        with self._lock:
+            if jid in self._jobs:
+                raise ValueError(f"Snapshot job already exists: {jid}")
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        input_path = self.out_dir / f"{jid}.input"
+        with open(input_path, "wb") as f:
+            while True:
+                buf = fileobj.read(1 << 20)
+                if not buf:
+                    break
+                f.write(buf)
+
+        job = SnapshotJob(
+            jid,
+            input_path=input_path,
+            input_format=input_format,
+            output_path=self.out_dir / f"{jid}{SNAPSHOT_EXTENSIONS[out_fmt]}",
+            output_format=out_fmt,
+            chunk_size=chunk_size,
+            options=options,
+        )
+        self._remember(job)
+        self._executor().submit(self._run, job)
+        return job
+
+    def _remember(self, job: SnapshotJob) -> None:
+        evicted: List[SnapshotJob] = []
+        with self._lock:
+            self._jobs[job.job_id] = job
+            # chỉ đẩy job đã xong ra khỏi lịch sử (job đang chạy/chờ luôn giữ lại)
+            for jid in list(self._jobs):
+                if len(self._jobs) <= self.history:
+                    break
+                if self._jobs[jid].finished:
+                    evicted.append(self._jobs.pop(jid))
+        for old in evicted:
+            self._remove_files(old)
+
+    def _remove_files(self, job: SnapshotJob) -> None:
+        for p in (job.input_path, job.output_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _count_rows(self, job: SnapshotJob) -> Optional[int]:
+        if job.input_format == "parquet" and _PARQUET_AVAILABLE:
+            return int(pq.ParquetFile(job.input_path).metadata.num_rows)
+        return None
+
+    def _run(self, job: SnapshotJob) -> None:
+        if job.cancel_requested:
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            self._remove_files(job)
+            return
+        job.state = "running"
+        job.started_at = time.time()
+        tmp = job.output_path.with_suffix(f"{job.output_path.suffix}.tmp{os.getpid()}")
+        writer: Optional[_SnapshotWriter] = None
+        try:
+            job.total_rows = self._count_rows(job)
+            input_size = max(1, job.input_path.stat().st_size)
+            writer = _SnapshotWriter(tmp, job.output_format)
+            with open(job.input_path, "rb") as f, ThreadPoolExecutor(
+                max_workers=self.model_workers, thread_name_prefix="ml-snapshot-model"
+            ) as pool:
+                frames = iter_frames(f, job.input_format, job.chunk_size)
+                try:
+                    while True:
+                        t0 = time.perf_counter()
+                        chunk = next(frames, None)
+                        job.timings["read"] += time.perf_counter() - t0
+                        if chunk is None:
+                            break
+                        if job.cancel_requested:
+                            raise _Cancelled()
+                        if len(chunk) == 0:
+                            continue
+
+                        t0 = time.perf_counter()
+                        frame, timings = self._run_chunk(chunk, pool=pool, **job.options)
+                        job.timings["score"] += time.perf_counter() - t0
+                        for name, secs in timings.items():
+                            job.timings[name] = job.timings.get(name, 0.0) + secs
+
+                        t0 = time.perf_counter()
+                        writer.write(frame)
+                        job.timings["write"] += time.perf_counter() - t0
+
+                        self._tally(job, frame)
+                        job.rows += len(chunk)
+                        job.chunks += 1
+                        if job.total_rows:
+                            job.progress = min(1.0, job.rows / job.total_rows)
+                        else:
+                            # csv/ndjson: ước lượng theo số byte đã đọc
+                            job.progress = min(0.99, f.tell() / input_size)
+                finally:
+                    frames.close()
+            if job.cancel_requested:
+                # huỷ trong lúc chấm khúc cuối -> không publish file kết quả
+                raise _Cancelled()
+            writer.close()
+            writer = None
+            os.replace(tmp, job.output_path)
+            job.progress = 1.0
+            job.state = "done"
+        except _Cancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+            if tmp.exists():
+                tmp.unlink()
+            try:
+                job.input_path.unlink()
+            except FileNotFoundError:
+                pass
+            job.finished_at = time.time()
+
+    def _tally(self, job: SnapshotJob, frame: pd.DataFrame) -> None:
+        if "risk_tier" in frame.columns:
+            for k, n in frame["risk_tier"].value_counts().items():
+                job.tiers[str(k)] = job.tiers.get(str(k), 0) + int(n)
+        if "segment_name" in frame.columns:
+            for k, n in frame["segment_name"].value_counts().items():
+                job.segment_counts[str(k)] = job.segment_counts.get(str(k), 0) + int(n)
+
+    def get(self, job_id: str) -> SnapshotJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise SnapshotJobNotFound(job_id)
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.summary() for j in reversed(jobs)]
+
+    def delete(self, job_id: str) -> bool:
+        """Job đang chạy/chờ -> huỷ (dừng trước khúc kế tiếp); job đã xong -> xoá khỏi lịch sử + xoá file."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job.finished:
+                self._jobs.pop(job_id)
+        job.cancel_requested = True
+        if job.finished:
+            self._remove_files(job)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states: Dict[str, int] = {}
+            for j in self._jobs.values():
+                states[j.state] = states.get(j.state, 0) + 1
+        return {
+            "jobs": states,
+            "max_jobs": self.max_jobs,
+            "model_workers": self.model_workers,
+            "history": self.history,
+            "out_dir": str(self.out_dir),
+            "parquet_available": _PARQUET_AVAILABLE,
+        }
+
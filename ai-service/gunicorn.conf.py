@@ -0,0 +1,75 @@
+# ai-service/gunicorn.conf.py
+# Production entry point (multi-worker, preload model trước khi fork):
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# - Master import app + load toàn bộ model alias (ModelStore) rồi mới fork worker
+#   -> các worker dùng chung bộ nhớ model theo copy-on-write, không phải load lại.
+# - Số worker / số thread inference mỗi worker tính theo số core khả dụng (override bằng env).
+# - Restart mềm: `kill -HUP <master>` thay worker lần lượt; TERM -> drain request đang chạy
+#   trong GUNICORN_GRACEFUL_TIMEOUT giây rồi mới dừng. INT/QUIT (Ctrl+C) là quick shutdown của gunicorn:
+#   worker dừng ngay, request đang chạy KHÔNG được drain.
+from __future__ import annotations
+
+import gc
+import os
+
+
+def _available_cpus() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+_cpus = _available_cpus()
+
+# Worker: mặc định 1 worker / 2 core (inference cần thread riêng), tối thiểu 1
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or max(1, _cpus // 2)
+
+# Thread inference / worker: chia đều core còn lại cho mỗi worker
+_threads_per_worker = max(1, _cpus // workers)
+os.environ.setdefault("ML_THREAD_WORKERS", str(_threads_per_worker))
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, str(_threads_per_worker))
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Tái tạo worker định kỳ (chống phình bộ nhớ); jitter để không restart cùng lúc
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # preload_app=True -> app đã import ở master; load model tại đây, trước khi fork.
+    # Không chạy predict giả ở master: OpenMP (LightGBM/XGBoost) không an toàn khi fork sau khi đã khởi tạo.
+    from app import config
+    from app.services.model_store import model_store
+
+    report = model_store.warmup(max_workers=config.ML_WARMUP_WORKERS)
+    loaded = [k for k, v in report.items() if v.get("status") == "loaded"]
+    server.log.info(
+        "Preloaded %d/%d models in master (workers=%d, threads/worker=%d)",
+        len(loaded), len(report), workers, _threads_per_worker,
+    )
+
+    # Đưa object hiện có vào permanent generation: GC của worker không chạm vào -> ít page bị copy
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked (pid=%s)", worker.age, worker.pid)
+
+
+def worker_int(worker):
+    # Gunicorn gọi hook này khi worker nhận INT/QUIT = quick shutdown (không drain); muốn drain thì gửi TERM
+    worker.log.warning("Worker %s got INT/QUIT: quick shutdown, in-flight requests are not drained (use TERM)", worker.pid)
@@ -0,0 +1,221 @@
+# ai-service/tests/conftest.py
+# Chạy: cd ai-service && python -m pytest -q
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+AI_SERVICE_DIR = Path(__file__).resolve().parents[1]
+if str(AI_SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(AI_SERVICE_DIR))
+
+# Test không cần warm-up nền lúc startup app
+os.environ.setdefault("ML_WARMUP_ENABLED", "0")
+
+
+@pytest.fixture(scope="session")
+def ml():
+    from app.services.ml_service import MLService
+
+    return MLService()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def lead_payloads():
+    """Lead đủ kiểu: category đúng/khác hoa thường/không có trong feature_columns, số dạng chuỗi, None, chuỗi lỗi."""
+    sources = ["Referral", "referral", "Website", "FacebookAds", "Unknown", None, ""]
+    priorities = ["high", "HIGH", "low", "urgent", None]
+    out = []
+    for i in range(40):
+        out.append({
+            "source": sources[i % len(sources)],
+            "priority": priorities[i % len(priorities)],
+            "status": "new" if i % 2 else "contacted",
+            "lead_score": i * 2.5,
+            "total_interactions": str(i % 7),
+            "product_price": None if i % 9 == 0 else 100 + i,
+            "product_discount": "abc" if i % 11 == 0 else 0.1,
+            "days_since_created": i,
+            "predicted_value_currency": "USD" if i % 13 == 0 else None,
+        })
+    return out
+
+
+# Dataset thật của Backend
+DATA_DIR = AI_SERVICE_DIR.parent / "Backend" / "Infrastructure" / "database"
+CHURN_CSV = DATA_DIR / "churn_dataset_15k_noleak_60_40.csv"  # customer_id, snapshot_date + 32 cột feature
+DAILY_CSV = DATA_DIR / "daily_dataset_enhanced_features.csv"  # doanh thu daily 2019-2025
+SEGMENT_CSV = DATA_DIR / "customer_segmentation_level3_cosmetics_v2.csv"  # customer_id + RFM / hành vi
+CLV_CSV = DATA_DIR / "ecommerce_clv_10k_train_clv.csv"  # customer_id + feature acquisition/90 ngày + CLV_target
+
+
+@pytest.fixture(scope="session")
+def churn_csv_path() -> Path:
+    return CHURN_CSV
+
+
+@pytest.fixture(scope="session")
+def churn_frame():
+    return pd.read_csv(CHURN_CSV)
+
+
+@pytest.fixture(scope="session")
+def segment_frame():
+    return pd.read_csv(SEGMENT_CSV)
+
+
+@pytest.fixture(scope="session")
+def clv_frame():
+    return pd.read_csv(CLV_CSV)
+
+
+CLV_CATEGORICAL = ["acquisition_channel", "campaign_type"]
+CLV_NUMERIC = [
+    "acquisition_cost", "recency", "frequency_90d", "monetary_90d", "avg_order_value",
+    "product_diversity", "return_rate", "email_open_rate", "support_ticket_count",
+]
+
+
+@pytest.fixture(scope="session")
+def clv_bundle_dir(tmp_path_factory, clv_frame):
+    """
+    Repo không kèm CLV bundle -> train bundle nhỏ từ CSV CLV (OneHot + Ridge trên log1p target)
+    theo đúng các dạng bundle mà MLService hỗ trợ:
+    - 1m / 3m: dict {pipeline, expected_cols, target_is_log} cùng expected_cols (dùng chung frame)
+    - 6m: dict {model, expected_cols} với ít cột hơn
+    - 12m (clv_model_bundle.joblib): dict {pipe} không có expected_cols
+    Model thật của repo được symlink vào cùng thư mục.
+    """
+    import joblib
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    out = tmp_path_factory.mktemp("clv_models")
+    for src in (AI_SERVICE_DIR / "model").iterdir():
+        (out / src.name).symlink_to(src)
+
+    def train(cols, factor):
+        cats = [c for c in cols if c in CLV_CATEGORICAL]
+        nums = [c for c in cols if c not in CLV_CATEGORICAL]
+        pipe = Pipeline([
+            ("prep", ColumnTransformer([
+                ("cat", OneHotEncoder(handle_unknown="ignore"), cats),
+                ("num", SimpleImputer(strategy="median"), nums),
+            ])),
+            ("reg", Ridge(alpha=1.0)),
+        ])
+        return pipe.fit(clv_frame[cols], np.log1p(clv_frame["CLV_target"] * factor))
+
+    all_cols = CLV_CATEGORICAL + CLV_NUMERIC
+    few_cols = CLV_CATEGORICAL + CLV_NUMERIC[:6]
+    joblib.dump({"pipeline": train(all_cols, 1 / 12), "expected_cols": all_cols, "target_is_log": True, "horizon": "1m"},
+                out / "clv_model_bundle_1m.joblib")
+    joblib.dump({"pipeline": train(all_cols, 1 / 4), "expected_cols": all_cols, "target_is_log": True, "horizon": "3m"},
+                out / "clv_model_bundle_3m.joblib")
+    joblib.dump({"model": train(few_cols, 1 / 2), "expected_cols": few_cols, "horizon": "6m"},
+                out / "clv_model_bundle_6m.joblib")
+    joblib.dump({"pipe": train(all_cols, 1.0), "target_is_log": True}, out / "clv_model_bundle.joblib")
+    return out
+
+
+@pytest.fixture(scope="module")
+def clv_models(clv_bundle_dir):
+    """model_store đọc từ thư mục có CLV bundle trong suốt module test, xong trả lại thư mục cũ."""
+    from app.services.model_store import model_store
+
+    old = model_store.base_dir
+    model_store.base_dir = clv_bundle_dir
+    model_store.clear_cache()
+    yield model_store
+    model_store.base_dir = old
+    model_store.clear_cache()
+
+
+@pytest.fixture(scope="session")
+def snapshot_frame(churn_frame, segment_frame, clv_frame):
+    """Bảng feature khách cho snapshot: 600 dòng đầu mỗi CSV ghép ngang (id của churn, cột feature của cả 3 model)."""
+    n = 600
+    seg = segment_frame.head(n).drop(columns=["customer_id"]).reset_index(drop=True)
+    clv = clv_frame.head(n).drop(columns=["customer_id", "CLV_target", "money_unit_note"]).reset_index(drop=True)
+    clv.loc[clv.index[::9], "acquisition_channel"] = None
+    clv.loc[clv.index[::4], "email_open_rate"] = np.nan
+    return pd.concat([churn_frame.head(n).reset_index(drop=True), seg, clv], axis=1)
+
+
+@pytest.fixture(scope="session")
+def daily_csv_bytes() -> bytes:
+    return DAILY_CSV.read_bytes()
+
+
+@pytest.fixture(scope="session")
+def daily_frame():
+    return pd.read_csv(DAILY_CSV)
+
+
+# ---------- Bản tham chiếu: feature forecast theo từng ngày (code trước khi vector hoá) ----------
+def _legacy_holiday_flag(d: pd.Timestamp, holiday_mmdd: List[str], window_days: int) -> int:
+    if not holiday_mmdd:
+        return 0
+    if window_days <= 0:
+        return 1 if d.strftime("%m-%d") in set(holiday_mmdd) else 0
+    for mmdd in holiday_mmdd:
+        try:
+            hd = pd.Timestamp(f"{d.year}-{mmdd}")
+        except Exception:
+            continue
+        if abs((d - hd).days) <= window_days:
+            return 1
+    return 0
+
+
+def _legacy_feature_row(expected, hist: pd.Series, d: pd.Timestamp, holiday_mmdd, window_days) -> Dict[str, Any]:
+    """_make_feature_row trước khi có RecursiveForecastEngine: 1 dict / ngày từ pd.Series history."""
+    row = {c: 0 for c in expected}
+    wd, mo = int(d.dayofweek), int(d.month)
+    calendar = {
+        "weekday": wd,
+        "month": mo,
+        "year": int(d.year),
+        "is_weekend": 1 if wd >= 5 else 0,
+        "is_holiday_window": _legacy_holiday_flag(d, holiday_mmdd, window_days),
+        "season_spring": int(mo in (3, 4, 5)),
+        "season_summer": int(mo in (6, 7, 8)),
+        "season_autumn": int(mo in (9, 10, 11)),
+        "season_winter": int(mo in (12, 1, 2)),
+    }
+    for k, v in calendar.items():
+        if k in row:
+            row[k] = v
+    if "lag_1" in row:
+        row["lag_1"] = float(hist.iloc[-1])
+    for k in (7, 14):
+        if f"lag_{k}" in row:
+            row[f"lag_{k}"] = float(hist.iloc[-k]) if len(hist) >= k else float(hist.iloc[0])
+    for w in (7, 28):
+        if f"roll_mean_{w}" in row:
+            row[f"roll_mean_{w}"] = float(hist.tail(w).mean()) if len(hist) >= w else float(hist.mean())
+    return row
+
+
+@pytest.fixture(scope="session")
+def legacy_feature_row():
+    return _legacy_feature_row
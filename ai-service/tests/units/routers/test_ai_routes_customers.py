@@ -0,0 +1,186 @@
+# ai-service/tests/units/routers/test_ai_routes_customers.py
+from __future__ import annotations
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def churn_rows(churn_frame):
+    return churn_frame.head(500).reset_index(drop=True)
+
+
+def _post_bulk(client, content: bytes, filename: str, **form):
+    return client.post(
+        "/v1/customers/churn/bulk",
+        files={"file": (filename, content, "application/octet-stream")},
+        data={k: str(v) for k, v in form.items()},
+    )
+
+
+@pytest.mark.parametrize("in_fmt", ["csv", "parquet"])
+def test_churn_bulk_ndjson_giong_service(client, ml, churn_rows, in_fmt):
+    if in_fmt == "parquet":
+        pytest.importorskip("pyarrow")
+        buf = io.BytesIO()
+        churn_rows.to_parquet(buf, index=False)
+        content, name = buf.getvalue(), "khach.parquet"
+    else:
+        content, name = churn_rows.to_csv(index=False).encode(), "khach.csv"
+
+    r = _post_bulk(client, content, name, chunk_size=120)
+    assert r.status_code == 200, r.text
+    lines = [json.loads(x) for x in r.text.splitlines()]
+    assert lines[0]["debug"]["input_format"] == in_fmt
+    assert lines[-1]["summary"]["rows"] == 500 and lines[-1]["summary"]["chunks"] == 5
+    got = pd.DataFrame(lines[1:-1])
+
+    ref = pd.concat(list(ml.iter_churn_bulk([churn_rows])), ignore_index=True)
+    assert got["customer_id"].tolist() == ref["customer_id"].tolist()
+    assert got["churn_prob"].tolist() == pytest.approx(ref["churn_prob"].tolist(), rel=1e-12)
+    assert got["risk_tier"].tolist() == ref["risk_tier"].tolist()
+
+
+def test_churn_bulk_csv_output(client, ml, churn_rows):
+    r = _post_bulk(client, churn_rows.to_csv(index=False).encode(), "khach.csv", output_format="csv", chunk_size=200)
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith("text/csv")
+    got = pd.read_csv(io.StringIO(r.text))
+    assert list(got.columns) == ["customer_id", "churn_prob", "raw_score", "risk_tier"]
+    assert len(got) == 500  # header chỉ 1 lần dù có 3 khúc
+    single = ml.predict_churn(churn_rows.iloc[42].to_dict())
+    assert got.loc[42, "churn_prob"] == pytest.approx(single["churn_prob"], rel=1e-9)
+
+
+def test_churn_bulk_tham_so_sai(client, churn_rows):
+    content = churn_rows.head(5).to_csv(index=False).encode()
+    assert _post_bulk(client, content, "k.csv", output_format="xml").status_code == 400
+    assert _post_bulk(client, content, "k.csv", chunk_size=0).status_code == 400
+    assert _post_bulk(client, content, "k.xlsx", input_format="xlsx").status_code == 400
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+def test_segment_batch_giong_route_tung_khach(client, segment_frame):
+    rows = segment_frame.head(30).drop(columns=["customer_id"]).to_dict(orient="records")
+    seg_map = {"0": "VIP", "1": "Thường", "2": "Ngủ đông"}
+    r = client.post("/v1/customers/segment/batch", json={"rows": rows, "segment_map_json": seg_map, "return_distances": True})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["n"] == 30
+
+    for row, got, dist in zip(rows[:10], body["results"], body["distances_to_centers"]):
+        single = client.post("/v1/customers/segment", json={"segmentation_json": row, "segment_map_json": seg_map}).json()
+        assert got["segment_id"] == single["segment_id"]
+        assert got["segment_name"] == single["segment_name"]
+        assert dist == pytest.approx(single["distances_to_centers"], rel=1e-7, abs=1e-7)
+
+    assert client.post("/v1/customers/segment/batch", json={"rows": []}).status_code == 400
+
+
+def test_clv_multi_giong_goi_tung_horizon(client, clv_models, clv_frame):
+    rows = clv_frame.head(20).drop(columns=["CLV_target"]).to_dict(orient="records")
+    horizons = ["1m", "3m", "6m", "12m"]
+
+    one = client.post("/v1/customers/clv/multi", json={"horizons": horizons, "clv_json": rows[0]})
+    assert one.status_code == 200, one.text
+    for h in horizons:
+        single = client.post("/v1/customers/clv", json={"horizon": h, "clv_json": rows[0]}).json()
+        assert one.json()["CLV_pred"][h] == pytest.approx(single["CLV_pred"], rel=1e-12)
+
+    many = client.post("/v1/customers/clv/multi", json={"horizons": horizons, "rows": rows})
+    assert many.status_code == 200, many.text
+    assert many.json()["n"] == 20
+    assert many.json()["results"][0] == pytest.approx(one.json()["CLV_pred"], rel=1e-12)
+
+    assert client.post("/v1/customers/clv/multi", json={"horizons": horizons}).status_code == 400
+    assert client.post("/v1/customers/clv/multi", json={"horizons": [], "clv_json": rows[0]}).status_code == 400
+
+
+@pytest.fixture
+def snapshot_store(tmp_path, monkeypatch):
+    """snapshot_jobs của router ghi vào thư mục tạm của test."""
+    from app.routers import ai_routes
+
+    monkeypatch.setattr(ai_routes.snapshot_jobs, "out_dir", tmp_path)
+    return ai_routes.snapshot_jobs
+
+
+def _post_snapshot(client, content: bytes, filename: str = "khach.csv", **form):
+    return client.post(
+        "/v1/snapshots",
+        files={"file": (filename, content, "application/octet-stream")},
+        data={k: str(v) for k, v in form.items()},
+    )
+
+
+def _wait_snapshot(client, job_id: str, timeout: float = 60.0) -> dict:
+    import time
+
+    t0 = time.time()
+    while True:
+        body = client.get(f"/v1/snapshots/{job_id}").json()
+        if body["state"] in ("done", "failed", "cancelled"):
+            return body
+        assert time.time() - t0 < timeout, body
+        time.sleep(0.05)
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+def test_snapshot_job_giong_service(client, ml, clv_models, snapshot_store, snapshot_frame):
+    pytest.importorskip("pyarrow")
+    rows = snapshot_frame.head(300)
+    r = _post_snapshot(client, rows.to_csv(index=False).encode(), chunk_size=100, job_id="route-snap")
+    assert r.status_code == 202, r.text
+    assert r.json()["job_id"] == "route-snap" and r.json()["models"] == ["churn", "segment", "clv"]
+
+    body = _wait_snapshot(client, "route-snap")
+    assert body["state"] == "done", body["error"]
+    assert body["progress"]["rows"] == 300 and body["progress"]["chunks"] == 3
+    assert "route-snap" in [j["job_id"] for j in client.get("/v1/snapshots").json()["jobs"]]
+
+    dl = client.get("/v1/snapshots/route-snap/download")
+    assert dl.status_code == 200
+    got = pd.read_parquet(io.BytesIO(dl.content))
+    ref, _ = ml.snapshot_chunk(rows)
+    pd.testing.assert_frame_equal(got, ref, check_exact=False, rtol=1e-12)
+
+    assert _post_snapshot(client, b"customer_id\n1\n", job_id="route-snap").status_code == 400
+    assert client.delete("/v1/snapshots/route-snap").json() == {"job_id": "route-snap", "deleted": True}
+    assert client.get("/v1/snapshots/route-snap").status_code == 404
+    assert client.delete("/v1/snapshots/route-snap").status_code == 404
+
+
+def test_snapshot_download_khi_chua_xong_tra_409(client, ml, snapshot_store, snapshot_frame, monkeypatch):
+    import threading
+
+    gate = threading.Event()
+
+    def slow_chunk(chunk, **kw):
+        gate.wait(10)
+        return ml.snapshot_chunk(chunk, **kw)
+
+    monkeypatch.setattr(snapshot_store, "_run_chunk", slow_chunk)
+    content = snapshot_frame.head(40).to_csv(index=False).encode()
+    r = _post_snapshot(client, content, output_format="ndjson", models="churn", job_id="route-cho")
+    assert r.status_code == 202, r.text
+    try:
+        assert client.get("/v1/snapshots/route-cho/download").status_code == 409
+        assert client.delete("/v1/snapshots/route-cho").status_code == 200  # đang chạy -> huỷ
+    finally:
+        gate.set()
+    assert _wait_snapshot(client, "route-cho")["state"] == "cancelled"
+    assert client.get("/v1/snapshots/route-cho/download").status_code == 409
+    client.delete("/v1/snapshots/route-cho")
+
+
+def test_snapshot_tham_so_sai(client, snapshot_store):
+    content = b"customer_id\n1\n"
+    assert _post_snapshot(client, content, output_format="xml").status_code == 400
+    assert _post_snapshot(client, content, models="churn,lead").status_code == 400
+    assert _post_snapshot(client, content, models="churn", chunk_size=0).status_code == 400
+    assert _post_snapshot(client, content, models="churn", job_id="a/b").status_code == 400
+    assert _post_snapshot(client, content, models="churn", segment_map_json="{").status_code == 400
+    assert client.get("/v1/snapshots/khong-co/download").status_code == 404
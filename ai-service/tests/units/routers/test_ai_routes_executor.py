@@ -0,0 +1,22 @@
+# ai-service/tests/units/routers/test_ai_routes_executor.py
+from __future__ import annotations
+
+from app.routers import ai_routes
+from app.services.ml_executor import ExecutorSaturated
+
+
+async def _saturated(*args, **kwargs):
+    raise ExecutorSaturated("ML heavy_thread queue is full (256/256)")
+
+
+def test_queue_day_tra_503_thay_vi_500(client, monkeypatch):
+    monkeypatch.setattr(ai_routes.ml_executor, "run_heavy", _saturated)
+    r = client.post("/v1/customers/segment/batch", json={"rows": [{"Recency": 1}]})
+    assert r.status_code == 503
+    assert "queue is full" in r.json()["detail"]
+
+
+def test_ml_stats_co_executor(client):
+    r = client.get("/v1/ml/stats")
+    assert r.status_code == 200
+    assert {"thread", "heavy_thread", "process"} <= set(r.json()["executor"])
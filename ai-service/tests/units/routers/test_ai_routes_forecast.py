@@ -0,0 +1,260 @@
+# ai-service/tests/units/routers/test_ai_routes_forecast.py
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+import pytest
+
+HOLIDAYS = "01-01,04-30,09-02,12-25"
+
+
+def _post_daily_csv(client, content: bytes, **form):
+    data = {"horizon": "30", "holiday_mmdd": HOLIDAYS, "holiday_window_days": "3", "no_cache": "true"}
+    data.update({k: str(v) for k, v in form.items()})
+    return client.post("/v1/forecast/daily_csv", files={"file": ("daily.csv", content, "text/csv")}, data=data)
+
+
+def test_daily_csv_all_co_extra_targets_giong_service(client, ml, daily_csv_bytes, daily_frame):
+    extra = [{"name": "order_x2", "target_col": "daily_revenue_order", "model": "xgb_daily_revenue_order",
+              "transform_mode": "raw_scale", "transform_scale": 2.0}]
+    r = _post_daily_csv(client, daily_csv_bytes, mode="ALL", extra_targets=json.dumps(extra))
+    assert r.status_code == 200, r.text
+    body = r.json()
+
+    from app.services.forecast_dataset import ForecastTarget
+
+    ref = ml.forecast_all_targets(
+        daily_frame, horizon=30, start_date=None, holiday_mmdd=HOLIDAYS.split(","), holiday_window_days=3,
+        extra_targets=[ForecastTarget("order_x2", "daily_revenue_order", "xgb_daily_revenue_order", "raw_scale", 2.0)],
+        output="frame",
+    )["forecast"]
+    got = pd.DataFrame(body["forecast"])
+    for col in ("pred_order", "pred_line", "pred_order_x2"):
+        assert got[col].tolist() == pytest.approx(ref[col].tolist(), rel=0, abs=0)
+    assert "expected_features_order_x2" in body["debug"]
+
+
+def test_daily_csv_multi_tra_theo_series(client, ml, daily_frame):
+    base = daily_frame[["date", "daily_revenue_order"]].tail(120)
+    long = pd.concat([base.assign(series_id="a"), base.assign(series_id="b").iloc[:-10]], ignore_index=True)
+    r = _post_daily_csv(client, long.to_csv(index=False).encode(), mode="MULTI", target="daily_revenue_order")
+    assert r.status_code == 200, r.text
+    body = r.json()
+
+    ref = ml.forecast_multi_series(
+        long, target="daily_revenue_order", horizon=30, start_date=None,
+        holiday_mmdd=HOLIDAYS.split(","), holiday_window_days=3,
+    )
+    assert [s["series_id"] for s in body["series"]] == ["a", "b"]
+    for got, exp in zip(body["series"], ref["series"]):
+        assert got["start_date_used"] == exp["start_date_used"]
+        assert [x["prediction"] for x in got["forecast"]] == pytest.approx([x["prediction"] for x in exp["forecast"]], rel=1e-12)
+
+
+@pytest.fixture
+def process_executor(monkeypatch):
+    """run_heavy đi qua process pool spawn thật (như ML_PROCESS_WORKERS=1)."""
+    from app.routers import ai_routes
+    from app.services.ml_executor import InferenceExecutor
+
+    ex = InferenceExecutor(thread_workers=2, process_workers=1)
+    monkeypatch.setattr(ai_routes, "ml_executor", ex)
+    yield ex
+    ex.shutdown()
+
+
+def test_session_forecast_chay_duoc_tren_process_worker(client, ml, daily_csv_bytes, process_executor):
+    sid = "pytest-process-session"
+    r = client.post(
+        "/v1/forecast/sessions",
+        files={"file": ("daily.csv", daily_csv_bytes, "text/csv")},
+        data={"session_id": sid, "hist_days": "200", "holiday_mmdd": HOLIDAYS, "holiday_window_days": "3"},
+    )
+    assert r.status_code == 200, r.text
+    try:
+        r = client.post(f"/v1/forecast/sessions/{sid}/forecast", json={"horizon": 14})
+        assert r.status_code == 200, r.text
+        assert process_executor.stats()["process"]["completed"] == 1
+
+        from app.routers.ai_routes import forecast_sessions
+
+        ref = ml.forecast_all_targets(
+            forecast_sessions.get(sid).prepared, horizon=14, start_date=None,
+            holiday_mmdd=HOLIDAYS.split(","), holiday_window_days=3, hist_days=200,
+        )
+        got = r.json()["forecast"]
+        assert [x["pred_order"] for x in got] == pytest.approx([x["pred_order"] for x in ref["forecast"]], rel=1e-12)
+        assert [x["pred_line"] for x in got] == pytest.approx([x["pred_line"] for x in ref["forecast"]], rel=1e-12)
+    finally:
+        client.delete(f"/v1/forecast/sessions/{sid}")
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    from app.routers import ai_routes
+    from app.services.result_cache import ResultCache
+
+    cache = ResultCache(max_entries=16, ttl_secs=600)
+    monkeypatch.setattr(ai_routes, "forecast_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def swap_model_dir(tmp_path, monkeypatch):
+    """Model forecast chép sang thư mục tạm để test có thể thay file (hot-swap) mà không đụng model/ thật."""
+    import shutil
+
+    from app.services.model_store import model_store
+
+    for name in ("xgb_daily_revenue_order.joblib", "xgb_daily_revenue_line.joblib"):
+        shutil.copy2(model_store.base_dir / name, tmp_path / name)
+    monkeypatch.setattr(model_store, "base_dir", tmp_path)
+    model_store.clear_cache()
+    yield tmp_path
+    model_store.clear_cache()
+
+
+def _post_cached(client, content, **form):
+    return _post_daily_csv(client, content, no_cache="false", **form)
+
+
+def test_cache_hit_va_doi_key_khi_reload_model(client, daily_frame, fresh_cache, swap_model_dir):
+    import os
+    import time
+
+    from app.services.model_store import model_store
+
+    content = daily_frame.tail(400).to_csv(index=False).encode()
+    r1 = _post_cached(client, content, mode="ALL")
+    r2 = _post_cached(client, content, mode="ALL")
+    assert r1.headers["X-Forecast-Cache"] == "MISS"
+    assert r2.headers["X-Forecast-Cache"] == "HIT"
+    assert r1.json() == r2.json()
+
+    # file model được thay nhưng chưa reload -> vẫn dùng model cũ -> vẫn HIT
+    path = swap_model_dir / "xgb_daily_revenue_order.joblib"
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert _post_cached(client, content, mode="ALL").headers["X-Forecast-Cache"] == "HIT"
+
+    # reload model -> key khác -> MISS
+    model_store.clear_cache("xgb_daily_revenue_order")
+    r3 = _post_cached(client, content, mode="ALL")
+    assert r3.headers["X-Forecast-Cache"] == "MISS"
+    assert r3.headers["X-Forecast-Cache-Key"] != r1.headers["X-Forecast-Cache-Key"]
+
+
+def test_interval_khong_seed_khong_cache(client, daily_frame, fresh_cache):
+    content = daily_frame.tail(400).to_csv(index=False).encode()
+    form = dict(mode="ONE", horizon=10, interval_paths=20, interval_backtest_days=30)
+
+    for _ in range(2):
+        r = _post_cached(client, content, **form)
+        assert r.status_code == 200, r.text
+        assert r.headers["X-Forecast-Cache"] == "BYPASS"
+        assert "X-Forecast-Cache-Key" not in r.headers
+    assert fresh_cache.stats()["sets"] == 0
+
+    seeded = [_post_cached(client, content, interval_seed=7, **form) for _ in range(2)]
+    assert [r.headers["X-Forecast-Cache"] for r in seeded] == ["MISS", "HIT"]
+    assert seeded[0].json() == seeded[1].json()
+
+
+@pytest.mark.parametrize("mode", ["ALL", "ONE"])
+def test_output_format_cung_gia_tri_voi_records(client, daily_frame, mode):
+    import io
+
+    content = daily_frame.tail(400).to_csv(index=False).encode()
+    records = _post_daily_csv(client, content, mode=mode).json()
+    ref = pd.DataFrame(records["forecast"])
+
+    columnar = _post_daily_csv(client, content, mode=mode, output_format="columnar").json()
+    assert columnar["debug"] == records["debug"]
+    pd.testing.assert_frame_equal(pd.DataFrame(columnar["forecast"]), ref)
+
+    r = _post_daily_csv(client, content, mode=mode, output_format="ndjson")
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(x) for x in r.text.splitlines()]
+    assert lines[0]["debug"] == records["debug"]
+    pd.testing.assert_frame_equal(pd.DataFrame(lines[1:]), ref[pd.DataFrame(lines[1:]).columns], check_dtype=False)
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    for fmt, read in (("arrow", lambda b: pa.ipc.open_stream(b).read_all()), ("parquet", pq.read_table)):
+        r = _post_daily_csv(client, content, mode=mode, output_format=fmt)
+        assert r.status_code == 200, r.text
+        table = read(io.BytesIO(r.content))
+        got = table.to_pandas()
+        got["date"] = got["date"].map(lambda d: d.isoformat())
+        pd.testing.assert_frame_equal(got[ref.columns], ref, check_dtype=False)
+        assert json.loads(table.schema.metadata[b"debug"]) == records["debug"]
+
+
+def test_output_format_sai_tra_400(client, daily_frame):
+    r = _post_daily_csv(client, daily_frame.tail(60).to_csv(index=False).encode(), output_format="xml")
+    assert r.status_code == 400
+
+
+def test_backtest_route_giong_service(client, ml, daily_csv_bytes, daily_frame):
+    from app.services.forecast_dataset import DEFAULT_FORECAST_TARGETS
+
+    r = client.post(
+        "/v1/forecast/backtest",
+        files={"file": ("daily.csv", daily_csv_bytes, "text/csv")},
+        data={"bt_days": "45", "holiday_mmdd": HOLIDAYS, "holiday_window_days": "3"},
+    )
+    assert r.status_code == 200, r.text
+    ref = ml.backtest_targets(
+        daily_frame, targets=list(DEFAULT_FORECAST_TARGETS), start_date=None, end_date=None,
+        holiday_mmdd=HOLIDAYS.split(","), holiday_window_days=3, bt_days=45,
+    )
+    body = r.json()
+    assert body["suggested"] == pytest.approx(ref["suggested"])
+    assert body["targets"]["line"]["ranking"] == ref["targets"]["line"]["ranking"]
+
+    bad = client.post(
+        "/v1/forecast/backtest",
+        files={"file": ("daily.csv", daily_csv_bytes, "text/csv")},
+        data={"candidates": "{}"},
+    )
+    assert bad.status_code == 400
+
+
+def test_scenarios_route_giong_service(client, ml, daily_frame):
+    from app.services.forecast_dataset import DEFAULT_FORECAST_TARGETS
+    from app.services.forecast_scenarios import ForecastScenario
+
+    content = daily_frame.tail(500).to_csv(index=False).encode()
+    items = [
+        {"name": "base"},
+        {"name": "scale", "start_date": "2025-06-01", "order_transform_mode": "raw_scale", "order_transform_scale": 1.5},
+    ]
+    r = client.post(
+        "/v1/forecast/scenarios",
+        files={"file": ("daily.csv", content, "text/csv")},
+        data={"scenarios": json.dumps(items), "horizon": "15", "holiday_mmdd": HOLIDAYS, "holiday_window_days": "3"},
+    )
+    assert r.status_code == 200, r.text
+    ref = ml.forecast_scenarios(
+        daily_frame.tail(500).reset_index(drop=True),
+        scenarios=[
+            ForecastScenario("base", transforms={"order": ("raw", 1.0), "line": ("raw", 1.0)}),
+            ForecastScenario("scale", start_date="2025-06-01",
+                             transforms={"order": ("raw_scale", 1.5), "line": ("raw", 1.0)}),
+        ],
+        targets=list(DEFAULT_FORECAST_TARGETS), horizon=15, holiday_mmdd=HOLIDAYS.split(","), holiday_window_days=3,
+    )
+    body = r.json()
+    for name in ("base", "scale"):
+        assert [x["pred_order"] for x in body["scenarios"][name]] == pytest.approx(
+            [x["pred_order"] for x in ref["scenarios"][name]], rel=1e-12
+        )
+    assert [row["total_order"] for row in body["summary"]] == pytest.approx([row["total_order"] for row in ref["summary"]])
+
+    bad = client.post(
+        "/v1/forecast/scenarios",
+        files={"file": ("daily.csv", content, "text/csv")},
+        data={"scenarios": "[]"},
+    )
+    assert bad.status_code == 400
@@ -0,0 +1,14 @@
+# ai-service/tests/units/routers/test_ai_routes_leads.py
+from __future__ import annotations
+
+
+def test_score_ml_batch_giong_score_ml(client, lead_payloads):
+    leads = lead_payloads[:10]
+    r = client.post("/v1/leads/score_ml/batch", json={"leads": leads})
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    assert len(items) == len(leads)
+    for lead, item in zip(leads, items):
+        one = client.post("/v1/leads/score_ml", json={"lead": lead})
+        assert one.status_code == 200, one.text
+        assert one.json() == item
@@ -0,0 +1,21 @@
+# ai-service/tests/units/routers/test_main.py
+from __future__ import annotations
+
+from app import config
+
+
+def test_health(client):
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_ready_theo_bao_cao_warmup(client, monkeypatch):
+    from app.services.model_store import model_store
+
+    monkeypatch.setattr(config, "ML_WARMUP_ENABLED", True)
+    monkeypatch.setattr(model_store, "_warmup_state", "running")
+    r = client.get("/ready")
+    assert r.status_code == 503 and r.json()["state"] == "running"
+
+    monkeypatch.setattr(config, "ML_WARMUP_ENABLED", False)
+    r = client.get("/ready")
+    assert r.status_code == 200 and r.json()["ready"] is True
@@ -0,0 +1,86 @@
+# ai-service/tests/units/service/test_churn_bulk.py
+from __future__ import annotations
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.bulk_input import iter_frames, normalize_input_format
+
+
+@pytest.fixture(scope="module")
+def rows(churn_frame):
+    return churn_frame.head(1200).reset_index(drop=True)
+
+
+def _chunks(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+def _bulk(ml, frames, **kw):
+    stats = {}
+    out = pd.concat(list(ml.iter_churn_bulk(frames, stats=stats, **kw)), ignore_index=True)
+    return out, stats
+
+
+def test_bulk_giong_predict_churn_tung_khach(ml, rows):
+    out, stats = _bulk(ml, _chunks(rows, 250))
+    assert out["customer_id"].tolist() == rows["customer_id"].tolist()
+
+    for i in range(0, len(rows), 60):
+        single = ml.predict_churn(rows.iloc[i].to_dict())
+        assert out.loc[i, "churn_prob"] == pytest.approx(single["churn_prob"], rel=1e-9)
+        assert out.loc[i, "raw_score"] == pytest.approx(single["raw_score"], rel=1e-9)
+
+    expected_tier = np.where(out["churn_prob"] >= 0.7, "HIGH", np.where(out["churn_prob"] >= 0.4, "MEDIUM", "LOW"))
+    assert out["risk_tier"].tolist() == expected_tier.tolist()
+    assert stats["rows"] == 1200 and stats["chunks"] == 5
+    assert sum(stats["tiers"].values()) == 1200
+    assert stats["missing_columns"] == []
+
+
+def test_chunk_size_khong_doi_ket_qua(ml, rows):
+    a, _ = _bulk(ml, _chunks(rows, 1200))
+    b, stats = _bulk(ml, _chunks(rows, 7) + [rows.iloc[:0]])  # khúc rỗng bị bỏ qua
+    pd.testing.assert_frame_equal(a, b)
+    assert stats["chunks"] == 172
+
+
+def test_thieu_cot_thanh_nan_cho_imputer(ml, rows):
+    drop = [c for c in ml.churn_input_columns() if c not in ("customer_id", "snapshot_date")][:2]
+    out, stats = _bulk(ml, _chunks(rows.drop(columns=drop), 500))
+    assert stats["missing_columns"] == sorted(drop)
+    ref = ml.predict_churn({**rows.iloc[3].drop(labels=drop).to_dict(), **{c: np.nan for c in drop}})
+    assert out.loc[3, "churn_prob"] == pytest.approx(ref["churn_prob"], rel=1e-9)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "parquet"])
+def test_iter_frames_moi_format_cung_du_lieu(rows, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    small = rows.head(100)
+    buf = io.BytesIO()
+    if fmt == "csv":
+        small.to_csv(buf, index=False)
+    elif fmt == "ndjson":
+        buf.write(small.to_json(orient="records", lines=True).encode())
+    else:
+        small.to_parquet(buf, index=False)
+    buf.seek(0)
+
+    cols = ["customer_id", "skin_type", "orders_30d"]
+    frames = list(iter_frames(buf, fmt, 30, cols))
+    assert [len(f) for f in frames] == [30, 30, 30, 10]
+    got = pd.concat(frames, ignore_index=True)
+    assert list(got.columns) == cols
+    pd.testing.assert_frame_equal(got, small[cols], check_dtype=False)
+
+
+def test_normalize_input_format():
+    assert normalize_input_format("auto", "x.JSONL") == "ndjson"
+    assert normalize_input_format(None, "x.pq") == "parquet"
+    assert normalize_input_format("auto", "noext") == "csv"
+    with pytest.raises(ValueError):
+        normalize_input_format("xlsx")
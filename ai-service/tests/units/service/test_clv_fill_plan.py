@@ -0,0 +1,73 @@
+# ai-service/tests/units/service/test_clv_fill_plan.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _fillna_tung_cot(df: pd.DataFrame) -> pd.DataFrame:
+    """_clv_fillna_by_rule trước khi có fill plan: copy rồi fillna từng cột theo tên."""
+    out = df.copy()
+    for c in out.columns:
+        lc = str(c).lower()
+        if out[c].isna().any():
+            if lc in ("acquisition_channel", "campaign_type"):
+                out[c] = out[c].fillna("unknown")
+            elif "rate" in lc:
+                out[c] = out[c].fillna(0.0)
+            elif lc.startswith("log_"):
+                out[c] = out[c].fillna(0.0)
+            elif any(k in lc for k in ["count", "frequency", "recency", "dayofweek", "year", "month", "diversity"]):
+                out[c] = out[c].fillna(0)
+            else:
+                out[c] = out[c].fillna(0)
+    return out
+
+
+@pytest.fixture
+def messy(clv_frame):
+    df = clv_frame.head(300).drop(columns=["CLV_target"]).copy()
+    rng = np.random.default_rng(11)
+    for c in df.columns:
+        df.loc[rng.random(len(df)) < 0.1, c] = None
+    df["log_monetary"] = np.log1p(clv_frame["monetary_90d"].head(300))
+    df.loc[df.index[::4], "log_monetary"] = np.nan
+    df["Campaign_Type"] = None  # chữ hoa: vẫn là categorical theo lower()
+    df["bounce_rate_all_nan"] = np.nan
+    df["x_dayofweek"] = pd.array([1, None, 3] * 100, dtype="Int64")
+    return df
+
+
+def test_plan_giong_fillna_tung_cot(ml, messy):
+    got = ml._clv_fillna_by_rule(messy)
+    pd.testing.assert_frame_equal(got, _fillna_tung_cot(messy))
+
+
+def test_plan_theo_expected_cols_giong_fillna_tung_cot(ml, messy):
+    expected = ["acquisition_channel", "campaign_type", "return_rate", "recency", "log_monetary", "cot_moi_rate", "cot_moi"]
+    plan = ml._clv_fill_plan(expected)
+    got = ml._clv_frame(messy, expected, plan)
+    pd.testing.assert_frame_equal(got, _fillna_tung_cot(messy.reindex(columns=expected)))
+    assert plan == {
+        "acquisition_channel": "unknown", "campaign_type": "unknown", "return_rate": 0.0, "recency": 0,
+        "log_monetary": 0.0, "cot_moi_rate": 0.0, "cot_moi": 0,
+    }
+
+
+def test_cot_ngoai_plan_van_theo_luat(ml, messy):
+    got = ml._clv_fillna_by_rule(messy, plan={"recency": 0})
+    pd.testing.assert_frame_equal(got, _fillna_tung_cot(messy))
+
+
+def test_khong_thieu_o_nao_thi_khong_copy(ml, clv_frame):
+    df = clv_frame.head(50)
+    assert ml._clv_fillna_by_rule(df) is df
+
+
+def test_plan_cache_theo_bundle(ml, clv_models):
+    a = ml._clv_bundle_fill_plan("clv_model_bundle_6m", None)
+    assert a is ml._clv_bundle_fill_plan("clv_model_bundle_6m", None)
+    assert list(a) == ["acquisition_channel", "campaign_type", "acquisition_cost", "recency", "frequency_90d",
+                       "monetary_90d", "avg_order_value", "product_diversity"]
+    assert ml._clv_bundle_fill_plan("clv_model_bundle_12m", None) is None  # bundle không có expected_cols
@@ -0,0 +1,60 @@
+# ai-service/tests/units/service/test_clv_multi.py
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+HORIZONS = ["1m", "3m", "6m", "12m"]
+
+
+@pytest.fixture(scope="module")
+def customers(clv_frame):
+    """200 khách, có ô thiếu ở cả cột categorical / rate / count để đi qua luật fillna."""
+    df = clv_frame.head(200).copy()
+    df.loc[df.index[::7], "acquisition_channel"] = None
+    df.loc[df.index[::5], "email_open_rate"] = np.nan
+    df.loc[df.index[::3], "frequency_90d"] = np.nan
+    return df.drop(columns=["CLV_target"])
+
+
+def test_multi_horizon_giong_tung_horizon(ml, clv_models, customers):
+    rows = customers.to_dict(orient="records")
+    res = ml.predict_clv_horizons(rows, horizons=HORIZONS)
+    assert res["n"] == 200 and res["horizons"] == HORIZONS
+    assert res["debug"]["shared_frames"] == 3  # 1m + 3m chung expected_cols
+
+    for h in HORIZONS:
+        for i in range(0, 200, 17):
+            single = ml.predict_clv(rows[i], horizon=h)
+            assert res["results"][i][h] == pytest.approx(single["CLV_pred"], rel=1e-12), (h, i)
+    assert res["bundles"]["12m"] == "clv_model_bundle_12m"
+
+
+def test_mot_khach_va_so_worker(ml, clv_models, customers):
+    row = customers.iloc[3].to_dict()
+    one = ml.predict_clv_horizons(row, horizons=HORIZONS)
+    assert set(one["CLV_pred"]) == set(HORIZONS)
+    assert all(v >= 0 for v in one["CLV_pred"].values())
+
+    rows = customers.to_dict(orient="records")
+    seq = ml.predict_clv_horizons(rows, horizons=HORIZONS, max_workers=1)["results"]
+    par = ml.predict_clv_horizons(rows, horizons=HORIZONS, max_workers=4)["results"]
+    assert seq == par
+    assert seq[3] == pytest.approx(one["CLV_pred"], rel=1e-12)  # 1 dòng vs 200 dòng: BLAS cộng khác thứ tự
+
+
+def test_predict_clv_all_va_list_chuyen_sang_multi(ml, clv_models, customers):
+    row = customers.iloc[0].to_dict()
+    assert ml.predict_clv(row, horizon="all")["CLV_pred"] == ml.predict_clv_horizons(row)["CLV_pred"]
+    assert ml.predict_clv(row, horizon=["6m", "1m", "6m"])["horizons"] == ["6m", "1m"]
+    assert ml.predict_clv([row, row], horizon="3m")["n"] == 2
+
+
+def test_khong_sua_input(ml, clv_models, customers):
+    before = customers.copy()
+    ml.predict_clv_horizons(customers.to_dict(orient="records"), horizons=HORIZONS)
+    assert before.equals(customers)
+    with pytest.raises(ValueError):
+        ml.predict_clv_horizons([], horizons=HORIZONS)
+    with pytest.raises(ValueError):
+        ml.predict_clv_horizons(customers.iloc[0].to_dict(), horizons=[])
@@ -0,0 +1,108 @@
+# ai-service/tests/units/service/test_forecast_backtest.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.forecast_backtest import one_step_feature_matrix, rank_transform_candidates
+from app.services.forecast_dataset import ForecastTarget
+from app.services.model_store import model_store
+
+HOLIDAYS = ["02-14", "04-30", "09-02"]  # không vắt qua năm -> khớp vòng lặp cũ
+
+
+def _legacy_backtest(legacy_feature_row, model, expected, s: pd.Series, start, end, min_hist):
+    """backtest_one_step của Streamlit: mỗi ngày test 1 DataFrame 1 dòng + 1 lần predict."""
+    rows = []
+    for d in s[(s.index >= pd.Timestamp(start)) & (s.index <= pd.Timestamp(end))].index:
+        hist = s[s.index < d]
+        if len(hist) < min_hist:
+            continue
+        X = pd.DataFrame([legacy_feature_row(expected, hist, d, HOLIDAYS, 3)], columns=expected)
+        pred_raw = float(model.predict(X)[0])
+        actual = float(s.loc[d])
+        ratio = (actual / pred_raw) if pred_raw != 0 else np.nan
+        rows.append({"date": d, "actual": actual, "pred_raw": pred_raw, "ratio_actual_over_pred": ratio})
+    return pd.DataFrame(rows).dropna()
+
+
+def _legacy_ranking(bt: pd.DataFrame):
+    med = float(bt["ratio_actual_over_pred"].median())
+    med = med if np.isfinite(med) and med > 0 else 1.0
+    cands = [("raw", 1.0), ("expm1", 1.0), ("raw_scale", 3.0), ("raw_scale", med), ("expm1_scale", 3.0), ("expm1_scale", med)]
+    y = bt["actual"].to_numpy(dtype=float)
+    rows = []
+    with np.errstate(over="ignore", invalid="ignore"):
+        for mode, scale in cands:
+            p = bt["pred_raw"].to_numpy(dtype=float)
+            p = np.expm1(p) if mode.startswith("expm1") else p
+            p = p * scale if mode.endswith("_scale") else p
+            err = np.abs(y - p)
+            rows.append({"mode": mode, "scale": scale, "MAE": err.mean(), "MAPE": (err / np.maximum(np.abs(y), 1e-9)).mean()})
+    return pd.DataFrame(rows).sort_values("MAPE", kind="stable").reset_index(drop=True), med
+
+
+def _series(daily_frame, target):
+    dates = pd.to_datetime(daily_frame["date"])
+    return pd.Series(pd.to_numeric(daily_frame[target], errors="coerce").to_numpy(), index=dates).dropna().sort_index()
+
+
+@pytest.mark.parametrize("target,model_name", [
+    ("daily_revenue_order", "xgb_daily_revenue_order"),
+    ("daily_revenue_line", "xgb_daily_revenue_line"),
+])
+@pytest.mark.parametrize("start,end,min_hist", [("2024-03-01", "2024-06-30", 28), ("2019-01-05", "2019-02-20", 10)])
+def test_backtest_vector_giong_vong_lap_cu(ml, daily_frame, legacy_feature_row, target, model_name, start, end, min_hist):
+    model = model_store.get(model_name)
+    bt = ml.backtest_one_step(
+        daily_frame, model=model, target_col=target, start_date=start, end_date=end,
+        holiday_mmdd=HOLIDAYS, holiday_window_days=3, min_hist=min_hist,
+    )
+    expected = ml._get_xgb_expected_features(model)
+    ref = _legacy_backtest(legacy_feature_row, model, expected, _series(daily_frame, target), start, end, min_hist)
+
+    assert list(bt["date"]) == list(ref["date"])
+    np.testing.assert_array_equal(bt["actual"].to_numpy(), ref["actual"].to_numpy())
+    np.testing.assert_allclose(bt["pred_raw"].to_numpy(), ref["pred_raw"].to_numpy(), rtol=1e-6)
+    np.testing.assert_allclose(bt["ratio_actual_over_pred"].to_numpy(), ref["ratio_actual_over_pred"].to_numpy(), rtol=1e-6)
+
+    ranking, med = ml.eval_transform_candidates(bt)
+    ref_rank, ref_med = _legacy_ranking(ref)
+    assert med == pytest.approx(ref_med, rel=1e-6)
+    assert list(zip(ranking["mode"], ranking["scale"].round(6))) == list(zip(ref_rank["mode"], ref_rank["scale"].round(6)))
+    np.testing.assert_allclose(ranking["MAPE"].to_numpy(), ref_rank["MAPE"].to_numpy(), rtol=1e-6)
+
+
+def test_feature_matrix_giong_feature_row_cu(legacy_feature_row):
+    expected = ["weekday", "month", "is_weekend", "lag_1", "lag_7", "lag_14", "roll_mean_7", "roll_mean_28", "x"]
+    rng = np.random.default_rng(5)
+    values = rng.normal(50, 20, size=60)
+    dates = pd.date_range("2024-01-01", periods=60)
+    pos = np.array([1, 5, 7, 13, 14, 27, 28, 29, 59])
+
+    X = one_step_feature_matrix(expected, values, pos, dates[pos], np.zeros(len(pos), dtype=np.int64))
+    s = pd.Series(values, index=dates)
+    for i, p in enumerate(pos):
+        ref = legacy_feature_row(expected, s.iloc[:p], dates[p], [], 0)
+        np.testing.assert_allclose(X[i], [ref[c] for c in expected], rtol=1e-12)
+
+
+def test_rank_candidate_scale_median(ml):
+    bt = pd.DataFrame({"actual": [10.0, 20.0, 30.0], "pred_raw": [5.0, 10.0, 15.0]})
+    ranking, med = ml.eval_transform_candidates(bt, [{"mode": "raw"}, {"mode": "raw_scale", "scale": "median"}])
+    assert med == 2.0
+    assert ranking.iloc[0].to_dict() == {"mode": "raw_scale", "scale": 2.0, "MAE": 0.0, "MAPE": 0.0}
+    direct = rank_transform_candidates(bt["actual"], bt["pred_raw"], [{"mode": "raw_scale", "scale": 2.0}])
+    assert direct["MAE"].tolist() == [0.0]
+
+
+def test_backtest_targets_goi_y_transform(ml, daily_frame):
+    res = ml.backtest_targets(
+        daily_frame,
+        targets=[ForecastTarget("order", "daily_revenue_order", "xgb_daily_revenue_order")],
+        start_date=None, end_date=None, holiday_mmdd=HOLIDAYS, holiday_window_days=3, bt_days=30, include_rows=True,
+    )
+    item = res["targets"]["order"]
+    assert item["n_days"] == len(item["rows"]) == 31
+    assert res["suggested"]["order_transform_mode"] == item["best"]["mode"] == item["ranking"][0]["mode"]
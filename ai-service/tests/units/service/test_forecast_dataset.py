@@ -0,0 +1,25 @@
+# ai-service/tests/units/service/test_forecast_dataset.py
+from __future__ import annotations
+
+import pickle
+import threading
+
+import numpy as np
+
+HOLIDAYS = ["01-01", "04-30"]
+
+
+def test_prepared_dataset_pickle_duoc(ml, daily_frame):
+    prepared = ml.prepare_daily_dataset(daily_frame.tail(200), HOLIDAYS, 3)
+    dates, values = prepared.series("daily_revenue_order")
+
+    clone = pickle.loads(pickle.dumps(prepared))
+
+    assert "_lock" not in prepared.__getstate__()
+    assert isinstance(clone._lock, type(threading.Lock()))
+    assert clone._lock is not prepared._lock
+    assert clone.holiday_mmdd == HOLIDAYS and clone.holiday_window_days == 3
+    d2, v2 = clone.series("daily_revenue_order")  # cache series đi kèm
+    assert list(d2) == list(dates)
+    np.testing.assert_array_equal(v2, values)
+    clone.series("daily_revenue_line")  # lock mới dùng được
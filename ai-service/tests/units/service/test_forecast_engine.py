@@ -0,0 +1,96 @@
+# ai-service/tests/units/service/test_forecast_engine.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.forecast_engine import RecursiveForecastEngine, calendar_features
+from app.services.model_store import model_store
+
+# Holiday không sát cuối/đầu năm: vòng lặp cũ chỉ xét holiday trong cùng năm với ngày dự báo
+HOLIDAYS = ["02-14", "04-30", "09-02"]
+
+
+def legacy_forecast(legacy_feature_row, model, expected, hist: pd.Series, future_dates, holiday_mmdd, window_days, *,
+                    mode="raw", scale=1.0, clip=True, append_transformed=True) -> pd.DataFrame:
+    out = []
+    hist_ext = hist.copy()
+    for d in future_dates:
+        X = pd.DataFrame([legacy_feature_row(expected, hist_ext, d, holiday_mmdd, window_days)], columns=expected)
+        raw = float(model.predict(X)[0])
+        pred = float(np.expm1(raw)) if mode in ("expm1", "expm1_scale") else raw
+        if mode in ("raw_scale", "expm1_scale"):
+            pred *= scale
+        pred_out = 0.0 if (clip and pred < 0) else pred
+        out.append({"date": d, "prediction_raw": raw, "prediction": pred_out})
+        hist_ext.loc[d] = pred_out if append_transformed else raw
+    return pd.DataFrame(out)
+
+
+@pytest.fixture(scope="module")
+def order_model():
+    return model_store.get("xgb_daily_revenue_order")
+
+
+def _history(daily_frame, target, start, hist_days):
+    df = daily_frame.assign(date=pd.to_datetime(daily_frame["date"].str.lstrip("\\ufeff")))
+    df = df[df["date"] < pd.Timestamp(start)].tail(hist_days)
+    return pd.Series(df[target].astype(float).values, index=df["date"]).sort_index()
+
+
+@pytest.mark.parametrize(
+    "start,hist_days,mode,scale,append",
+    [
+        ("2024-04-10", 365, "raw", 1.0, True),
+        ("2024-08-20", 20, "raw_scale", 1.3, False),  # history < 28 ngày: roll_mean_28 = mean toàn bộ
+        ("2023-02-01", 120, "raw_scale", 0.5, True),
+    ],
+)
+def test_forecast_recursive_giong_vong_lap_cu(ml, daily_frame, legacy_feature_row, order_model, start, hist_days, mode, scale, append):
+    horizon = 45
+    preds, expected, _, used_start = ml.forecast_recursive(
+        df_daily=daily_frame,
+        model=order_model,
+        target_col="daily_revenue_order",
+        horizon_days=horizon,
+        start_date=start,
+        holiday_mmdd=HOLIDAYS,
+        holiday_window_days=3,
+        hist_days=hist_days,
+        transform_mode=mode,
+        transform_scale=scale,
+        append_transformed_to_history=append,
+    )
+    hist = _history(daily_frame, "daily_revenue_order", start, hist_days)
+    ref = legacy_forecast(
+        legacy_feature_row, order_model, expected, hist, pd.date_range(used_start, periods=horizon, freq="D"), HOLIDAYS, 3,
+        mode=mode, scale=scale, append_transformed=append,
+    )
+    assert list(preds["date"]) == list(ref["date"])
+    np.testing.assert_array_equal(preds["prediction_raw"].to_numpy(), ref["prediction_raw"].to_numpy())
+    np.testing.assert_array_equal(preds["prediction"].to_numpy(), ref["prediction"].to_numpy())
+
+
+def test_engine_features_khop_feature_row_cu(legacy_feature_row):
+    expected = ["weekday", "month", "year", "is_weekend", "season_winter", "lag_1", "lag_7", "lag_14",
+                "roll_mean_7", "roll_mean_28", "unknown_col"]
+    rng = np.random.default_rng(3)
+    hist = pd.Series(rng.normal(100, 10, size=10), index=pd.date_range("2024-12-20", periods=10))
+    dates = pd.date_range("2024-12-30", periods=5)
+    engine = RecursiveForecastEngine(expected, [hist.to_numpy()], dates)
+
+    hist_ext = hist.copy()
+    for step, d in enumerate(dates):
+        ref = legacy_feature_row(expected, hist_ext, d, [], 0)
+        np.testing.assert_array_equal(engine.features(step)[0], [float(ref[c]) for c in expected])
+        v = float(step * 3.5)
+        engine.push(np.array([v]))
+        hist_ext.loc[d] = v
+
+
+def test_calendar_features():
+    cal = calendar_features(pd.DatetimeIndex(["2024-03-02", "2024-12-30"]))
+    assert cal["weekday"].tolist() == [5, 0]
+    assert cal["is_weekend"].tolist() == [1, 0]
+    assert cal["season_spring"].tolist() == [1, 0] and cal["season_winter"].tolist() == [0, 1]
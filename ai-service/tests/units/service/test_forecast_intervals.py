@@ -0,0 +1,98 @@
+# ai-service/tests/units/service/test_forecast_intervals.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import config
+from app.services.forecast_engine import RecursiveForecastEngine
+from app.services.forecast_intervals import IntervalSpec, inverse_transform, path_quantiles, simulate_paths
+from app.services.model_store import model_store
+
+HOLIDAYS = ["01-01", "04-30", "09-02"]
+
+
+def _forecast(ml, daily_frame, interval=None, **kw):
+    params = dict(
+        df_daily=daily_frame, model=model_store.get("xgb_daily_revenue_order"), target_col="daily_revenue_order",
+        horizon_days=20, start_date="2024-06-01", holiday_mmdd=HOLIDAYS, holiday_window_days=3, interval=interval,
+    )
+    params.update(kw)
+    return ml.forecast_recursive(**params)[0]
+
+
+def test_interval_khong_doi_du_bao_diem(ml, daily_frame):
+    spec = IntervalSpec(paths=200, quantiles=(0.05, 0.5, 0.95), backtest_days=60, seed=1)
+    point = _forecast(ml, daily_frame)
+    banded = _forecast(ml, daily_frame, interval=spec)
+
+    pd.testing.assert_frame_equal(banded[point.columns], point)
+    p05, p50, p95 = (banded[c].to_numpy() for c in spec.column_names())
+    assert (p05 <= p50).all() and (p50 <= p95).all()
+    assert (p95 > p05).any()
+    assert banded.attrs["interval"]["n_residuals"] == 60
+
+
+def test_interval_cung_seed_cung_ket_qua(ml, daily_frame):
+    a = _forecast(ml, daily_frame, IntervalSpec(paths=50, seed=7))
+    b = _forecast(ml, daily_frame, IntervalSpec(paths=50, seed=7))
+    c = _forecast(ml, daily_frame, IntervalSpec(paths=50, seed=8))
+    pd.testing.assert_frame_equal(a, b)
+    assert not np.array_equal(a["prediction_p10"].to_numpy(), c["prediction_p10"].to_numpy())
+
+
+def test_residual_bang_0_thi_moi_path_bang_du_bao_diem():
+    rng = np.random.default_rng(0)
+    hist = rng.normal(100, 5, size=40)
+    expected = ["weekday", "lag_1", "lag_7", "roll_mean_7"]
+    dates = pd.date_range("2024-01-01", periods=10)
+    predict = lambda X: X[:, 1] * 0.5 + X[:, 3] * 0.5  # noqa: E731
+    post = lambda step, raw: (raw, raw)  # noqa: E731
+
+    _, point = RecursiveForecastEngine(expected, [hist], dates).run(predict, post)
+    samples = simulate_paths(RecursiveForecastEngine(expected, [hist] * 5, dates), predict, post, np.zeros(3), seed=0)
+    np.testing.assert_allclose(samples, np.repeat(point, 5, axis=0))
+    np.testing.assert_allclose(path_quantiles(samples, (0.1, 0.9)), np.repeat(point, 2, axis=0))
+
+    with pytest.raises(ValueError):
+        simulate_paths(RecursiveForecastEngine(expected, [hist], dates), predict, post, np.array([np.nan]))
+
+
+@pytest.mark.parametrize("mode,scale", [("raw", 1.0), ("raw_scale", 2.5), ("expm1", 1.0), ("expm1_scale", 0.4)])
+def test_inverse_transform_nguoc_voi_transform(ml, mode, scale):
+    raw = np.array([0.0, 0.5, 3.0, 10.0])
+    np.testing.assert_allclose(inverse_transform(ml._transform_pred_array(raw, mode, scale), mode, scale), raw, atol=1e-12)
+
+
+def test_interval_spec_validate_va_ten_cot(ml, daily_frame):
+    assert IntervalSpec(paths=10, quantiles=(0.025, 0.5, 0.975)).column_names("pred_order") == (
+        "pred_order_p2.5", "pred_order_p50", "pred_order_p97.5",
+    )
+    assert not IntervalSpec().enabled
+    for bad in (dict(paths=-1), dict(paths=5, quantiles=(0.0, 0.5)), dict(paths=5, quantiles=()), dict(paths=5, backtest_days=0)):
+        with pytest.raises(ValueError):
+            IntervalSpec(**bad)
+    with pytest.raises(ValueError):
+        _forecast(ml, daily_frame, IntervalSpec(paths=config.ML_FORECAST_INTERVAL_MAX_PATHS + 1))
+
+
+def test_interval_cho_nhieu_target(ml, daily_frame):
+    spec = IntervalSpec(paths=30, seed=3)
+    res = ml.forecast_all_targets(
+        daily_frame, horizon=10, start_date="2024-06-01", holiday_mmdd=HOLIDAYS, holiday_window_days=3,
+        interval=spec, output="frame",
+    )
+    out = res["forecast"]
+    for name in ("order", "line"):
+        assert (out[f"pred_{name}_p10"] <= out[f"pred_{name}_p90"]).all()
+        assert res["debug"]["interval"][name]["paths"] == 30
+    point = ml.forecast_all_targets(
+        daily_frame, horizon=10, start_date="2024-06-01", holiday_mmdd=HOLIDAYS, holiday_window_days=3, output="frame",
+    )["forecast"]
+    pd.testing.assert_frame_equal(out[point.columns], point)
+
+
+def test_ten_cot_quantile_khong_trung():
+    names = IntervalSpec(paths=1, quantiles=(0.02, 0.025, 0.1, 0.5, 0.9)).column_names()
+    assert names == ("prediction_p2", "prediction_p2.5", "prediction_p10", "prediction_p50", "prediction_p90")
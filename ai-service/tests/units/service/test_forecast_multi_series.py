@@ -0,0 +1,89 @@
+# ai-service/tests/units/service/test_forecast_multi_series.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.model_store import model_store
+
+HOLIDAYS = ["01-01", "04-30", "09-02", "12-25"]
+TARGET = "daily_revenue_order"
+
+
+@pytest.fixture(scope="module")
+def long_frame(daily_frame):
+    """CSV long: 3 series đủ history (ngày cuối khác nhau) + 1 series quá ngắn."""
+    base = daily_frame[["date", "daily_revenue_order", "daily_revenue_line"]].tail(500)
+    parts = [
+        base[["date"]].assign(series_id="online", **{TARGET: base["daily_revenue_order"]}),
+        base[["date"]].assign(series_id="offline", **{TARGET: base["daily_revenue_line"]}).iloc[:-20],
+        base[["date"]].assign(series_id="kol", **{TARGET: base["daily_revenue_order"] * 0.3}).iloc[:-45],
+        base[["date"]].assign(series_id="moi", **{TARGET: 1000.0}).tail(5),
+    ]
+    return pd.concat(parts, ignore_index=True).sample(frac=1.0, random_state=0)
+
+
+def _rieng(ml, g, start_date, mode, scale):
+    preds, _, last_date, used_start = ml.forecast_recursive(
+        df_daily=g[["date", TARGET]].reset_index(drop=True),
+        model=model_store.get("xgb_daily_revenue_order"),
+        target_col=TARGET,
+        horizon_days=21,
+        start_date=start_date,
+        holiday_mmdd=HOLIDAYS,
+        holiday_window_days=3,
+        hist_days=200,
+        transform_mode=mode,
+        transform_scale=scale,
+    )
+    return preds, last_date, used_start
+
+
+@pytest.mark.parametrize("start_date,mode,scale", [(None, "raw", 1.0), ("2025-06-01", "raw_scale", 0.8)])
+def test_multi_series_giong_forecast_tung_series(ml, long_frame, start_date, mode, scale):
+    res = ml.forecast_multi_series(
+        long_frame, target=TARGET, horizon=21, start_date=start_date, holiday_mmdd=HOLIDAYS,
+        holiday_window_days=3, hist_days=200, transform_mode=mode, transform_scale=scale,
+    )
+    assert [s["series_id"] for s in res["series"]] == ["kol", "offline", "online"]
+    assert [s["series_id"] for s in res["skipped"]] == ["moi"]
+    assert res["debug"]["predict_calls"] == 21
+
+    for s in res["series"]:
+        g = long_frame[long_frame["series_id"] == s["series_id"]]
+        ref, last_date, used_start = _rieng(ml, g, start_date, mode, scale)
+        got = pd.DataFrame(s["forecast"])
+        assert s["start_date_used"] == str(used_start.date())
+        assert s["last_date_in_file"] == str(last_date.date())
+        assert list(pd.to_datetime(got["date"])) == list(ref["date"])
+        np.testing.assert_array_equal(got["prediction_raw"].to_numpy(), ref["prediction_raw"].to_numpy())
+        np.testing.assert_array_equal(got["prediction"].to_numpy(), ref["prediction"].to_numpy())
+
+
+def test_multi_series_frame_va_stream_cung_gia_tri(ml, long_frame):
+    kw = dict(target=TARGET, horizon=10, start_date=None, holiday_mmdd=HOLIDAYS, holiday_window_days=3, hist_days=200)
+    grouped = ml.forecast_multi_series(long_frame, **kw)
+    frame = ml.forecast_multi_series(long_frame, output="frame", **kw)["forecast"]
+    debug, rows = ml.stream_multi_series(long_frame, **kw)
+    streamed = pd.DataFrame(list(rows))
+
+    flat = pd.concat(
+        [pd.DataFrame(s["forecast"]).assign(series_id=s["series_id"]) for s in grouped["series"]], ignore_index=True
+    )
+    key = ["series_id", "date"]
+    for other in (frame, streamed):
+        other = other.assign(date=pd.to_datetime(other["date"])).sort_values(key).reset_index(drop=True)
+        ref = flat.assign(date=pd.to_datetime(flat["date"])).sort_values(key).reset_index(drop=True)
+        np.testing.assert_array_equal(other["prediction"].to_numpy(), ref["prediction"].to_numpy())
+    assert debug["skipped"] == grouped["skipped"]
+
+
+def test_multi_series_loi_input(ml, long_frame):
+    kw = dict(horizon=5, start_date=None, holiday_mmdd=[], holiday_window_days=0)
+    with pytest.raises(ValueError):
+        ml.forecast_multi_series(long_frame, target=TARGET, series_col="store", **kw)
+    with pytest.raises(ValueError):
+        ml.forecast_multi_series(long_frame.rename(columns={TARGET: "gmv"}), target="gmv", **kw)
+    with pytest.raises(ValueError):
+        ml.forecast_multi_series(long_frame[long_frame["series_id"] == "moi"], target=TARGET, **kw)
@@ -0,0 +1,65 @@
+# ai-service/tests/units/service/test_forecast_output.py
+from __future__ import annotations
+
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import forecast_output as fo
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "date": pd.date_range("2026-01-01", periods=4, freq="D"),
+        "pred_order_raw": np.array([1.5, -2.0, 3.25, 4.0]),
+        "pred_order": np.array([1.5, 0.0, 3.25, 4.0]),
+    })
+
+
+def test_columnar_giong_records(frame):
+    cols = fo.frame_to_columnar(frame)
+    assert cols["date"] == ["2026-01-01T00:00:00", "2026-01-02T00:00:00", "2026-01-03T00:00:00", "2026-01-04T00:00:00"]
+    records = frame.to_dict(orient="records")
+    rebuilt = [dict(zip(cols, vals)) for vals in zip(*cols.values())]
+    for a, b in zip(rebuilt, records):
+        assert a == {**b, "date": b["date"].isoformat()}
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_arrow_parquet_round_trip(frame, fmt):
+    debug = {"start_date_used": "2026-01-01", "expected_features_order": ["lag_1"]}
+    data = fo.frame_to_bytes(frame, fmt, debug)
+    if fmt == "arrow":
+        table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(io.BytesIO(data))
+    pd.testing.assert_frame_equal(table.to_pandas(), frame, check_dtype=False)
+    assert json.loads(table.schema.metadata[b"debug"]) == debug
+
+
+def test_ndjson_lines_va_take_chunk():
+    rows = iter([{"date": pd.Timestamp("2026-01-01"), "v": np.float64(1.5)}, {"date": "2026-01-02", "v": 2}])
+    lines = fo.ndjson_lines({"n": np.int64(2)}, rows)
+    first = fo.take_chunk(lines, max_lines=2)
+    assert first.decode().splitlines() == ['{"debug":{"n":2}}', '{"date":"2026-01-01T00:00:00","v":1.5}']
+    assert fo.take_chunk(lines, max_lines=2) == b'{"date":"2026-01-02","v":2}\n'
+    assert fo.take_chunk(lines) is None
+
+
+def test_normalize_output_format(monkeypatch):
+    assert fo.normalize_output_format(None) == "records"
+    assert fo.normalize_output_format(" Parquet ") == "parquet"
+    with pytest.raises(ValueError):
+        fo.normalize_output_format("xml")
+    monkeypatch.setattr(fo, "_ARROW_AVAILABLE", False)
+    with pytest.raises(fo.OutputFormatUnavailable):
+        fo.normalize_output_format("arrow")
+    assert fo.normalize_output_format("ndjson") == "ndjson"
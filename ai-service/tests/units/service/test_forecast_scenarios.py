@@ -0,0 +1,87 @@
+# ai-service/tests/units/service/test_forecast_scenarios.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.forecast_dataset import DEFAULT_FORECAST_TARGETS
+from app.services.forecast_scenarios import ForecastScenario, scenario_summary
+
+HOLIDAYS = ["01-01", "04-30", "09-02"]
+
+SCENARIOS = [
+    ForecastScenario("baseline"),
+    ForecastScenario("tet", holiday_mmdd=("01-25", "01-26"), holiday_window_days=5),
+    ForecastScenario("he_2024", start_date="2024-06-01", hist_days=60,
+                     transforms={"order": ("raw_scale", 1.1), "line": ("expm1_scale", 0.001)}),
+    ForecastScenario("khong_clip", start_date="2023-11-15", clip_negative_to_zero=False,
+                     append_transformed_to_history=False, transforms={"order": ("raw_scale", -1.0)}),
+]
+
+
+def _chay_rieng(ml, daily_frame, sc: ForecastScenario, horizon: int):
+    order_mode, order_scale = sc.transform_for("order")
+    line_mode, line_scale = sc.transform_for("line")
+    return ml.forecast_all_targets(
+        daily_frame,
+        horizon=horizon,
+        start_date=sc.start_date,
+        holiday_mmdd=list(sc.holiday_mmdd) if sc.holiday_mmdd is not None else HOLIDAYS,
+        holiday_window_days=sc.holiday_window_days if sc.holiday_window_days is not None else 3,
+        hist_days=sc.hist_days if sc.hist_days is not None else 365,
+        clip_negative_to_zero=sc.clip_negative_to_zero,
+        append_transformed_to_history=sc.append_transformed_to_history,
+        order_transform_mode=order_mode,
+        order_transform_scale=order_scale,
+        line_transform_mode=line_mode,
+        line_transform_scale=line_scale,
+        output="frame",
+    )["forecast"]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_moi_kich_ban_giong_chay_rieng(ml, daily_frame, max_workers):
+    res = ml.forecast_scenarios(
+        daily_frame, scenarios=SCENARIOS, targets=list(DEFAULT_FORECAST_TARGETS), horizon=25,
+        holiday_mmdd=HOLIDAYS, holiday_window_days=3, max_workers=max_workers, output="frame",
+    )
+    long = res["forecast"]
+    for sc in SCENARIOS:
+        got = long[long["scenario"] == sc.name].drop(columns="scenario").reset_index(drop=True)
+        ref = _chay_rieng(ml, daily_frame, sc, 25)
+        assert list(got["date"]) == list(ref["date"])
+        for col in ("pred_order_raw", "pred_order", "pred_line_raw", "pred_line"):
+            np.testing.assert_allclose(got[col].to_numpy(), ref[col].to_numpy(), rtol=1e-12, err_msg=f"{sc.name}/{col}")
+
+    assert [s["start_date_used"] for s in res["debug"]["scenarios"]][2:] == ["2024-06-01", "2023-11-15"]
+    assert (long.loc[long["scenario"] == "khong_clip", "pred_order"] < 0).all()
+
+
+def test_output_records_va_summary(ml, daily_frame):
+    res = ml.forecast_scenarios(
+        daily_frame, scenarios=SCENARIOS[:2], targets=list(DEFAULT_FORECAST_TARGETS), horizon=10,
+        holiday_mmdd=HOLIDAYS, holiday_window_days=3,
+    )
+    assert list(res["scenarios"]) == ["baseline", "tet"]
+    base = pd.DataFrame(res["scenarios"]["baseline"])
+    assert res["summary"][0]["total_order"] == pytest.approx(base["pred_order"].sum())
+    assert res["summary"][0]["delta_vs_baseline_pct_order"] == 0.0
+
+
+def test_scenario_summary_delta():
+    frames = {
+        "a": pd.DataFrame({"date": pd.date_range("2025-01-01", periods=2), "pred_x": [1.0, 3.0]}),
+        "b": pd.DataFrame({"date": pd.date_range("2025-01-01", periods=2), "pred_x": [2.0, 3.0]}),
+    }
+    rows = scenario_summary(frames, ["x"])
+    assert rows[1]["delta_vs_baseline_pct_x"] == pytest.approx(25.0)
+    assert rows[1]["min_x"] == 2.0 and rows[1]["end_date"] == "2025-01-02"
+
+
+def test_ten_scenario_trung(ml, daily_frame):
+    with pytest.raises(ValueError):
+        ml.forecast_scenarios(
+            daily_frame, scenarios=[ForecastScenario("a"), ForecastScenario("a")],
+            targets=list(DEFAULT_FORECAST_TARGETS), horizon=5, holiday_mmdd=[], holiday_window_days=0,
+        )
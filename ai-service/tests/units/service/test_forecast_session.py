@@ -0,0 +1,49 @@
+# ai-service/tests/units/service/test_forecast_session.py
+from __future__ import annotations
+
+import pytest
+
+from app.services.forecast_session import ForecastSessionStore, SessionNotFound
+
+HOLIDAYS = ["01-01", "04-30", "09-02"]
+KW = dict(horizon=20, start_date=None, holiday_mmdd=HOLIDAYS, holiday_window_days=3, hist_days=200)
+
+
+@pytest.fixture
+def store(ml, tmp_path):
+    return ForecastSessionStore(prepare=ml.prepare_daily_dataset, persist_dir=str(tmp_path), max_sessions=2)
+
+
+def test_session_forecast_giong_upload_ca_csv(ml, store, daily_frame):
+    s = store.register(daily_frame, session_id="s1", hist_days=200, holiday_mmdd=HOLIDAYS, holiday_window_days=3)
+    assert len(s.prepared) == 200
+    assert ml.forecast_all_targets(s.prepared, **KW) == ml.forecast_all_targets(daily_frame, **KW)
+
+
+def test_append_giong_upload_lai_csv_day_du(ml, store, daily_frame):
+    head, tail = daily_frame.iloc[:-30], daily_frame.iloc[-30:]
+    store.register(head, session_id="s2", hist_days=200, holiday_mmdd=HOLIDAYS, holiday_window_days=3)
+    s = store.append("s2", tail.iloc[:20])
+    s = store.append("s2", tail.iloc[15:])  # 5 ngày gửi lại -> ghi đè, không nhân đôi
+    assert len(s.prepared) == 200
+    assert s.prepared.dates.is_unique
+    assert ml.forecast_all_targets(s.prepared, **KW) == ml.forecast_all_targets(daily_frame, **KW)
+
+
+def test_session_doc_lai_tu_disk_va_xoa(ml, store, daily_frame, tmp_path):
+    store.register(daily_frame, session_id="s3", hist_days=200, holiday_mmdd=HOLIDAYS, holiday_window_days=3)
+    fresh = ForecastSessionStore(prepare=ml.prepare_daily_dataset, persist_dir=str(tmp_path))
+    s = fresh.get("s3")
+    assert s.holiday_mmdd == HOLIDAYS
+    assert ml.forecast_all_targets(s.prepared, **KW) == ml.forecast_all_targets(daily_frame, **KW)
+
+    assert fresh.delete("s3") is True
+    with pytest.raises(SessionNotFound):
+        fresh.get("s3")
+
+
+def test_session_id_va_hist_days_khong_hop_le(store, daily_frame):
+    with pytest.raises(ValueError):
+        store.register(daily_frame, session_id="../x")
+    with pytest.raises(ValueError):
+        store.register(daily_frame, session_id="ok", hist_days=5)
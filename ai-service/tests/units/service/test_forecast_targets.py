@@ -0,0 +1,99 @@
+# ai-service/tests/units/service/test_forecast_targets.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.forecast_dataset import ForecastTarget
+from app.services.model_store import model_store
+
+HOLIDAYS = ["01-01", "04-30", "09-02", "12-25"]
+COMMON = dict(horizon=40, start_date=None, holiday_mmdd=HOLIDAYS, holiday_window_days=3, hist_days=365)
+
+
+def _rieng(ml, df, target_col, model_name, mode, scale, start_date=None, append=True):
+    preds, _, _, _ = ml.forecast_recursive(
+        df_daily=df,
+        model=model_store.get(model_name),
+        target_col=target_col,
+        horizon_days=COMMON["horizon"],
+        start_date=start_date,
+        holiday_mmdd=HOLIDAYS,
+        holiday_window_days=3,
+        hist_days=365,
+        transform_mode=mode,
+        transform_scale=scale,
+        append_transformed_to_history=append,
+    )
+    return preds
+
+
+@pytest.mark.parametrize("append", [True, False])
+def test_all_targets_song_song_giong_chay_rieng(ml, daily_frame, append):
+    res = ml.forecast_all_targets(
+        daily_frame,
+        **COMMON,
+        order_transform_mode="raw_scale",
+        order_transform_scale=1.2,
+        line_transform_mode="raw",
+        append_transformed_to_history=append,
+        output="frame",
+    )
+    out = res["forecast"]
+    order = _rieng(ml, daily_frame, "daily_revenue_order", "xgb_daily_revenue_order", "raw_scale", 1.2, append=append)
+    # line dùng start_date của order (như ALL cũ)
+    line = _rieng(ml, daily_frame, "daily_revenue_line", "xgb_daily_revenue_line", "raw", 1.0,
+                  start_date=res["debug"]["start_date_used"], append=append)
+
+    assert list(out["date"]) == list(order["date"])
+    np.testing.assert_array_equal(out["pred_order"].to_numpy(), order["prediction"].to_numpy())
+    np.testing.assert_array_equal(out["pred_order_raw"].to_numpy(), order["prediction_raw"].to_numpy())
+    np.testing.assert_array_equal(out["pred_line"].to_numpy(), line["prediction"].to_numpy())
+    np.testing.assert_array_equal(out["pred_line_raw"].to_numpy(), line["prediction_raw"].to_numpy())
+
+
+def test_extra_targets_va_so_worker_khong_doi_ket_qua(ml, daily_frame):
+    targets = [
+        ForecastTarget("order", "daily_revenue_order", "xgb_daily_revenue_order"),
+        ForecastTarget("line", "daily_revenue_line", "xgb_daily_revenue_line"),
+        ForecastTarget("order_x2", "daily_revenue_order", "xgb_daily_revenue_order", "raw_scale", 2.0),
+    ]
+    seq = ml.forecast_targets(daily_frame, targets=targets, max_workers=1, output="frame", **COMMON)["forecast"]
+    par = ml.forecast_targets(daily_frame, targets=targets, max_workers=3, output="frame", **COMMON)["forecast"]
+    pd.testing.assert_frame_equal(seq, par)
+
+    extra = ml.forecast_all_targets(daily_frame, extra_targets=targets[2:], output="frame", **COMMON)["forecast"]
+    pd.testing.assert_frame_equal(extra, seq)
+    # ngày đầu cùng history -> raw như nhau, output nhân scale (các ngày sau history đã khác)
+    assert seq["pred_order_x2_raw"].iloc[0] == seq["pred_order_raw"].iloc[0]
+    assert seq["pred_order_x2"].iloc[0] == pytest.approx(2.0 * seq["pred_order"].iloc[0])
+
+
+def test_stream_all_targets_giong_ban_frame(ml, daily_frame):
+    res = ml.forecast_all_targets(daily_frame, **COMMON)
+    debug, rows = ml.stream_all_targets(daily_frame, **COMMON)
+    rows = list(rows)
+    assert debug == res["debug"]
+    assert [pd.Timestamp(r["date"]) for r in rows] == [pd.Timestamp(r["date"]) for r in res["forecast"]]
+    for a, b in zip(rows, res["forecast"]):
+        for k in ("pred_order", "pred_order_raw", "pred_line", "pred_line_raw"):
+            assert a[k] == pytest.approx(b[k], rel=0, abs=0)
+
+
+def test_prepared_dataset_dung_chung_va_khong_sua_df(ml, daily_frame):
+    before = daily_frame.copy()
+    prepared = ml.prepare_daily_dataset(daily_frame, HOLIDAYS, 3)
+    a = ml.forecast_all_targets(prepared, **COMMON)
+    b = ml.forecast_all_targets(daily_frame, **COMMON)
+    assert a == b
+    assert prepared.series("daily_revenue_order") is prepared.series("daily_revenue_order")
+    pd.testing.assert_frame_equal(daily_frame, before)
+
+
+def test_target_trung_ten_hoac_thieu_cot(ml, daily_frame):
+    t = ForecastTarget("order", "daily_revenue_order", "xgb_daily_revenue_order")
+    with pytest.raises(ValueError):
+        ml.forecast_targets(daily_frame, targets=[t, t], **COMMON)
+    with pytest.raises(ValueError):
+        ml.forecast_targets(daily_frame, targets=[ForecastTarget("x", "missing_col", "xgb_daily_revenue_order")], **COMMON)
@@ -0,0 +1,75 @@
+# ai-service/tests/units/service/test_holiday_calendar.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.holiday_calendar import get_holiday_calendar, holiday_flags
+
+HOLIDAYS = ["01-01", "02-14", "04-30", "09-02", "12-25", "02-29"]
+
+
+def _flag_cung_nam(d: pd.Timestamp, holiday_mmdd, window_days: int) -> int:
+    """Vòng lặp theo ngày trước đây (_build_holiday_flag): chỉ xét ngày lễ của cùng năm."""
+    for mmdd in holiday_mmdd:
+        try:
+            hd = pd.Timestamp(f"{d.year}-{mmdd}")
+        except Exception:
+            continue
+        if abs((d - hd).days) <= window_days:
+            return 1
+    return 0
+
+
+def _flag_dung(d: pd.Timestamp, holiday_mmdd, window_days: int) -> int:
+    """Tham chiếu đúng: xét ngày lễ của năm trước / cùng năm / năm sau."""
+    for yyyy in (d.year - 1, d.year, d.year + 1):
+        for mmdd in holiday_mmdd:
+            try:
+                hd = pd.Timestamp(f"{yyyy}-{mmdd}")
+            except Exception:
+                continue
+            if abs((d - hd).days) <= window_days:
+                return 1
+    return 0
+
+
+@pytest.mark.parametrize("window", [0, 3, 7])
+def test_holiday_flags_giong_vong_lap_theo_ngay(window):
+    dates = pd.date_range("2023-01-01", "2025-12-31", freq="D")
+    got = holiday_flags(dates, HOLIDAYS, window)
+
+    np.testing.assert_array_equal(got, [_flag_dung(d, HOLIDAYS, window) for d in dates])
+
+    # Ngoài các cửa sổ vắt qua năm, kết quả trùng vòng lặp cũ
+    old = np.array([_flag_cung_nam(d, HOLIDAYS, window) for d in dates])
+    diff = dates[got != old]
+    assert all((d.month == 12 and d.day > 31 - window) or (d.month == 1 and d.day <= window) for d in diff)
+
+
+def test_cua_so_vat_qua_nam():
+    dates = pd.date_range("2024-12-26", "2025-01-05", freq="D")
+    # 01-01 ±3: 2024-12-29..2025-01-04; 12-30 ±3 của năm 2024 phủ tới 2025-01-02
+    assert holiday_flags(dates, ["01-01"], 3).tolist() == [0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 0]
+    dates = pd.date_range("2025-01-01", "2025-01-05", freq="D")
+    assert holiday_flags(dates, ["12-30"], 3).tolist() == [1, 1, 0, 0, 0]
+
+
+def test_02_29_chi_co_o_nam_nhuan():
+    assert holiday_flags(["2024-02-29", "2025-02-28", "2025-03-01"], ["02-29"], 0).tolist() == [1, 0, 0]
+
+
+def test_khong_co_ngay_le_tra_ve_0():
+    assert holiday_flags(pd.date_range("2024-01-01", periods=3), [], 3).tolist() == [0, 0, 0]
+    assert holiday_flags(pd.date_range("2024-01-01", periods=3), [" ", ""], 3).tolist() == [0, 0, 0]
+
+
+def test_calendar_duoc_cache_va_chan_ngoai_khoang_nam():
+    a = get_holiday_calendar(("01-01",), 3, 2024, 2025)
+    assert get_holiday_calendar(("01-01",), 3, 2024, 2025) is a
+    assert a.covers(pd.DatetimeIndex(["2024-06-01", "2025-12-31"]))
+    assert not a.covers(pd.DatetimeIndex(["2026-01-01"]))
+    with pytest.raises(ValueError):
+        a.lookup(["2026-01-01"])
+    assert not a.flags.flags.writeable
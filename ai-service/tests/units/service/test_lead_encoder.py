@@ -0,0 +1,83 @@
+# ai-service/tests/units/service/test_lead_encoder.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.lead_encoder import LEAD_CATEGORICAL_FIELDS, LeadOneHotEncoder
+from app.services.model_store import model_store
+
+
+def _safe_float(v: Any, default: float = 0.0) -> float:
+    try:
+        if v is None:
+            return default
+        return float(v)
+    except Exception:
+        return default
+
+
+def _onehot_frame_per_row(
+    payload: Dict[str, Any],
+    feature_columns: List[str],
+    categorical_fields: Tuple[str, ...] = LEAD_CATEGORICAL_FIELDS,
+) -> pd.DataFrame:
+    """Bản tham chiếu: cách encode từng lead trước khi có LeadOneHotEncoder (DataFrame 1 dòng + .at)."""
+    X = pd.DataFrame([[0.0] * len(feature_columns)], columns=feature_columns)
+
+    for col in feature_columns:
+        if col in payload:
+            X.at[0, col] = _safe_float(payload.get(col), 0.0)
+
+    for field in categorical_fields:
+        val = payload.get(field)
+        if val is None:
+            continue
+        val_str = str(val).strip()
+        if not val_str:
+            continue
+        for c in [f"{field}_{val_str}", f"{field}_{val_str.lower()}"]:
+            if c in X.columns:
+                X.at[0, c] = 1.0
+    return X
+
+
+SYNTHETIC_COLUMNS = [
+    "lead_score",
+    "product_price",
+    "source_Referral",
+    "source_referral",
+    "source_Website",
+    "priority_high",
+    "priority_HIGH",
+    "status_new",
+    "campaign_type_Retarget",
+]
+
+
+@pytest.mark.parametrize("columns", ["model", "synthetic"])
+def test_encoder_giong_onehot_tung_dong(lead_payloads, columns):
+    cols = list(model_store.get("lead_feature_columns_onehot")) if columns == "model" else SYNTHETIC_COLUMNS
+    payloads = lead_payloads + [
+        {"source_Website": 5, "source": "Website"},  # one-hot ghi đè giá trị numeric cùng cột
+        {"priority": " HIGH ", "campaign_type": "Retarget"},
+        {},
+    ]
+    enc = LeadOneHotEncoder(cols)
+
+    got = enc.encode_frame(payloads)
+    ref = pd.concat([_onehot_frame_per_row(p, cols) for p in payloads], ignore_index=True)
+    pd.testing.assert_frame_equal(got, ref.astype(float))
+
+
+def test_encode_out_buffer_bi_ghi_de(lead_payloads):
+    enc = LeadOneHotEncoder(SYNTHETIC_COLUMNS)
+    out = np.full((len(lead_payloads), enc.n_features), 7.0)
+    X = enc.encode(lead_payloads, out=out)
+    assert X is out
+    np.testing.assert_array_equal(X, enc.encode(lead_payloads))
+    with pytest.raises(ValueError):
+        enc.encode(lead_payloads, out=np.zeros((1, enc.n_features)))
@@ -0,0 +1,94 @@
+# ai-service/tests/units/service/test_micro_batcher.py
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.micro_batcher import MicroBatcher
+
+
+def _gather(*aws):
+    async def main():
+        return await asyncio.gather(*aws, return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_gom_request_cung_key_thanh_1_batch():
+    calls = []
+
+    def fn(X):
+        calls.append(len(X))
+        return X.sum(axis=1), X[:, 0] * 10
+
+    mb = MicroBatcher(window_ms=5, max_rows=100)
+    xs = [np.array([[i, i + 1.0]]) for i in range(8)]
+    out = _gather(*(mb.submit("k", x, fn) for x in xs))
+
+    assert calls == [8]
+    for i, (s, t) in enumerate(out):
+        assert s.tolist() == [2 * i + 1.0]
+        assert t.tolist() == [10.0 * i]
+    assert mb.stats()["batches"] == 1 and mb.stats()["requests"] == 8
+
+
+def test_max_rows_flush_som_va_key_khac_khong_gom():
+    calls = []
+
+    def fn(X):
+        calls.append(len(X))
+        return X[:, 0]
+
+    mb = MicroBatcher(window_ms=50, max_rows=3)
+    out = _gather(
+        *(mb.submit("a", np.array([[float(i)]]), fn) for i in range(5)),
+        mb.submit("b", np.array([[9.0]]), fn),
+    )
+    assert sorted(calls) == [1, 2, 3]
+    assert [o.tolist() for o in out] == [[0.0], [1.0], [2.0], [3.0], [4.0], [9.0]]
+
+
+def test_dataframe_concat_va_loi_1_request_khong_lan():
+    def fn(X: pd.DataFrame):
+        if (X["v"] < 0).any():
+            raise ValueError("bad row")
+        return X["v"].to_numpy() * 2
+
+    mb = MicroBatcher(window_ms=5, max_rows=100)
+    out = _gather(
+        mb.submit("k", pd.DataFrame({"v": [1.0]}), fn),
+        mb.submit("k", pd.DataFrame({"v": [-1.0]}), fn),
+        mb.submit("k", pd.DataFrame({"v": [3.0]}), fn),
+    )
+    assert out[0].tolist() == [2.0]
+    assert isinstance(out[1], ValueError)
+    assert out[2].tolist() == [6.0]
+    assert mb.stats()["fallbacks"] == 1
+
+
+def test_tat_micro_batch_chay_thang():
+    calls = []
+
+    def fn(X):
+        calls.append(len(X))
+        return X[:, 0]
+
+    mb = MicroBatcher(enabled=False)
+    _gather(*(mb.submit("k", np.array([[1.0]]), fn) for _ in range(3)))
+    assert calls == [1, 1, 1]
+
+
+def test_apredict_lead_va_churn_giong_ban_sync(ml, lead_payloads, churn_frame):
+    leads = lead_payloads[:12]
+    rows = churn_frame.drop(columns=["customer_id", "snapshot_date"]).head(12).to_dict(orient="records")
+    out = _gather(*(ml.apredict_lead(x) for x in leads), *(ml.apredict_churn(x) for x in rows))
+
+    for lead, got in zip(leads, out[:12]):
+        one = ml.predict_lead(lead)
+        assert got["conversion_prob"] == pytest.approx(one["conversion_prob"], abs=1e-12)
+        assert got["predicted_value"] == pytest.approx(one["predicted_value"], abs=1e-9)
+    for row, got in zip(rows, out[12:]):
+        assert got["churn_prob"] == pytest.approx(ml.predict_churn(row)["churn_prob"], abs=1e-12)
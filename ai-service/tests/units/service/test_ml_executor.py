@@ -0,0 +1,68 @@
+# ai-service/tests/units/service/test_ml_executor.py
+from __future__ import annotations
+
+import asyncio
+import operator
+import threading
+
+import pytest
+
+from app.services.ml_executor import ExecutorSaturated, InferenceExecutor
+
+
+@pytest.fixture
+def executor():
+    ex = InferenceExecutor(thread_workers=2, heavy_thread_workers=1, max_queue=2)
+    yield ex
+    ex.shutdown(wait=True)
+
+
+def test_run_chay_ngoai_event_loop(executor):
+    async def main():
+        loop_thread = threading.current_thread().name
+        name = await executor.run(lambda: threading.current_thread().name)
+        heavy = await executor.run_heavy(lambda: threading.current_thread().name)
+        return loop_thread, name, heavy
+
+    loop_thread, name, heavy = asyncio.run(main())
+    assert name.startswith("ml-infer") and name != loop_thread
+    assert heavy.startswith("ml-heavy")
+    stats = executor.stats()
+    assert stats["thread"]["completed"] == 1 and stats["heavy_thread"]["completed"] == 1
+    assert stats["process"]["enabled"] is False
+
+
+def test_hang_doi_day_bao_saturated(executor):
+    gate = threading.Event()
+
+    async def main():
+        jobs = [asyncio.ensure_future(executor.run(gate.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(lambda: None)
+        gate.set()
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    stats = executor.stats()["thread"]
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["inflight"] == 0
+
+
+def test_loi_duoc_dem_va_raise_lai(executor):
+    async def main():
+        await executor.run(operator.truediv, 1, 0)
+
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(main())
+    assert executor.stats()["thread"]["failed"] == 1
+
+
+def test_run_heavy_process_pool():
+    ex = InferenceExecutor(thread_workers=1, process_workers=1, max_queue=4)
+    try:
+        out = asyncio.run(ex.run_heavy(operator.add, 2, 3))
+    finally:
+        ex.shutdown(wait=True)
+    assert out == 5
+    assert ex.stats()["process"]["completed"] == 1 and ex.stats()["process"]["enabled"] is True
+
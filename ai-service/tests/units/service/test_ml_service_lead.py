@@ -0,0 +1,20 @@
+# ai-service/tests/units/service/test_ml_service_lead.py
+from __future__ import annotations
+
+import pytest
+
+
+def test_predict_lead_batch_giong_predict_lead_tung_dong(ml, lead_payloads):
+    batch = ml.predict_lead_batch(lead_payloads)
+    assert len(batch) == len(lead_payloads)
+    for lead, got in zip(lead_payloads, batch):
+        one = ml.predict_lead(lead)
+        assert got["conversion_prob"] == pytest.approx(one["conversion_prob"], abs=1e-12)
+        assert got["raw_score"] == one["raw_score"]
+        assert got["predicted_value"] == pytest.approx(one["predicted_value"], abs=1e-9)
+        assert got["currency"] == one["currency"]
+        assert got["models"] == one["models"]
+
+
+def test_predict_lead_batch_rong(ml):
+    assert ml.predict_lead_batch([]) == []
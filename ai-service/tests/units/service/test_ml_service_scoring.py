@@ -0,0 +1,59 @@
+# ai-service/tests/units/service/test_ml_service_scoring.py
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression, LogisticRegression
+
+from app.services.model_store import model_store
+
+
+@pytest.fixture(scope="module")
+def churn_rows(churn_frame):
+    return churn_frame.head(300)
+
+
+@pytest.fixture(scope="module")
+def logreg():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.5, size=200) > 0).astype(int)
+    return LogisticRegression().fit(X, y), X
+
+
+def test_proba_mode_raw_bang_predict_khong_goi_lai_model(ml, churn_rows):
+    """raw_score suy từ argmax(predict_proba) phải bằng model.predict() (cách cũ chạy model 2 lần)."""
+    model = model_store.get("churn_model")
+    X = churn_rows.reindex(columns=ml.churn_input_columns())
+    proba, raw = ml._predict_prob_and_score_batch(model, X, "proba")
+    np.testing.assert_allclose(proba, model.predict_proba(X)[:, 1])
+    np.testing.assert_array_equal(raw, np.asarray(model.predict(X)).astype(float))
+
+    proba2, raw2 = ml._predict_prob_and_score_batch(model, X, "predict_both")
+    np.testing.assert_array_equal(proba, proba2)
+    np.testing.assert_array_equal(raw, raw2)
+
+
+def test_margin_mode_sigmoid_decision_function(ml, logreg):
+    model, X = logreg
+    proba, raw = ml._predict_prob_and_score_batch(model, X, "margin")
+    np.testing.assert_allclose(raw, model.decision_function(X))
+    np.testing.assert_allclose(proba, model.predict_proba(X)[:, 1], rtol=1e-9)
+
+
+def test_regressor_raw_la_predict(ml):
+    X = np.arange(10, dtype=float).reshape(-1, 1)
+    model = LinearRegression().fit(X, X[:, 0] * 0.1 - 0.5)
+    proba, raw = ml._predict_prob_and_score_batch(model, X)
+    np.testing.assert_allclose(raw, model.predict(X))
+    np.testing.assert_allclose(proba, 1.0 / (1.0 + np.exp(-raw)))
+
+
+def test_single_row_khop_batch(ml, churn_rows):
+    model = model_store.get("churn_model")
+    X = churn_rows.reindex(columns=ml.churn_input_columns())
+    proba, raw = ml._predict_prob_and_score_batch(model, X)
+    for i in (0, 17, 299):
+        p, r = ml._predict_prob_and_score(model, X.iloc[[i]])
+        assert p == pytest.approx(proba[i], abs=1e-12)
+        assert r == raw[i]
@@ -0,0 +1,248 @@
+# ai-service/tests/units/service/test_model_store.py
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pytest
+
+from app.services import model_store as model_store_mod
+from app.services.model_store import ModelStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ModelStore(base_dir=tmp_path)
+    s.retry_base_secs = 0.05
+    s.retry_max_secs = 0.2
+    return s
+
+
+def test_load_single_flight(store, tmp_path, monkeypatch):
+    joblib.dump({"w": np.arange(10)}, tmp_path / "m.joblib")
+    calls = []
+    real_load = joblib.load
+
+    def slow_load(*args, **kwargs):
+        calls.append(args[0])
+        time.sleep(0.1)
+        return real_load(*args, **kwargs)
+
+    monkeypatch.setattr(model_store_mod.joblib, "load", slow_load)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        objs = list(pool.map(lambda _: store.get("m"), range(8)))
+
+    assert len(calls) == 1
+    assert all(o is objs[0] for o in objs)
+    assert store.cache_stats()["misses"] == 1
+
+
+def test_loi_load_cache_theo_backoff_roi_thu_lai(store, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        store.get("later")
+    joblib.dump([1, 2], tmp_path / "later.joblib")
+    # còn trong backoff -> trả lỗi đã cache, không đọc disk
+    with pytest.raises(FileNotFoundError):
+        store.get("later")
+    time.sleep(0.06)
+    assert store.get("later") == [1, 2]
+    assert store.cache_stats()["load_failures"] == 0  # load thành công xoá lỗi
+
+
+def test_bang_loi_gioi_han_so_key(store):
+    store.max_failures = 5
+    for i in range(50):
+        with pytest.raises(FileNotFoundError):
+            store.get("missing", version=f"v{i}")
+    assert store.cache_stats()["load_failures"] == 5
+    # giữ các key mới nhất
+    assert list(store._failures) == [f"missing:v{i}" for i in range(45, 50)]
+
+
+def test_loi_qua_han_bi_don(store):
+    for i in range(3):
+        with pytest.raises(FileNotFoundError):
+            store.get("gone", version=f"v{i}")
+    # hết backoff + retry_max_secs -> lần lỗi kế tiếp dọn các key cũ
+    time.sleep(store.retry_base_secs + store.retry_max_secs + 0.02)
+    with pytest.raises(FileNotFoundError):
+        store.get("other")
+    assert list(store._failures) == ["other:default"]
+
+
+def test_backoff_tang_dan(store):
+    for _ in range(3):
+        with pytest.raises(FileNotFoundError):
+            store.get("x")
+        f = store._failures["x:default"]
+        time.sleep(max(0.0, f.retry_at - time.monotonic()) + 0.005)
+    assert store._failures["x:default"].failures == 3
+
+
+def test_aget_khong_block_event_loop(store, tmp_path):
+    import asyncio
+
+    joblib.dump("ok", tmp_path / "a.joblib")
+    main = threading.get_ident()
+    seen = []
+    real = store._load_artifact
+
+    def spy(path):
+        seen.append(threading.get_ident())
+        return real(path)
+
+    store._load_artifact = spy
+    assert asyncio.run(store.aget("a")) == "ok"
+    assert seen and seen[0] != main
+
+
+def test_warmup_bao_cao_tung_model(store, tmp_path):
+    joblib.dump({"ok": 1}, tmp_path / "good.joblib")
+    (tmp_path / "broken.joblib").write_bytes(b"not a joblib file")
+    store.alias = {"good": "good.joblib", "broken": "broken.joblib", "absent": "absent.joblib"}
+    warmed = []
+
+    report = store.warmup(max_workers=3, warm_fn=lambda name, obj: warmed.append(name))
+
+    assert report["good"]["status"] == "loaded" and report["good"]["warm"] == "ok"
+    assert report["broken"]["status"] == "failed" and report["broken"]["ok"] is False
+    assert report["absent"]["status"] == "missing"
+    assert warmed == ["good"]
+    full = store.warmup_report()
+    assert full["state"] == "done" and full["ready"] is False and full["failed"] == ["broken"]
+
+
+def test_warmup_predict_chay_duoc_tren_model_that(ml):
+    from app.services.model_store import model_store
+
+    names = [n for n in model_store.alias if (model_store.base_dir / model_store.alias[n]).exists()]
+    store = ModelStore(base_dir=model_store.base_dir)
+    report = store.warmup(names, max_workers=4, warm_fn=ml.warmup_predict)
+    assert names
+    for name in names:
+        assert report[name]["status"] == "loaded", report[name]
+        assert report[name]["warm"] == "ok", (name, report[name]["warm"])
+
+
+def _dump_model(path, n_floats):
+    joblib.dump({"w": np.zeros(n_floats)}, path)
+
+
+def test_lru_evict_theo_budget_giu_version_mac_dinh(store, tmp_path):
+    # mỗi version ~80KB; budget ~200KB -> chỉ đủ default + 1 version phụ
+    _dump_model(tmp_path / "m.joblib", 10_000)
+    for v in ("a", "b", "c"):
+        _dump_model(tmp_path / f"m__{v}.joblib", 10_000)
+    store.budget_bytes = 200_000
+
+    default = store.get("m")
+    store.get("m", "a")
+    store.get_derived("m", "a", "tag", lambda obj: "derived-a")
+    store.get("m", "b")
+    stats = store.cache_stats()
+    assert stats["evictions"] == 1
+    assert stats["lru_order"] == ["m:default", "m:b"]
+    assert ("m:a", "tag") not in store._derived  # object dẫn xuất bị xoá cùng model
+
+    store.get("m", "c")
+    assert store.cache_stats()["lru_order"] == ["m:default", "m:c"]
+    assert store.get("m") is default  # version mặc định được pin, không load lại
+    assert store.cache_stats()["bytes"] <= store.budget_bytes
+
+
+def test_lru_cap_nhat_thu_tu_khi_hit(store, tmp_path):
+    for v in ("a", "b"):
+        _dump_model(tmp_path / f"m__{v}.joblib", 10_000)
+    _dump_model(tmp_path / "m.joblib", 10)
+    store.budget_bytes = 170_000
+    store.get("m", "a")
+    store.get("m", "b")
+    store.get("m", "a")  # a thành mới dùng nhất
+    _dump_model(tmp_path / "m__c.joblib", 10_000)
+    store.get("m", "c")
+    assert "m:a" in store.cache_stats()["lru_order"]
+    assert "m:b" not in store.cache_stats()["lru_order"]
+
+
+def test_estimate_nbytes_dem_ndarray_long_nhau():
+    obj = {"a": np.zeros(1000), "b": [np.zeros(500), {"c": np.zeros(250)}]}
+    assert model_store_mod.estimate_nbytes(obj) == (1000 + 500 + 250) * 8
+
+
+def test_convert_mmap_va_load_bang_mmap(store, tmp_path, monkeypatch):
+    from app import config
+
+    mmap_dir = tmp_path / "mmap"
+    monkeypatch.setattr(config, "MODEL_MMAP_DIR", str(mmap_dir))
+    monkeypatch.setattr(config, "MODEL_MMAP_ENABLED", True)
+    w = np.arange(100_000, dtype=float)
+    joblib.dump({"w": w, "meta": "x"}, tmp_path / "big.joblib", compress=3)
+
+    report = store.convert_to_mmap(["big"])
+    assert report["big.joblib"]["status"] == "converted"
+    assert report["big.joblib"]["mmap_arrays"] == 1
+    assert store.convert_to_mmap(["big"])["big.joblib"]["status"] == "up_to_date"
+
+    obj = store.get("big")
+    assert isinstance(obj["w"], np.memmap)
+    np.testing.assert_array_equal(obj["w"], w)
+    assert store._paths["big:default"] == mmap_dir / "big.joblib"
+
+
+def test_mmap_cu_hon_file_goc_bi_bo_qua(store, tmp_path, monkeypatch):
+    import os
+
+    from app import config
+
+    mmap_dir = tmp_path / "mmap"
+    monkeypatch.setattr(config, "MODEL_MMAP_DIR", str(mmap_dir))
+    joblib.dump({"w": np.ones(10)}, tmp_path / "m.joblib")
+    store.convert_to_mmap(["m"])
+    # file gốc được train lại sau khi convert -> bản mmap cũ không được dùng
+    joblib.dump({"w": np.full(10, 2.0)}, tmp_path / "m.joblib")
+    st = (mmap_dir / "m.joblib").stat()
+    os.utime(tmp_path / "m.joblib", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    obj = store.get("m")
+    assert not isinstance(obj["w"], np.memmap)
+    assert obj["w"][0] == 2.0
+
+    monkeypatch.setattr(config, "MODEL_MMAP_ENABLED", False)
+    store.clear_cache()
+    store.convert_to_mmap(["m"], force=True)
+    assert not isinstance(store.get("m")["w"], np.memmap)
+
+
+def test_identity_theo_model_dang_load(store, tmp_path):
+    import os
+
+    path = tmp_path / "m.joblib"
+    joblib.dump({"w": np.arange(10)}, path)
+    first = store.identity("m")
+    assert first.startswith("m:default@m.joblib:")
+    assert store.identity("m") == first
+
+    # file bị thay nhưng model cũ vẫn đang dùng -> identity vẫn của model cũ
+    joblib.dump({"w": np.arange(20)}, path)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert store.identity("m") == first
+
+    # reload (hot-swap) -> identity mới
+    store.clear_cache("m")
+    assert store.identity("m") != first
+    assert len(store.get("m")["w"]) == 20
+
+
+def test_identity_load_lai_sau_khi_bi_evict(store, tmp_path):
+    _dump_model(tmp_path / "m.joblib", 10)
+    for v in ("a", "b"):
+        _dump_model(tmp_path / f"m__{v}.joblib", 10_000)
+    store.budget_bytes = 100_000
+    ident_a = store.identity("m", "a")
+    store.get("m", "b")  # evict a
+    assert "m:a" not in store._identities
+    assert store.identity("m", "a") == ident_a  # cùng file -> cùng identity
+    assert "m:a" in store.cache_stats()["lru_order"]
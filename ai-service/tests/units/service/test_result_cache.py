@@ -0,0 +1,42 @@
+# ai-service/tests/units/service/test_result_cache.py
+from __future__ import annotations
+
+import time
+
+from app.services.result_cache import ResultCache, content_key
+
+
+def test_content_key_khong_phu_thuoc_thu_tu_params():
+    a = content_key("ns", b"csv", {"horizon": 30, "mode": "ALL"}, ["m@1"])
+    assert a == content_key("ns", b"csv", {"mode": "ALL", "horizon": 30}, ["m@1"])
+    assert a != content_key("ns", b"csv2", {"mode": "ALL", "horizon": 30}, ["m@1"])
+    assert a != content_key("ns", b"csv", {"mode": "ALL", "horizon": 30}, ["m@2"])
+    assert a != content_key("ns2", b"csv", {"mode": "ALL", "horizon": 30}, ["m@1"])
+
+
+def test_lru_va_ttl():
+    cache = ResultCache(max_entries=2, ttl_secs=0.1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (1, "memory")
+    cache.set("c", 3)  # b ít dùng nhất -> bị đẩy ra
+    assert cache.get("b") is None
+    time.sleep(0.15)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expired"] == 1
+
+
+def test_tang_disk_dung_chung_giua_cac_instance(tmp_path):
+    ResultCache(ttl_secs=60, disk_dir=str(tmp_path)).set("k" * 64, {"forecast": [1, 2]})
+    other = ResultCache(ttl_secs=60, disk_dir=str(tmp_path))
+    assert other.get("k" * 64) == ({"forecast": [1, 2]}, "disk")
+    assert other.get("k" * 64) == ({"forecast": [1, 2]}, "memory")  # đã đưa lên RAM
+
+
+def test_disk_het_han_bi_xoa(tmp_path):
+    ResultCache(ttl_secs=0.05, disk_dir=str(tmp_path)).set("x" * 64, 1)
+    time.sleep(0.1)
+    other = ResultCache(ttl_secs=60, disk_dir=str(tmp_path))
+    assert other.get("x" * 64) is None
+    assert not list(tmp_path.rglob("*.joblib"))
@@ -0,0 +1,68 @@
+# ai-service/tests/units/service/test_segment_batch.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.model_store import model_store
+
+# predict_segment gọi kmeans.predict trên ndarray (như bản Streamlit) -> sklearn cảnh báo thiếu feature names
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def kmeans():
+    return model_store.get("kmeans_customer_segmentation")
+
+
+def test_batch_giong_kmeans_predict_tren_ca_tap(ml, kmeans, segment_frame):
+    res = ml.predict_segment_batch(segment_frame, return_distances=True)
+    # cùng ép kiểu như predict_segment: Category_Breadth -> int (cắt phần lẻ)
+    X = segment_frame[list(kmeans.feature_names_in_)].assign(
+        Category_Breadth=np.trunc(segment_frame["Category_Breadth"]).astype(np.int64)
+    )
+    labels = np.array([r["segment_id"] for r in res["results"]])
+
+    np.testing.assert_array_equal(labels, kmeans.predict(X))
+    assert res["n"] == len(segment_frame)
+    assert sum(res["segment_counts"].values()) == len(segment_frame)
+    dist = np.asarray(res["distances_to_centers"])
+    np.testing.assert_allclose(dist, kmeans.transform(X), rtol=1e-7, atol=1e-7)
+
+
+def test_batch_giong_predict_segment_tung_khach(ml, segment_frame):
+    rows = segment_frame.head(200).to_dict(orient="records")
+    seg_map = {0: "VIP", 1: "Thường", 2: "Ngủ đông"}
+    res = ml.predict_segment_batch(rows, segment_map=seg_map)
+    for row, got in zip(rows, res["results"]):
+        single = ml.predict_segment(row, segment_map=seg_map, debug=False)
+        assert got == {"segment_id": single["segment_id"], "segment_name": single["segment_name"]}
+
+
+def test_ep_kieu_giong_ban_don(ml):
+    rows = [
+        {"Recency": "12.5", "Frequency": "3", "Monetary": 250000, "Discount_Sensitivity": "0.4", "Category_Breadth": "3.9"},
+        {"Recency": "abc", "Frequency": None, "Monetary": "1e6", "Discount_Sensitivity": 0.9, "Category_Breadth": 7},
+        {"Recency": 300, "Monetary": 10},  # thiếu cột -> 0 như _align_to_expected
+    ]
+    kmeans = model_store.get("kmeans_customer_segmentation")
+    X = ml._segment_batch_input(kmeans, rows)
+    for i, row in enumerate(rows):
+        single, _ = ml._segment_input(kmeans, row, None)
+        np.testing.assert_array_equal(X[i], single[0])
+    singles = [ml.predict_segment(r, debug=False)["segment_id"] for r in rows]
+    assert [r["segment_id"] for r in ml.predict_segment_batch(rows)["results"]] == singles
+
+
+def test_segment_map_bo_key_ngoai_so_cum(ml, segment_frame):
+    res = ml.predict_segment_batch(segment_frame.head(50), segment_map={0: "A", "1": "B", 9: "X", "z": "Y"})
+    names = {r["segment_id"]: r["segment_name"] for r in res["results"]}
+    assert names.get(0, "A") == "A" and names.get(1, "B") == "B"
+    assert names.get(2, "Segment_2") == "Segment_2"
+    assert "X" not in res["segment_counts"]
+
+
+def test_batch_rong(ml):
+    res = ml.predict_segment_batch(pd.DataFrame(columns=["Recency"]))
+    assert res["n"] == 0 and res["results"] == [] and res["segment_counts"] == {}
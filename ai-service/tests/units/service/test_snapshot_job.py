@@ -0,0 +1,159 @@
+# ai-service/tests/units/service/test_snapshot_job.py
+from __future__ import annotations
+
+import io
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.snapshot_job import SnapshotJobNotFound, SnapshotJobStore
+
+HORIZONS = ["1m", "3m", "6m", "12m"]
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+def _wait(job, timeout=60.0):
+    t0 = time.time()
+    while not job.finished:
+        assert time.time() - t0 < timeout, job.summary()
+        time.sleep(0.02)
+    return job
+
+
+@pytest.fixture
+def store(ml, clv_models, tmp_path):
+    s = SnapshotJobStore(run_chunk=ml.snapshot_chunk, out_dir=str(tmp_path), model_workers=3)
+    yield s
+    if s._pool is not None:
+        s._pool.shutdown(wait=True)
+
+
+@pytest.fixture(scope="module")
+def reference(ml, clv_models, snapshot_frame):
+    """Kết quả từng đường đơn lẻ: bulk churn, segment batch, CLV multi-horizon."""
+    churn = pd.concat(list(ml.iter_churn_bulk([snapshot_frame])), ignore_index=True)
+    seg = ml.predict_segment_batch(snapshot_frame)["results"]
+    clv = ml.predict_clv_horizons(snapshot_frame.to_dict(orient="records"), horizons=HORIZONS)["results"]
+    out = pd.DataFrame({
+        "customer_id": snapshot_frame["customer_id"],
+        "snapshot_date": snapshot_frame["snapshot_date"],
+        "churn_score": churn["churn_prob"],
+        "risk_tier": churn["risk_tier"],
+        "segment_id": [r["segment_id"] for r in seg],
+        "segment_name": [r["segment_name"] for r in seg],
+    })
+    for h in HORIZONS:
+        out[f"clv_{h}"] = [r[h] for r in clv]
+    return out
+
+
+def _assert_giong_reference(got: pd.DataFrame, ref: pd.DataFrame) -> None:
+    assert list(got.columns) == list(ref.columns)
+    assert got["customer_id"].tolist() == ref["customer_id"].tolist()
+    assert got["snapshot_date"].astype(str).tolist() == ref["snapshot_date"].astype(str).tolist()
+    assert got["risk_tier"].tolist() == ref["risk_tier"].tolist()
+    assert got["segment_id"].tolist() == ref["segment_id"].tolist()
+    assert got["segment_name"].tolist() == ref["segment_name"].tolist()
+    for c in ["churn_score"] + [f"clv_{h}" for h in HORIZONS]:
+        np.testing.assert_allclose(got[c].to_numpy(float), ref[c].to_numpy(float), rtol=1e-12, err_msg=c)
+
+
+def test_snapshot_chunk_giong_tung_model(ml, clv_models, snapshot_frame, reference):
+    seq, timings = ml.snapshot_chunk(snapshot_frame, clv_horizons=HORIZONS)
+    _assert_giong_reference(seq, reference)
+    assert set(timings) == {"churn", "segment", "clv"}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        par, _ = ml.snapshot_chunk(snapshot_frame, clv_horizons=HORIZONS, pool=pool)
+    pd.testing.assert_frame_equal(seq, par)
+
+
+def test_snapshot_chunk_chi_chon_model(ml, clv_models, snapshot_frame, reference):
+    out, timings = ml.snapshot_chunk(snapshot_frame.head(50), models=("clv",), clv_horizons=("6m",), id_cols=("customer_id",))
+    assert list(out.columns) == ["customer_id", "clv_6m"]
+    assert set(timings) == {"clv"}
+    np.testing.assert_allclose(out["clv_6m"], reference["clv_6m"].head(50), rtol=1e-12)
+    with pytest.raises(ValueError):
+        ml.check_snapshot_models(["churn", "lead"])
+    with pytest.raises(ValueError):
+        ml.check_snapshot_models(["clv"], ["2m"])
+
+
+@pytest.mark.parametrize("out_fmt", ["parquet", "ndjson"])
+def test_job_theo_khuc_giong_reference(store, snapshot_frame, reference, out_fmt):
+    if out_fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    src = io.BytesIO(snapshot_frame.to_csv(index=False).encode())
+    job = _wait(store.submit(src, input_format="csv", output_format=out_fmt, chunk_size=128, clv_horizons=tuple(HORIZONS)))
+
+    assert job.state == "done", job.error
+    s = job.summary()
+    assert s["progress"]["rows"] == 600 and s["progress"]["chunks"] == 5 and s["progress"]["fraction"] == 1.0
+    assert sum(s["risk_tiers"].values()) == 600 and sum(s["segment_counts"].values()) == 600
+    assert {"read", "score", "write", "churn", "segment", "clv"} <= set(s["timings"])
+    assert s["output_bytes"] == job.output_path.stat().st_size
+    assert not job.input_path.exists()
+    assert [p.name for p in store.out_dir.iterdir()] == [job.output_path.name]  # không còn file tạm
+
+    if out_fmt == "parquet":
+        got = pd.read_parquet(job.output_path)
+    else:
+        got = pd.read_json(job.output_path, lines=True, dtype=False, precise_float=True)
+    _assert_giong_reference(got, reference)
+
+
+def test_ndjson_giu_du_chu_so(store, snapshot_frame):
+    pytest.importorskip("pyarrow")
+    src = snapshot_frame.head(200).to_csv(index=False).encode()
+    a = _wait(store.submit(io.BytesIO(src), input_format="csv", output_format="parquet", chunk_size=64))
+    b = _wait(store.submit(io.BytesIO(src), input_format="csv", output_format="ndjson", chunk_size=64))
+    pq_frame = pd.read_parquet(a.output_path)
+    nd_frame = pd.read_json(b.output_path, lines=True, dtype=False, precise_float=True)
+    for c in ["churn_score"] + [f"clv_{h}" for h in HORIZONS]:
+        np.testing.assert_allclose(nd_frame[c], pq_frame[c], rtol=1e-14, err_msg=c)
+
+
+def test_huy_job_dang_chay(ml, tmp_path, snapshot_frame):
+    gate, started = threading.Event(), threading.Event()
+
+    def slow_chunk(chunk, **kw):
+        started.set()
+        gate.wait(10)
+        return ml.snapshot_chunk(chunk, models=("churn",), id_cols=("customer_id",))
+
+    store = SnapshotJobStore(run_chunk=slow_chunk, out_dir=str(tmp_path))
+    job = store.submit(io.BytesIO(snapshot_frame.to_csv(index=False).encode()), input_format="csv",
+                       output_format="ndjson", chunk_size=100, job_id="huy-1")
+    assert started.wait(10)
+    assert job.state == "running"
+    with pytest.raises(ValueError):
+        store.submit(io.BytesIO(b"customer_id\n1\n"), input_format="csv", output_format="ndjson", job_id="huy-1")
+
+    assert store.delete("huy-1") is True
+    gate.set()
+    _wait(job)
+    assert job.state == "cancelled" and job.chunks == 1
+    assert list(tmp_path.iterdir()) == []  # không còn input / file tạm / output
+    assert store.get("huy-1") is job  # job huỷ vẫn trong lịch sử
+
+    assert store.delete("huy-1") is True  # lần 2: xoá khỏi lịch sử
+    with pytest.raises(SnapshotJobNotFound):
+        store.get("huy-1")
+    assert store.delete("huy-1") is False
+    store._pool.shutdown(wait=True)
+
+
+def test_lich_su_chi_day_job_da_xong(ml, tmp_path, snapshot_frame):
+    store = SnapshotJobStore(run_chunk=ml.snapshot_chunk, out_dir=str(tmp_path), history=2)
+    src = snapshot_frame.head(20).to_csv(index=False).encode()
+    jobs = [_wait(store.submit(io.BytesIO(src), input_format="csv", output_format="ndjson", models=("churn",),
+                               job_id=f"j{i}")) for i in range(3)]
+    assert [j["job_id"] for j in store.list_jobs()] == ["j2", "j1"]
+    assert not jobs[0].output_path.exists() and jobs[2].output_path.exists()
+    store._pool.shutdown(wait=True)
@@ -0,0 +1,73 @@
+# ai-service/tests/units/test_gunicorn_conf.py
+from __future__ import annotations
+
+import gc
+import os
+import runpy
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+GUNICORN_CONF = Path(__file__).resolve().parents[2] / "gunicorn.conf.py"
+DOCKERFILE = Path(__file__).resolve().parents[2] / "Dockerfile"
+
+
+class _Log:
+    def __init__(self):
+        self.records = []
+
+    def info(self, msg, *args):
+        self.records.append(("info", msg % args))
+
+    def warning(self, msg, *args):
+        self.records.append(("warning", msg % args))
+
+
+@pytest.fixture
+def conf(monkeypatch):
+    # gunicorn.conf.py ghi os.environ.setdefault(...) -> chạy trên bản copy để không rò sang test khác
+    env = {k: v for k, v in os.environ.items() if k not in ("ML_THREAD_WORKERS", "OMP_NUM_THREADS", "WEB_CONCURRENCY")}
+    env["WEB_CONCURRENCY"] = "2"
+    monkeypatch.setattr(os, "environ", env)
+    return runpy.run_path(str(GUNICORN_CONF))
+
+
+def test_chia_core_cho_worker(conf):
+    assert conf["workers"] == 2
+    assert conf["preload_app"] is True
+    assert conf["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert os.environ["ML_THREAD_WORKERS"] == str(max(1, conf["_cpus"] // 2))
+    assert os.environ["OMP_NUM_THREADS"] == os.environ["ML_THREAD_WORKERS"]
+
+
+def test_on_starting_preload_model_va_freeze_gc(conf, monkeypatch):
+    from app.services.model_store import model_store
+
+    calls = []
+    monkeypatch.setattr(
+        model_store, "warmup",
+        lambda **kw: calls.append(kw) or {"a": {"status": "loaded"}, "b": {"status": "missing"}},
+    )
+    froze = []
+    monkeypatch.setattr(gc, "freeze", lambda: froze.append(True))
+    server = SimpleNamespace(log=_Log())
+
+    conf["on_starting"](server)
+
+    assert len(calls) == 1 and "warm_fn" not in calls[0]  # không predict giả ở master trước khi fork
+    assert froze == [True]
+    assert "Preloaded 1/2 models" in server.log.records[0][1]
+
+
+def test_worker_int_khong_bao_drain(conf):
+    worker = SimpleNamespace(pid=123, log=_Log())
+    conf["worker_int"](worker)
+    level, msg = worker.log.records[0]
+    assert level == "warning"
+    assert "not drained" in msg and "draining" not in msg
+
+
+def test_image_chay_gunicorn_mac_dinh():
+    cmd = [line for line in DOCKERFILE.read_text(encoding="utf-8").splitlines() if line.startswith("CMD ")]
+    assert cmd == ['CMD ["gunicorn", "-c", "gunicorn.conf.py", "app.main:app"]']